@@ -17,15 +17,82 @@ DEFAULT_MODEL = os.getenv("KIMI_DEFAULT_MODEL")
 DATA_DIR = BASE_DIR / "data"
 ANNUAL_REPORTS_DIR = DATA_DIR / "annual"
 DB_PATH = DATA_DIR / "data.db"
+REPORT_COMPANY = os.getenv("REPORT_COMPANY", "")  # 文件名中推断不出公司时使用的公司名称
+BATCH_WORK_DIR = DATA_DIR / "work"  # 批处理时每份报告独立的工作目录
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", 2))  # 同时处理的报告数
 
 # PDF处理相关配置
-PDF_CHUNK_SIZE = 4000  # 每个文本块的最大字符数
+# 整份报告送入LLM时按估算的token数切分，尽量填满模型的上下文窗口
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", 0))  # 每个文本块的最大token数，0表示按上下文窗口推算
+CHUNK_OUTPUT_TOKENS = int(os.getenv("CHUNK_OUTPUT_TOKENS", 2048))  # 推算时为模型输出预留的token数
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 200))  # 相邻文本块重叠的token数，保留跨块的上下文
 MAX_RETRIES = 3  # API调用最大重试次数
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", os.cpu_count() or 1))  # 并行解析PDF页面的进程数
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "1") == "1"  # 缓存逐页解析结果，只重新解析缺失或失效的页面
+PAGE_CACHE_PATH = DATA_DIR / "page_cache.db"
+# 切分时折行和跨页的句子先合并为段落，再切成这个长度范围内的文本块（字符数）
+BLOCK_MIN_CHARS = int(os.getenv("BLOCK_MIN_CHARS", 80))
+BLOCK_MAX_CHARS = int(os.getenv("BLOCK_MAX_CHARS", 600))
+TABLE_EXTRACTION = os.getenv("TABLE_EXTRACTION", "1") == "1"  # 报表直接解析为指标，不经过LLM
+# 按目录只处理这些章节，逗号分隔的别名（如financial,mdna）或标题关键字；为空时处理全部页面
+SECTION_FILTER = [name.strip() for name in os.getenv("SECTION_FILTER", "").split(",") if name.strip()]
 
 # LLM相关配置
 LLM_MODEL = DEFAULT_MODEL
 LLM_TEMPERATURE = 0.1
 
+# 各模型的上下文窗口（token）
+LLM_CONTEXT_WINDOWS = {
+    "moonshot-v1-8k": 8192,
+    "moonshot-v1-32k": 32768,
+    "moonshot-v1-128k": 131072
+}
+
+# 文本块打包配置：同一章节的相邻文本块合并为一次请求
+PACK_BLOCKS = os.getenv("PACK_BLOCKS", "1") == "1"
+PACK_MAX_BLOCKS = int(os.getenv("PACK_MAX_BLOCKS", 30))  # 每个请求最多包含的文本块数
+PACK_OUTPUT_TOKENS_PER_BLOCK = 160  # 预计每个文本块占用的输出token数
+
+# 分流：跳过没有内容的文本块，简单数值用规则提取，其余才调用LLM
+TRIAGE_ENABLED = os.getenv("TRIAGE_ENABLED", "1") == "1"
+
+# 并发调度相关配置
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", 4))  # 并发请求的线程数
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", 8))  # 已提交但未写入结果的最大请求数
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", 60))  # 每分钟请求数上限，0表示不限制
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", 32000))  # 每分钟token数上限，0表示不限制
+LLM_OUTPUT_TOKEN_RESERVE = 512  # 估算TPM时为每个请求预留的输出token数
+
+# HTTP连接配置
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", max(10, LLM_MAX_WORKERS)))  # 连接池大小，不应小于并发线程数
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 10))  # 建立连接的超时（秒）
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 120))  # 两次读取之间的最长等待（秒）
+LLM_MAX_CONTINUATIONS = int(os.getenv("LLM_MAX_CONTINUATIONS", 2))  # JSON输出被截断时最多续写的次数
+
+# 重试和熔断配置
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", 5))  # 429、5xx和网络错误的最多尝试次数
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 1))  # 退避的基准等待（秒），每次重试翻倍并随机抖动
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", 60))  # 单次退避的最长等待（秒）
+LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", 5))  # 连续失败多少次后熔断
+LLM_CIRCUIT_RESET = float(os.getenv("LLM_CIRCUIT_RESET", 30))  # 熔断后多久发送探测请求（秒）
+LLM_CIRCUIT_MAX_WAIT = float(os.getenv("LLM_CIRCUIT_MAX_WAIT", 900))  # 熔断期间请求最多等待多久后放弃（秒）
+
+# LLM响应缓存配置
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"  # 是否启用响应缓存
+LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "0") == "1"  # 跳过缓存读取（仍会写入新结果）
+LLM_CACHE_PATH = DATA_DIR / "llm_cache.db"
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", 512))  # 缓存总大小上限
+LLM_CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", 30))  # 缓存有效天数，0表示永久
+
+# 控制台输出配置
+OUTPUT_MODE = os.getenv("OUTPUT_MODE", "interactive")  # interactive: 实时输出；batch: 缓冲输出，适合无人值守运行
+OUTPUT_VERBOSITY = int(os.getenv("OUTPUT_VERBOSITY", 2 if OUTPUT_MODE == "interactive" else 1))  # 0: 安静 1: 常规 2: 显示提示词和完整响应
+OUTPUT_STREAM_DELAY = float(os.getenv("OUTPUT_STREAM_DELAY", 0))  # 交互模式下逐字输出的延迟（秒），0表示不延迟
+
+# 运行指标和性能分析
+METRICS_DIR = DATA_DIR / "metrics"  # 每次运行的指标汇总（JSON/CSV）
+PROFILE = os.getenv("PROFILE") or None  # cpu / mem / all：开启cProfile、tracemalloc或两者
+
 # 确保必要的目录存在
 LOG_DIR = BASE_DIR / "logs"
 LOG_FILE = LOG_DIR / "financial_parser.log"
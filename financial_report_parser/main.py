@@ -1,72 +1,62 @@
 import os
+import argparse
 from pathlib import Path
 from config.settings import *
-from src.pdf_processor import PDFProcessor
-from src.llm_processor import LLMProcessor
-from src.data_storage import DataStorage
-from src.utils import setup_logging, ProcessTracker, stream_output
+from src.batch import discover_reports, run_batch
+from src.utils import setup_logging, configure_output, flush_output
+from src.metrics import profiling, run_name, add_cli_arguments
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="批量解析年报")
+    parser.add_argument("sources", nargs="*", type=Path, default=[ANNUAL_REPORTS_DIR],
+                        help="PDF文件、包含PDF的目录或清单文件（CSV/JSON，含path,company,year），默认扫描年报目录")
+    parser.add_argument("--company", help="覆盖推断出的公司名称（只处理一份报告时使用）")
+    parser.add_argument("--year", type=int, help="覆盖推断出的年份（只处理一份报告时使用）")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="同时处理的报告数")
+    parser.add_argument("--pdf-workers", type=int, default=None,
+                        help="每份报告解析PDF页面的进程数，默认按总进程数平均分配")
+    parser.add_argument("--work-dir", type=Path, default=BATCH_WORK_DIR, help="工作目录")
+    parser.add_argument("--sections", nargs="*", default=SECTION_FILTER,
+                        help="按目录只处理这些章节：别名（financial、mdna、summary、governance、risk、events、esg）"
+                             "或标题中的关键字；清单文件中的sections列优先")
+    add_cli_arguments(parser)
+    return parser.parse_args()
 
 def main():
     # 使用配置中的日志文件路径
     logger = setup_logging(LOG_FILE)
-    
-    # 初始化进度跟踪器
-    tracker = ProcessTracker(DATA_DIR / "process_state.json")
-    
-    try:
-        # 初始化各个组件
-        pdf_processor = PDFProcessor(chunk_size=PDF_CHUNK_SIZE)
-        llm_processor = LLMProcessor(
-            api_key=API_KEY,
-            api_base=API_BASE,
-            model=LLM_MODEL,
-            temperature=LLM_TEMPERATURE
-        )
-        data_storage = DataStorage(db_path=DB_PATH)
-
-        # 处理2023年报
-        pdf_path = ANNUAL_REPORTS_DIR / "2023年报.pdf"
-        json_path = ANNUAL_REPORTS_DIR / "2023.json"
-        year = 2023
-
-        # 1. 提取PDF文本
-        if not tracker.state.get('extracted_text'):
-            logger.info("正在提取PDF文本...")
-            text = pdf_processor.extract_text(pdf_path)
-            tracker.state['extracted_text'] = text
-            tracker.save_state()
-        else:
-            logger.info("使用已提取的文本...")
-            text = tracker.state['extracted_text']
+    configure_output(OUTPUT_MODE, OUTPUT_VERBOSITY, OUTPUT_STREAM_DELAY)
+    args = parse_args()
 
-        # 2. 分块处理文本
-        logger.info("正在处理文本...")
-        all_data = tracker.state.get('results', {})
-        
-        for i, chunk in enumerate(pdf_processor.split_text(text)):
-            if tracker.is_chunk_processed(i):
-                logger.info(f"跳过已处理的文本块 {i+1}")
-                continue
-                
-            logger.info(f"正在处理第{i+1}个文本块...")
-            chunk_data = llm_processor.process_chunk(chunk)
-            all_data.update(chunk_data)
-            
-            # 保存进度
-            tracker.save_chunk_result(i, chunk_data)
-            
-            # 实时保存数据
-            data_storage.save_json(all_data, json_path)
-
-        # 3. 保存数据到数据库
-        logger.info("正在保存数据到数据库...")
-        data_storage.save_to_db(all_data, year)
-
-        logger.info("处理完成！")
+    try:
+        jobs = discover_reports(args.sources)
+        if not jobs:
+            logger.error(f"没有找到要处理的年报: {', '.join(str(s) for s in args.sources)}")
+            return
+        for job in jobs:
+            job["company"] = job["company"] or REPORT_COMPANY
+        if len(jobs) == 1:
+            jobs[0]["company"] = args.company or jobs[0]["company"]
+            jobs[0]["year"] = args.year or jobs[0]["year"]
+        elif args.company or args.year:
+            logger.warning("处理多份报告时忽略--company/--year，请使用清单文件指定")
+
+        workers = max(1, min(args.workers, len(jobs)))
+        pdf_workers = args.pdf_workers or max(1, PDF_WORKERS // workers)
+        # 每份报告的运行指标保存在各自的工作目录中，这里只对整个批次做性能分析
+        with profiling(args.profile or PROFILE, args.metrics_dir or METRICS_DIR, run_name("batch")):
+            summary = run_batch(jobs, args.work_dir, workers=workers, pdf_workers=pdf_workers,
+                                db_path=DB_PATH, log=logger, sections=args.sections)
+        if summary["failed"]:
+            for result in summary["results"]:
+                if result["status"] != "ok":
+                    logger.error(f"失败: {result['pdf_path']}: {result['error']}")
 
     except Exception as e:
         logger.error(f"处理过程中出现错误: {str(e)}", exc_info=True)
         raise
+    finally:
+        flush_output()
 
 if __name__ == "__main__":
     main()
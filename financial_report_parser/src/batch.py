@@ -0,0 +1,270 @@
+import csv
+import json
+import re
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Any, List, Iterable, Optional, Tuple
+
+from .checkpoint import atomic_write_json
+from .metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+_YEAR_RE = re.compile(r'(?<!\d)((?:19|20)\d{2})(?!\d)')
+# 文件名中与公司名无关的部分
+_NAME_NOISE_RE = re.compile(r'(?:年?半年度报告|年?年度报告|年?年报|报告|全文|摘要|正文|修订版|更正后|[AH]股|中文版|英文版)')
+_STOCK_CODE_RE = re.compile(r'^(?:[A-Za-z]{2})?\d{6}')
+_SEPARATORS = ' _-—()（）[]【】.·'
+
+def infer_report_info(pdf_path: Path) -> Tuple[str, Optional[int]]:
+    """从文件名推断公司和年份，例如"600036_招商银行_2023年年度报告.pdf" -> ("招商银行", 2023)"""
+    stem = pdf_path.stem
+    match = _YEAR_RE.search(stem)
+    year = int(match.group(1)) if match else None
+    company = _YEAR_RE.sub(' ', stem)
+    company = _NAME_NOISE_RE.sub(' ', company).strip(_SEPARATORS)
+    company = _STOCK_CODE_RE.sub('', company)
+    company = re.sub(r'[\s_\-—]+', ' ', company).strip(_SEPARATORS)
+    # 只剩下"年"之类的残留时视为没有公司名
+    if not company or company in ("年", "年度"):
+        company = ""
+    return company, year
+
+def load_manifest(manifest_path: Path) -> List[Dict[str, Any]]:
+    """读取清单文件（CSV的path,company,year列，或JSON列表），相对路径以清单所在目录为基准
+
+    可选的sections列指定该报告只处理的章节，CSV中用分号分隔，JSON中也可以是列表。
+    """
+    if manifest_path.suffix.lower() == ".json":
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        if isinstance(entries, dict):
+            entries = entries.get("reports", [])
+    else:
+        with open(manifest_path, 'r', encoding='utf-8-sig', newline='') as f:
+            entries = list(csv.DictReader(f))
+
+    jobs = []
+    for entry in entries:
+        pdf_path = Path(entry["path"])
+        if not pdf_path.is_absolute():
+            pdf_path = manifest_path.parent / pdf_path
+        company, year = infer_report_info(pdf_path)
+        job = {
+            "pdf_path": pdf_path,
+            "company": entry.get("company") or company,
+            "year": int(entry["year"]) if entry.get("year") else year
+        }
+        sections = entry.get("sections")
+        if sections:
+            job["sections"] = sections.split(";") if isinstance(sections, str) else list(sections)
+        jobs.append(job)
+    return jobs
+
+def discover_reports(sources: Iterable[Path]) -> List[Dict[str, Any]]:
+    """扫描目录、PDF文件或清单文件，生成待处理的报告列表"""
+    jobs = []
+    for source in sources:
+        if source.is_dir():
+            pdf_paths = sorted(p for p in source.rglob("*") if p.suffix.lower() == ".pdf")
+        elif source.suffix.lower() == ".pdf":
+            pdf_paths = [source]
+        else:
+            jobs.extend(load_manifest(source))
+            continue
+        for pdf_path in pdf_paths:
+            company, year = infer_report_info(pdf_path)
+            jobs.append({"pdf_path": pdf_path, "company": company, "year": year})
+
+    # 同一份文件只处理一次
+    unique = {}
+    for job in jobs:
+        unique.setdefault(job["pdf_path"].resolve(), job)
+    return list(unique.values())
+
+def report_slug(job: Dict[str, Any]) -> str:
+    """报告工作目录的名称"""
+    name = f"{job['company'] or job['pdf_path'].stem}_{job['year'] or 'unknown'}"
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', name)
+
+def run_report(job: Dict[str, Any], work_dir: Path) -> Dict[str, Any]:
+    """在独立的工作目录中处理一份报告，返回统计信息；出错时记录错误而不抛出"""
+    from config.settings import (API_KEY, API_BASE, DB_PATH, LLM_MODEL, LLM_TEMPERATURE, LLM_CONTEXT_WINDOWS,
+                                 CHUNK_MAX_TOKENS, CHUNK_OUTPUT_TOKENS, CHUNK_OVERLAP_TOKENS,
+                                 LLM_CACHE_ENABLED, LLM_CACHE_BYPASS, LLM_CACHE_PATH, LLM_CACHE_MAX_MB,
+                                 LLM_CACHE_MAX_AGE_DAYS, LLM_POOL_SIZE, LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT,
+                                 LLM_MAX_CONTINUATIONS, TABLE_EXTRACTION,
+                                 LLM_RETRY_ATTEMPTS, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY,
+                                 LLM_CIRCUIT_FAILURES, LLM_CIRCUIT_RESET, LLM_CIRCUIT_MAX_WAIT,
+                                 PAGE_CACHE_ENABLED, PAGE_CACHE_PATH)
+    from .pdf_processor import PDFProcessor
+    from .chunker import chunk_token_budget
+    from .page_cache import PageCache
+    from .toc import select_pages
+    from .resilience import RetryPolicy, CircuitBreaker
+    from .llm_processor import LLMProcessor
+    from .data_storage import DataStorage
+    from .response_cache import ResponseCache
+    from .utils import ProcessTracker
+    from .table_extractor import parse_statement_table
+
+    stats = {"pdf_path": str(job["pdf_path"]), "company": job["company"], "year": job["year"],
+             "work_dir": str(work_dir), "status": "ok", "pages": 0, "blocks": 0,
+             "skipped_blocks": 0, "table_items": 0, "prompt_tokens": 0, "completion_tokens": 0,
+             "seconds": 0.0, "error": None}
+    start = time.perf_counter()
+    llm_processor = None
+    page_cache = None
+    # 每份报告单独统计，指标保存在报告的工作目录中
+    metrics = get_metrics()
+    metrics.reset()
+    try:
+        if job["year"] is None:
+            raise ValueError("无法从文件名推断年份，请在清单中指定")
+        work_dir.mkdir(parents=True, exist_ok=True)
+        tracker = ProcessTracker(work_dir / "process_state.json")
+        page_cache = PageCache(PAGE_CACHE_PATH) if PAGE_CACHE_ENABLED else None
+        llm_processor = LLMProcessor(
+            api_key=API_KEY,
+            api_base=API_BASE,
+            model=LLM_MODEL,
+            temperature=LLM_TEMPERATURE,
+            cache=ResponseCache(LLM_CACHE_PATH, LLM_CACHE_MAX_MB * 1024 * 1024, LLM_CACHE_MAX_AGE_DAYS) if LLM_CACHE_ENABLED else None,
+            use_cache=not LLM_CACHE_BYPASS,
+            pool_size=LLM_POOL_SIZE,
+            timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT),
+            max_continuations=LLM_MAX_CONTINUATIONS,
+            retry_policy=RetryPolicy(LLM_RETRY_ATTEMPTS, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY),
+            circuit_breaker=CircuitBreaker(LLM_CIRCUIT_FAILURES, LLM_CIRCUIT_RESET, max_wait=LLM_CIRCUIT_MAX_WAIT)
+        )
+        # 文本块按token切分，尽量填满上下文窗口：窗口减去提示词和输出预留
+        max_tokens = CHUNK_MAX_TOKENS or chunk_token_budget(LLM_CONTEXT_WINDOWS.get(LLM_MODEL, 8192),
+                                                            llm_processor.prompt_tokens(), CHUNK_OUTPUT_TOKENS)
+        pdf_processor = PDFProcessor(max_tokens=max_tokens, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                                     workers=job.get("pdf_workers", 1), extract_tables=TABLE_EXTRACTION,
+                                     page_cache=page_cache)
+        data_storage = DataStorage(db_path=job.get("db_path") or DB_PATH)
+        report_id = data_storage.register_report(job["company"], job["year"], job["pdf_path"])
+        json_path = work_dir / "data.json"
+        # 按目录只处理选中的章节，其余页面不解析也不发送给LLM
+        pages = select_pages(job["pdf_path"], job.get("sections"), page_cache, work_dir / "toc.json")
+        if pages is not None:
+            stats["selected_pages"] = len(pages)
+
+        # 报表中的指标直接解析，只有正文交给LLM
+        table_items = []
+
+        def counted_pages():
+            for page in pdf_processor.iter_pages(job["pdf_path"], pages):
+                stats["pages"] += 1
+                for table in page["tables"]:
+                    table_items.extend(parse_statement_table(table["rows"], table["unit"], job["year"], page["page"]))
+                yield page
+
+        all_data = tracker.state.get('results', {})
+        for i, chunk in enumerate(pdf_processor.split_pages(counted_pages())):
+            stats["blocks"] += 1
+            if tracker.is_chunk_processed(i):
+                stats["skipped_blocks"] += 1
+                continue
+            # 每个文本块的指标单独保存，合并结果时不会互相覆盖
+            chunk_data = {f"chunk_{i}": llm_processor.process_chunk(chunk)["data"]}
+            all_data.update(chunk_data)
+            tracker.save_chunk_result(i, chunk_data)
+            data_storage.save_json(all_data, json_path)
+        tracker.save_state()
+
+        stats["table_items"] = len(table_items)
+        all_data["table_data"] = [
+            {"indicator_name": item["name"], "value": item["value"], "unit": item["unit"],
+             "time": item["time"], "period": item["period"]}
+            for item in table_items
+        ]
+        data_storage.save_json(all_data, json_path)
+        data_storage.save_to_db(all_data, job["year"], report_id=report_id)
+    except Exception as e:
+        logger.error(f"处理报告失败 {job['pdf_path']}: {str(e)}", exc_info=True)
+        stats["status"] = "failed"
+        stats["error"] = str(e)
+    finally:
+        if llm_processor is not None:
+            llm_processor.close()
+        if page_cache is not None:
+            page_cache.close()
+        stats["seconds"] = time.perf_counter() - start
+        stats["prompt_tokens"] = metrics.counter("llm.prompt_tokens")
+        stats["completion_tokens"] = metrics.counter("llm.completion_tokens")
+        if work_dir.exists():
+            metrics.export(work_dir / "metrics")
+    return stats
+
+def run_batch(jobs: List[Dict[str, Any]], work_root: Path, workers: int = 1, pdf_workers: int = 1,
+              db_path: Path = None, log: logging.Logger = None, sections: List[str] = None) -> Dict[str, Any]:
+    """用进程池并行处理多份报告，单份报告失败不影响其他报告；sections为按目录过滤的章节"""
+    log = log or logger
+    work_root.mkdir(parents=True, exist_ok=True)
+    for job in jobs:
+        job["pdf_workers"] = pdf_workers
+        job["db_path"] = db_path
+        job.setdefault("sections", sections)
+    log.info(f"共 {len(jobs)} 份报告，使用 {workers} 个进程处理")
+
+    results = []
+    start = time.perf_counter()
+    if workers <= 1:
+        for job in jobs:
+            results.append(run_report(job, work_root / report_slug(job)))
+            _log_report(log, results[-1], len(results), len(jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run_report, job, work_root / report_slug(job)): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    # 工作进程异常退出等run_report本身无法捕获的错误
+                    stats = {"pdf_path": str(job["pdf_path"]), "company": job["company"], "year": job["year"],
+                             "work_dir": str(work_root / report_slug(job)), "status": "failed",
+                             "pages": 0, "blocks": 0, "skipped_blocks": 0, "seconds": 0.0, "error": str(e)}
+                results.append(stats)
+                _log_report(log, stats, len(results), len(jobs))
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(results, elapsed)
+    atomic_write_json(work_root / "batch_summary.json", summary)
+    log.info(
+        f"批处理完成: 成功 {summary['succeeded']} 份，失败 {summary['failed']} 份，"
+        f"共 {summary['pages']} 页 / {summary['blocks']} 个文本块，耗时 {elapsed:.1f}秒，"
+        f"{summary['pages_per_min']:.1f} 页/分钟，{summary['blocks_per_min']:.1f} 块/分钟，"
+        f"token 输入 {summary['prompt_tokens']:.0f} / 输出 {summary['completion_tokens']:.0f}"
+    )
+    return summary
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """汇总各报告的统计信息，吞吐量按整个批次的墙钟时间计算"""
+    minutes = elapsed / 60 if elapsed > 0 else 0
+    pages = sum(r["pages"] for r in results)
+    blocks = sum(r["blocks"] for r in results)
+    return {
+        "reports": len(results),
+        "succeeded": sum(1 for r in results if r["status"] == "ok"),
+        "failed": sum(1 for r in results if r["status"] != "ok"),
+        "pages": pages,
+        "blocks": blocks,
+        "prompt_tokens": sum(r.get("prompt_tokens", 0) for r in results),
+        "completion_tokens": sum(r.get("completion_tokens", 0) for r in results),
+        "seconds": elapsed,
+        "pages_per_min": pages / minutes if minutes else 0.0,
+        "blocks_per_min": blocks / minutes if minutes else 0.0,
+        "results": sorted(results, key=lambda r: r["pdf_path"])
+    }
+
+def _log_report(log: logging.Logger, stats: Dict[str, Any], done: int, total: int) -> None:
+    name = f"{stats['company'] or Path(stats['pdf_path']).name} {stats['year'] or ''}".strip()
+    if stats["status"] == "ok":
+        log.info(f"[{done}/{total}] {name}: {stats['pages']} 页，{stats['blocks']} 个文本块，{stats['seconds']:.1f}秒")
+    else:
+        log.error(f"[{done}/{total}] {name} 处理失败: {stats['error']}")
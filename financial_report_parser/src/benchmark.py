@@ -0,0 +1,237 @@
+import argparse
+import io
+import json
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.utils import ConsoleOutput, VERBOSITY_NORMAL, VERBOSITY_VERBOSE
+from src.data_storage import StorageWriter, DataStorage
+from src.query import IndicatorQuery
+from src.prompt_registry import PromptRegistry
+from src.cut import PDFCutter, H1_PATTERNS, H2_PATTERNS, BLOCK_TYPE_KEYWORDS
+
+DATA_DIR = project_root / "data"
+LEGACY_DELAY = 0.01  # 旧版stream_output每个字符的延迟
+
+def _load_json(path: Path) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _stream_calls() -> Dict[str, List[Tuple[str, float, int]]]:
+    """构造各入口处理一个单元时的stream_output调用序列：(文本, 旧版延迟, 输出级别)"""
+    blocks = _load_json(DATA_DIR / "cut.json")["blocks"]
+    prompts = PromptRegistry.load(DATA_DIR / "prompts.json")
+    analyses = _load_json(DATA_DIR / "read.json")["blocks"]
+    block = blocks[len(blocks) // 2]
+    block_prompts = prompts.messages(len(prompts) // 2, block)
+    response = json.dumps(analyses[len(analyses) // 2]["analysis"], ensure_ascii=False, indent=2)
+    chunk = "".join(b["text"] for b in blocks[:200])[:4000]
+
+    request_info = [("\n发送请求:", LEGACY_DELAY, VERBOSITY_VERBOSE),
+                    ("URL: https://api.moonshot.cn/v1/chat/completions", LEGACY_DELAY, VERBOSITY_VERBOSE),
+                    ("模型: moonshot-v1-8k", LEGACY_DELAY, VERBOSITY_VERBOSE)]
+    # 流式返回的内容本来就没有延迟
+    streamed = [(piece, 0, VERBOSITY_VERBOSE) for piece in response[::8]]
+
+    return {
+        # main.py：每个文本块的预览、两次LLM调用，以及每页的提取信息
+        "main.py": [
+            ("文本块内容预览:", LEGACY_DELAY, VERBOSITY_NORMAL),
+            (chunk[:200] + "...", LEGACY_DELAY, VERBOSITY_NORMAL),
+            ("\n第一步：分析文本块包含的信息...", LEGACY_DELAY, VERBOSITY_NORMAL),
+            *request_info, *streamed,
+            ("\n文本分析结果:", LEGACY_DELAY, VERBOSITY_NORMAL),
+            (response, LEGACY_DELAY, VERBOSITY_NORMAL),
+            ("\n第二步：提取具体数据...", LEGACY_DELAY, VERBOSITY_NORMAL),
+            *request_info, *streamed,
+            ("第1页: 提取了1234个字符", LEGACY_DELAY, VERBOSITY_VERBOSE),
+        ],
+        # read.py：每个文本块的标题和一次LLM调用
+        "read.py": [
+            (f"标题: {block['h1_title']} - {block['h2_title']}", LEGACY_DELAY, VERBOSITY_NORMAL),
+            *request_info, *streamed,
+        ],
+        # extract.py：块信息、完整提示词、LLM结果以及每条入库记录
+        "extract.py": [
+            ("\n文本信息:", LEGACY_DELAY, VERBOSITY_NORMAL),
+            (f"标题: {block['h1_title']} - {block['h2_title']}", LEGACY_DELAY, VERBOSITY_NORMAL),
+            (f"类型: {block['type']}", LEGACY_DELAY, VERBOSITY_NORMAL),
+            (f"长度: {block['length']} 字符", LEGACY_DELAY, VERBOSITY_NORMAL),
+            ("\n使用的提示词:", LEGACY_DELAY, VERBOSITY_VERBOSE),
+            (json.dumps(block_prompts, ensure_ascii=False, indent=2), LEGACY_DELAY, VERBOSITY_VERBOSE),
+            ("\n正在调用LLM提取数据...", LEGACY_DELAY, VERBOSITY_NORMAL),
+            *request_info, *streamed,
+            ("\nLLM返回结果:", LEGACY_DELAY, VERBOSITY_VERBOSE),
+            (response, LEGACY_DELAY, VERBOSITY_VERBOSE),
+            ("\n正在保存数据到数据库...", LEGACY_DELAY, VERBOSITY_NORMAL),
+            *[(f"保存结构化数据: 指标{i}", LEGACY_DELAY, VERBOSITY_VERBOSE) for i in range(5)],
+            ("数据保存完成", LEGACY_DELAY, VERBOSITY_NORMAL),
+        ],
+    }
+
+def _run_console(console: ConsoleOutput, calls: List[Tuple[str, float, int]], repeat: int) -> float:
+    """执行调用序列，返回平均每个单元的耗时"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text, delay, level in calls:
+            console.write(text, level=level, delay=0 if delay == 0 else None)
+    console.flush()
+    return (time.perf_counter() - start) / repeat
+
+def bench_stream(repeat: int) -> None:
+    """对比旧版逐字延迟输出与新输出模式每个单元的耗时"""
+    print(f"{'入口':<12}{'旧版(秒/块)':>14}{'交互模式(秒/块)':>18}{'批处理模式(秒/块)':>20}{'节省(秒/块)':>14}")
+    for entry, calls in _stream_calls().items():
+        # 旧版每个字符（包括换行）都要sleep，这里直接按字符数计算，避免真的等待
+        legacy = sum((len(text) + 1) * delay for text, delay, _ in calls)
+        interactive = _run_console(ConsoleOutput("interactive", VERBOSITY_VERBOSE, stream=io.StringIO()), calls, repeat)
+        batch = _run_console(ConsoleOutput("batch", VERBOSITY_NORMAL, stream=io.StringIO()), calls, repeat)
+        print(f"{entry:<12}{legacy:>14.3f}{interactive:>18.6f}{batch:>20.6f}{legacy - batch:>14.3f}")
+
+STRUCTURED_SQL = """INSERT INTO structured_data (type, name, value, unit, time) VALUES (?, ?, ?, ?, ?)"""
+
+def _storage_blocks(blocks: int) -> List[List[Tuple]]:
+    """用read.json中的结构化数据构造每个文本块要写入的行"""
+    items = [
+        (b["type"], d.get("name", ""), d.get("value"), d.get("unit", ""), d.get("time", ""))
+        for b in _load_json(DATA_DIR / "read.json")["blocks"]
+        for d in b["analysis"].get("analysis", {}).get("structured_data", [])
+    ]
+    # 每个文本块平均写入3行
+    return [[items[(i * 3 + k) % len(items)] for k in range(3)] for i in range(blocks)]
+
+def _init_storage_db(db_path: Path) -> None:
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("""CREATE TABLE IF NOT EXISTS structured_data
+                        (id INTEGER PRIMARY KEY, type TEXT, name TEXT, value REAL,
+                         unit TEXT, time TEXT, block_id INTEGER)""")
+
+def bench_storage(blocks: int) -> None:
+    """对比旧版每块一个连接、逐行插入与批量写入器的写入速度"""
+    data = _storage_blocks(blocks)
+    rows = sum(len(b) for b in data)
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = Path(tmp) / "legacy.db"
+        _init_storage_db(legacy_db)
+        start = time.perf_counter()
+        for block_rows in data:
+            conn = sqlite3.connect(legacy_db)
+            c = conn.cursor()
+            for row in block_rows:
+                c.execute(STRUCTURED_SQL, row)
+            conn.commit()
+            conn.close()
+        legacy = time.perf_counter() - start
+
+        writer_db = Path(tmp) / "writer.db"
+        _init_storage_db(writer_db)
+        start = time.perf_counter()
+        writer = StorageWriter(writer_db)
+        for block_rows in data:
+            writer.write(STRUCTURED_SQL, block_rows)
+        submitted = time.perf_counter() - start
+        writer.close()
+        batched = time.perf_counter() - start
+
+    print(f"{blocks} 个文本块，共 {rows} 行")
+    print(f"旧版（每块连接+逐行插入）: {legacy:.3f}秒，{rows / legacy:,.0f} 行/秒")
+    print(f"批量写入器: {batched:.3f}秒，{rows / batched:,.0f} 行/秒（调用方阻塞 {submitted:.3f}秒）")
+
+QUERY_INDICATORS = ["资产规模", "贷款余额", "存款余额", "净利润", "营业收入", "利息净收入",
+                    "不良贷款率", "拨备覆盖率", "资本充足率", "净息差"]
+
+def bench_query(reports: int, repeat: int) -> None:
+    """构造多家公司多年的指标数据，测试时间序列和截面查询的耗时"""
+    indicators = [item for item in _load_json(DATA_DIR / "annual" / "2023.json")["financial_data"]]
+    indicators += [{"indicator_name": name, "value": 1.0, "unit": "亿元"} for name in QUERY_INDICATORS]
+    years = list(range(2014, 2024))
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = DataStorage(Path(tmp) / "query.db")
+        start = time.perf_counter()
+        for i in range(reports):
+            year = years[i % len(years)]
+            company = f"公司{i // len(years):04d}"
+            report_id = storage.register_report(company, year)
+            items = [dict(item, time=f"{year}年") for item in indicators]
+            storage.save_to_db({"financial_data": items}, year, report_id=report_id)
+        load = time.perf_counter() - start
+
+        query = IndicatorQuery(storage)
+        rows = query.conn.execute("SELECT COUNT(*) FROM financial_data").fetchone()[0]
+        print(f"{reports} 份报告，共 {rows} 行，写入耗时 {load:.2f}秒")
+
+        cases = {
+            "时间序列(单公司)": lambda: query.time_series("净利润", company="公司0003", start=2019, end=2023),
+            "时间序列(全部公司)": lambda: query.time_series("利息净收入", start=2019, end=2023),
+            "截面": lambda: query.cross_section("资产规模", 2021),
+            "指标前缀": lambda: query.indicators("贷款"),
+        }
+        for name, case in cases.items():
+            result = case()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                case()
+            elapsed = (time.perf_counter() - start) / repeat
+            print(f"{name:<16}{len(result):>8} 行{elapsed * 1000:>10.2f} 毫秒")
+        query.close()
+
+def _legacy_classify(lines: List[str], blocks: List[Dict[str, Any]]) -> List[Any]:
+    """旧版标题判断和类型猜测：每次调用都逐个匹配正则和关键词"""
+    h1 = ['^' + pattern for pattern in H1_PATTERNS]
+    h2 = ['^' + pattern for pattern in H2_PATTERNS]
+    results = [(any(re.match(p, line.strip()) for p in h1), any(re.match(p, line.strip()) for p in h2)) for line in lines]
+    for block in blocks:
+        text_full = f"{block['h1_title']} {block['h2_title']} {block['text']}"
+        results.append(next((name for name, words in BLOCK_TYPE_KEYWORDS.items()
+                             if any(k in text_full for k in words)), "other"))
+    return results
+
+def bench_matcher(repeat: int) -> None:
+    """用cut.json中的文本测试标题判断和类型猜测的耗时"""
+    blocks = _load_json(DATA_DIR / "cut.json")["blocks"]
+    lines = [block["text"] for block in blocks] + [title for block in blocks for title in (block["h1_title"], block["h2_title"])]
+    cutter = PDFCutter()
+
+    def current() -> List[Any]:
+        results = [(cutter._is_h1_title(line), cutter._is_h2_title(line)) for line in lines]
+        for block in blocks:
+            titles = {"h1": block["h1_title"], "h2": block["h2_title"]}
+            results.append(cutter._guess_block_type(block["text"], titles))
+        return results
+
+    assert current() == _legacy_classify(lines, blocks), "新旧实现的结果不一致"
+    for name, case in (("旧版", lambda: _legacy_classify(lines, blocks)), ("预编译匹配器", current)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            case()
+        elapsed = (time.perf_counter() - start) / repeat
+        print(f"{name:<12}{len(lines)} 行 + {len(blocks)} 个文本块{elapsed * 1000:>10.2f} 毫秒")
+
+def main():
+    parser = argparse.ArgumentParser(description="性能基准测试")
+    parser.add_argument("target", choices=["stream", "storage", "query", "matcher"], help="测试项目")
+    parser.add_argument("--repeat", type=int, default=100, help="重复次数")
+    parser.add_argument("--blocks", type=int, default=2000, help="storage测试写入的文本块数")
+    parser.add_argument("--reports", type=int, default=2000, help="query测试构造的报告数")
+    args = parser.parse_args()
+
+    if args.target == "stream":
+        bench_stream(args.repeat)
+    elif args.target == "storage":
+        bench_storage(args.blocks)
+    elif args.target == "query":
+        bench_query(args.reports, args.repeat)
+    elif args.target == "matcher":
+        bench_matcher(args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+def atomic_write_json(path: Path, data: Any, indent: int = 2) -> None:
+    """先写临时文件并fsync，再原子替换目标文件，避免中途崩溃留下半个文件"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class CheckpointLog:
+    """追加写入的检查点日志（每行一条JSON记录）
+
+    每次提交只追加一行，代价与已处理的数量无关；
+    定期由调用方把完整状态写成快照后调用clear()压缩日志。
+    """
+    def __init__(self, path: Path, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """单次顺序读取所有完整的记录，忽略崩溃时写了一半的最后一行"""
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    self.logger.warning(f"忽略检查点日志中不完整的记录: {self.path.name} 第{line_no}行")
+
+    def load(self) -> List[Dict[str, Any]]:
+        """读取所有记录"""
+        return list(self)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """追加一条记录并落盘"""
+        self.append_many([record])
+
+    def append_many(self, records: List[Dict[str, Any]]) -> None:
+        """追加多条记录并落盘"""
+        data = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+                if self._file.tell() > 0 and not self._ends_with_newline():
+                    # 上次崩溃时最后一行没写完，另起一行避免新记录与其粘连
+                    self._file.write('\n')
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def clear(self) -> None:
+        """清空日志（在完整快照写入之后调用）"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self.path.exists():
+                self.path.unlink()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,126 @@
+import re
+from typing import Dict, Any, Generator, Iterable, List, Tuple
+
+from .utils import estimate_tokens, is_cjk
+from .segment import split_sentences
+
+# 以这些标点结尾的行是段落的最后一行；报表的行没有句末标点，整张表留在同一段中
+_PARAGRAPH_END = ('。', '！', '？', '!', '?', '；', ';', '：', ':')
+# 章节标题：第X节、第X章、一、等，尽量让新章节从新的文本块开始
+_SECTION_RE = re.compile(r'^(?:第[一二三四五六七八九十百]+[节章部分]|[一二三四五六七八九十]+、)')
+
+def chunk_token_budget(context_window: int, prompt_tokens: int, output_tokens: int, margin: float = 0.1) -> int:
+    """单个文本块可用的token数：上下文窗口减去提示词和输出预留，再留出估算误差的余量"""
+    return max(256, int((context_window - prompt_tokens - output_tokens) * (1 - margin)))
+
+class TokenChunker:
+    """按估算的token数把文本组合成文本块，中文按字、其余按字符估算（utils.estimate_tokens）
+
+    文本先按行末标点和章节标题分成段落，段落整体放入文本块，尽量把块填满max_tokens；
+    遇到一级章节标题且当前块已用到section_fill以上时另起新块。单个段落超出上限时按句子切开，
+    句子仍超出时按字切开。overlap_tokens大于0时，新块以上一块末尾这么多token的句子开头，
+    保留跨块的上下文。
+    """
+    def __init__(self, max_tokens: int = 4000, overlap_tokens: int = 0, section_fill: float = 0.5):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 4)
+        self.section_fill = section_fill
+        self._piece_tokens = max_tokens - self.overlap_tokens  # 单个片段的上限，加上重叠部分仍不超过max_tokens
+
+    def chunk_text(self, text: str) -> Generator[str, None, None]:
+        yield from self.chunk_paragraphs(self.paragraphs(text.split('\n')))
+
+    def chunk_pages(self, pages: Iterable[Dict[str, Any]]) -> Generator[str, None, None]:
+        """惰性地把逐页文本切分为文本块，跨页的段落不会被拆开"""
+        lines = (line for page in pages for line in page["text"].split('\n'))
+        yield from self.chunk_paragraphs(self.paragraphs(lines))
+
+    @staticmethod
+    def paragraphs(lines: Iterable[str]) -> Generator[Tuple[str, bool], None, None]:
+        """把行组合成段落，产出 (段落文本, 是否以章节标题开头)；段内保留原来的换行"""
+        current = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if _SECTION_RE.match(line) and current:
+                yield '\n'.join(current), bool(_SECTION_RE.match(current[0]))
+                current = []
+            current.append(line)
+            if line.endswith(_PARAGRAPH_END):
+                yield '\n'.join(current), bool(_SECTION_RE.match(current[0]))
+                current = []
+        if current:
+            yield '\n'.join(current), bool(_SECTION_RE.match(current[0]))
+
+    def chunk_paragraphs(self, paragraphs: Iterable[Tuple[str, bool]]) -> Generator[str, None, None]:
+        current, used = [], 0
+        for text, section in paragraphs:
+            for piece in self._pieces(text):
+                tokens = estimate_tokens(piece) + 1  # +1 为换行
+                new_section = section and used >= self.max_tokens * self.section_fill
+                if current and (used + tokens > self.max_tokens or new_section):
+                    yield '\n'.join(current)
+                    # 新章节不需要上一章的结尾作为上下文
+                    current = [] if new_section else self._overlap(current)
+                    used = sum(estimate_tokens(part) + 1 for part in current)
+                current.append(piece)
+                used += tokens
+                section = False
+        if current:
+            yield '\n'.join(current)
+
+    def _pieces(self, text: str) -> List[str]:
+        """不超过片段上限的段落原样返回，否则按句子（报表按行）组合成片段，仍超出时按字切开"""
+        if estimate_tokens(text) < self._piece_tokens:
+            return [text]
+        pieces, current, used = [], "", 0
+        for unit, separator in self._units(text):
+            tokens = estimate_tokens(unit) + 1
+            if current and used + tokens >= self._piece_tokens:
+                pieces.append(current)
+                current, used = "", 0
+            current = f"{current}{separator}{unit}" if current else unit
+            used += tokens
+        if current:
+            pieces.append(current)
+        return pieces
+
+    def _units(self, text: str) -> Generator[Tuple[str, str], None, None]:
+        """产出 (句子或行, 与前文的分隔符)，每个都不超过片段上限"""
+        for sentence in split_sentences(text):
+            if estimate_tokens(sentence) < self._piece_tokens:
+                yield sentence, ""
+                continue
+            for line in sentence.split('\n'):
+                if estimate_tokens(line) < self._piece_tokens:
+                    yield line, "\n"
+                else:
+                    for part in self._cut(line):
+                        yield part, ""
+
+    def _cut(self, text: str) -> List[str]:
+        """按字切开：中文每字约1个token，其余每字约1/4个token"""
+        pieces, start, used = [], 0, 0.0
+        limit = self._piece_tokens - 1
+        for i, char in enumerate(text):
+            cost = 1.0 if is_cjk(char) else 0.25
+            if used + cost > limit:
+                pieces.append(text[start:i])
+                start, used = i, 0.0
+            used += cost
+        pieces.append(text[start:])
+        return pieces
+
+    def _overlap(self, parts: List[str]) -> List[str]:
+        """上一块末尾不超过overlap_tokens的句子"""
+        if not self.overlap_tokens:
+            return []
+        tail, used = [], 0
+        for sentence in reversed(split_sentences(parts[-1])):
+            tokens = estimate_tokens(sentence)
+            if used + tokens > self.overlap_tokens:
+                break
+            tail.insert(0, sentence)
+            used += tokens
+        return [''.join(tail)] if tail else []
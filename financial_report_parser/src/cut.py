@@ -1,8 +1,7 @@
-import pdfplumber
+import argparse
 import json
-import re
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Set, Tuple
 import sys
 import os
 
@@ -11,92 +10,228 @@ project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
 from src.utils import ProgressBar, stream_output, setup_logging
+from src.pdf_pool import count_pages, iter_pages
+from src.table_extractor import parse_statement_table
+from src.data_storage import StorageWriter, init_db, structured_rows, STRUCTURED_INSERT_SQL
+from src.matcher import KeywordMatcher, compile_alternation
+from src.metrics import get_metrics, instrumented, add_cli_arguments
+from src.layout import HeadingDetector, SectionTreeBuilder, page_lines
+from src.toc import select_pages
+from src.segment import ParagraphSegmenter
+
+# 标题规则：每一级合并为一个预编译的正则，每行只匹配一次
+H1_PATTERNS = [
+    r'第[一二三四五六七八九十]+[章节]',
+    r'\d+\.\s*[A-Z\u4e00-\u9fa5]',
+    r'[一二三四五六七八九十]+、',
+    r'[（(]\s*[一二三四五六七八九十]+\s*[)）]'
+]
+H2_PATTERNS = [
+    r'\d+\.\d+\s+',
+    r'（[一二三四五六七八九十]+）',
+    r'\([1-9]\)',
+    r'[（(]\s*\d+\s*[)）]'
+]
+_H1_RE = compile_alternation(H1_PATTERNS)
+_H2_RE = compile_alternation(H2_PATTERNS)
+
+# 文本块类型关键词，按优先级排列；都不命中时为other
+BLOCK_TYPE_KEYWORDS = {
+    "financial": ["财务", "收入", "利润", "资产", "负债"],
+    "business": ["业务", "客户", "市场", "产品", "服务"],
+    "risk": ["风险", "合规", "监管", "控制", "审计"],
+    "strategy": ["战略", "规划", "目标", "展望", "计划"],
+    "governance": ["治理", "董事会", "股东", "管理层", "组织"]
+}
+_BLOCK_TYPE_MATCHER = KeywordMatcher(BLOCK_TYPE_KEYWORDS)
+
+_PUNCTUATION_TABLE = str.maketrans({
+    ',': '，',
+    '.': '。',
+    ':': '：',
+    ';': '；',
+    '?': '？',
+    '!': '！',
+    '(': '（',
+    ')': '）'
+})
 
 class PDFCutter:
-    def __init__(self):
+    def __init__(self, workers: int = 1, extract_tables: bool = True, year: int = None, page_cache=None,
+                 layout_headings: bool = True, min_block_chars: int = 80, max_block_chars: int = 600):
         """初始化PDF切分器"""
         self.logger = setup_logging()
+        self.workers = workers  # 并行提取页面的进程数
+        self.page_cache = page_cache  # 页面解析缓存，调整标题和切分规则后重跑不必重新解析PDF
+        self.extract_tables = extract_tables  # 报表直接解析为指标，不再切分成文本块交给LLM
+        self.year = year  # 用于解析"本期"、"上年同期"等相对期间
+        self.layout_headings = layout_headings  # 按字号、字重识别标题，学不到标题样式时退回正则规则
+        self.detector = HeadingDetector()
+        self.min_block_chars = min_block_chars  # 折行和跨页的句子合并成段落后，再切成这个长度范围内的文本块
+        self.max_block_chars = max_block_chars
+        self.sections = []  # 章节树
+        self.table_items = []
+        self._title_masks = {}  # 同一章节的文本块共用标题，标题的关键词只匹配一次
         self.logger.info("初始化PDF切分器")
 
-    def process_pdf(self, pdf_path: Path, output_path: Path) -> None:
-        """处理PDF文件并保存切分结果"""
+    def process_pdf(self, pdf_path: Path, output_path: Path, db_path: Path = None, report_id: int = None,
+                    sections: List[str] = None) -> None:
+        """处理PDF文件并保存切分结果；报表中的指标保存到 <output>_tables.json，指定db_path时同时写入数据库
+
+        指定sections（章节别名或标题关键字）时按目录只处理这些章节的页面，目录索引保存到 <output>_toc.json。
+        """
         self.logger.info(f"开始处理PDF文件: {pdf_path}")
-        text_blocks = self._extract_text_blocks(pdf_path)
+        self.table_items = []
+        pages = select_pages(pdf_path, sections, self.page_cache, output_path.with_name(output_path.stem + "_toc.json"))
+        text_blocks = self._extract_text_blocks(pdf_path, pages)
         self._save_blocks(text_blocks, output_path)
+        self._save_sections(output_path.with_name(output_path.stem + "_sections.json"))
         self.logger.info(f"处理完成，共生成 {len(text_blocks)} 个文本块")
+        if self.extract_tables:
+            self._save_table_items(output_path.with_name(output_path.stem + "_tables.json"), db_path, report_id)
 
-    def _split_into_sentences(self, text: str) -> List[str]:
-        """将文本分割成句子"""
-        sentence_ends = '。！？；!?;\n'
-        text = text.replace('\r\n', '\n').strip()
-        text = ' '.join(text.split())
-        
-        sentences = []
-        start = 0
-        
-        for i, char in enumerate(text):
-            if char in sentence_ends:
-                sentence = text[start:i+1].strip()
-                if sentence:
-                    sentences.append(sentence)
-                start = i + 1
-        
-        if start < len(text):
-            sentence = text[start:].strip()
-            if sentence:
-                sentences.append(sentence)
-        
-        return sentences
+    def _extract_text_blocks(self, pdf_path: Path, pages: Set[int] = None) -> List[Dict[str, Any]]:
+        """从PDF中提取文本块
 
-    def _extract_text_blocks(self, pdf_path: Path) -> List[Dict[str, Any]]:
-        """从PDF中提取文本块"""
-        blocks = []
-        current_title = {"h1": "", "h2": ""}
+        逐页读取时解析报表并收集各行的文字和样式；读完整份文档后学习标题样式，
+        再按页序识别标题、把正文行合并为段落并切分成文本块，同时生成章节树。
+        """
+        page_records = []  # 每页 (页码, 行, [(报表顶部位置, 指标)])
+        metrics = get_metrics()
         
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                total_pages = len(pdf.pages)
-                progress = ProgressBar(total_pages, prefix='提取PDF页面:', suffix='完成')
-                
-                for i, page in enumerate(pdf.pages):
-                    try:
-                        text = page.extract_text() or ""
-                        lines = text.split('\n')
-                        
-                        for line in lines:
-                            if self._is_h1_title(line):
-                                current_title["h1"] = line
-                                current_title["h2"] = ""
-                                continue
-                            
-                            if self._is_h2_title(line):
-                                current_title["h2"] = line
-                                continue
-                            
-                            sentences = self._split_into_sentences(line)
-                            for sentence in sentences:
-                                if sentence:
-                                    block = self._create_block(sentence, current_title, page.page_number)
-                                    blocks.append(block)
-                                    
-                                    if len(blocks) % 100 == 0:
-                                        self.logger.info(f"已生成 {len(blocks)} 个文本块")
-                        
-                        progress.print(i + 1)
-                    except Exception as e:
-                        self.logger.error(f"处理第 {i+1} 页时出错: {str(e)}")
-                        continue
-                
-                self.logger.info(f"PDF处理完成，共生成 {len(blocks)} 个文本块")
+            total_pages = len(pages) if pages is not None else count_pages(pdf_path, self.page_cache)
+            progress = ProgressBar(total_pages, prefix='提取PDF页面:', suffix='完成')
+            
+            # 页面文本由多个进程并行提取，标题状态在读完后按页序串行推进，保证跨区间的标题正确
+            for i, record in enumerate(iter_pages(pdf_path, self.workers, with_tables=self.extract_tables,
+                                                  cache=self.page_cache, layout=self.layout_headings, pages=pages)):
+                try:
+                    metrics.observe("pdf.extract_page", record.get("elapsed", 0.0))
+                    metrics.count("pdf.pages")
+                    if record["error"]:
+                        metrics.count("pdf.page_errors")
+                        raise Exception(record["error"])
+                    with metrics.timer("cut.parse_tables"):
+                        tables = [(table["bbox"][1] if table.get("bbox") else 0.0,
+                                   parse_statement_table(table["rows"], table["unit"], self.year, record["page"]))
+                                  for table in record["tables"]]
+                    page_records.append((record["page"], self._page_lines(record), tables))
+                    progress.print(i + 1)
+                except Exception as e:
+                    self.logger.error(f"处理第 {i+1} 页时出错: {str(e)}")
+                    continue
+            
+            with metrics.timer("cut.detect_headings"):
+                self._learn_headings(page_records)
+            blocks = []
+            current_title = {"h1": "", "h2": ""}
+            sections = SectionTreeBuilder()
+            segmenter = ParagraphSegmenter(self.min_block_chars, self.max_block_chars)
+            for page, lines, tables in page_records:
+                self._split_page(page, lines, tables, current_title, blocks, sections, segmenter)
+            self._add_blocks(segmenter.flush(), current_title, blocks)
+            self.sections = sections.finish(len(blocks))
+            
+            metrics.count("cut.paragraphs", segmenter.paragraphs)
+            metrics.count("cut.blocks", len(blocks))
+            metrics.count("cut.table_items", len(self.table_items))
+            self.logger.info(f"PDF处理完成，共生成 {len(blocks)} 个文本块")
+            if self.extract_tables:
+                self.logger.info(f"从报表中直接解析出 {len(self.table_items)} 条指标")
         except Exception as e:
             self.logger.error(f"处理PDF文件时出错: {str(e)}")
             raise
         
         return blocks
 
-    def _create_block(self, sentence: str, titles: Dict[str, str], page: int) -> Dict[str, Any]:
+    def _page_lines(self, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """页面的行：有版面信息时带字号、字重和位置，否则只有文字"""
+        if self.layout_headings and "words" in record:
+            return page_lines(record)
+        return [{"text": line, "page": record["page"]} for line in record["text"].split('\n')]
+
+    def _learn_headings(self, pages: List[Tuple[int, List[Dict[str, Any]], List]]) -> None:
+        """从整份文档的行中学习标题样式"""
+        self.detector.learn(line for _, lines, _ in pages for line in lines if "size" in line)
+        if self.detector.learned:
+            styles = "，".join(f"H{style['level']}={style['size']}pt{'粗体' if style['bold'] else ''}"
+                              f"({style['lines']}行)" for style in self.detector.styles)
+            self.logger.info(f"按版面识别标题：正文 {self.detector.body_size}pt，{styles}")
+        elif self.layout_headings:
+            self.logger.warning("没有学到标题样式，按正则规则识别标题")
+
+    def _heading_level(self, line: Dict[str, Any]) -> int:
+        """行的标题级别，0表示正文"""
+        if self.detector.learned and "size" in line:
+            return self.detector.level(line)
+        if self._is_h1_title(line["text"]):
+            return 1
+        if self._is_h2_title(line["text"]):
+            return 2
+        return 0
+
+    def _split_page(self, page: int, lines: List[Dict[str, Any]], tables: List[Tuple[float, List[Dict[str, Any]]]],
+                    current_title: Dict[str, str], blocks: List[Dict[str, Any]], sections: SectionTreeBuilder,
+                    segmenter: ParagraphSegmenter) -> None:
+        """按行识别标题并把正文交给segmenter组合成段落，标题状态和未结束的段落跨页推进
+
+        报表指标使用其所在位置之前最近的标题；没有位置信息时使用本页开始时的标题。
+        """
+        pending_tables = sorted(tables, key=lambda table: table[0])
+
+        def flush_tables(until: float = None) -> None:
+            while pending_tables and (until is None or pending_tables[0][0] <= until):
+                for item in pending_tables.pop(0)[1]:
+                    item.update(h1_title=current_title["h1"], h2_title=current_title["h2"])
+                    self.table_items.append(item)
+
+        with get_metrics().timer("cut.split_blocks"):
+            segmenter.begin_page(page, [line for line in lines if not self.detector.is_running(line)])
+            heading = None  # 上一行是标题时为 (章节, 行)，用于合并折行的标题
+            for line_info in lines:
+                flush_tables(line_info.get("top"))
+                if "size" in line_info and self.detector.is_running(line_info):
+                    continue
+                line = line_info["text"]
+                level = self._heading_level(line_info)
+                if level:
+                    if heading is not None and self._continues_heading(heading[1], line_info, level):
+                        sections.extend_title(heading[0], line.strip())
+                        current_title["h1" if level == 1 else "h2"] = heading[0]["title"]
+                        heading = (heading[0], line_info)
+                        continue
+                    # 段落不跨越标题，标题之前的正文使用原来的标题
+                    self._add_blocks(segmenter.flush(), current_title, blocks)
+                    if level == 1:
+                        current_title["h1"] = line
+                        current_title["h2"] = ""
+                    else:
+                        current_title["h2"] = line
+                    node = sections.add(line.strip(), level, page, len(blocks))
+                    node["type"] = _BLOCK_TYPE_MATCHER.first_label(_BLOCK_TYPE_MATCHER.mask(node["title"]), "other")
+                    heading = (node, line_info)
+                    continue
+                heading = None
+                self._add_blocks(segmenter.feed(line_info), current_title, blocks)
+            flush_tables()
+
+    def _add_blocks(self, segments: List[Tuple[str, int]], titles: Dict[str, str], blocks: List[Dict[str, Any]]) -> None:
+        """把segmenter完成的 (文本, 页码) 转为文本块"""
+        for text, page in segments:
+            blocks.append(self._create_block(text, titles, page))
+            if len(blocks) % 100 == 0:
+                self.logger.info(f"已生成 {len(blocks)} 个文本块")
+
+    def _continues_heading(self, previous: Dict[str, Any], line: Dict[str, Any], level: int) -> bool:
+        """同级、同页且紧接在上一行标题之后的标题行是折行"""
+        if "size" not in line or level != self.detector.level(previous):
+            return False
+        return line["page"] == previous["page"] and line["top"] - previous["bottom"] < line["size"]
+
+    def _create_block(self, segment: str, titles: Dict[str, str], page: int) -> Dict[str, Any]:
         """创建文本块"""
-        text = self._clean_text(sentence)
+        text = self._clean_text(segment)
         return {
             "text": text,
             "length": len(text),
@@ -108,20 +243,7 @@ class PDFCutter:
 
     def _clean_text(self, text: str) -> str:
         """清理文本内容"""
-        text = ' '.join(text.split())
-        punctuation_map = {
-            ',': '，',
-            '.': '。',
-            ':': '：',
-            ';': '；',
-            '?': '？',
-            '!': '！',
-            '(': '（',
-            ')': '）'
-        }
-        for en, cn in punctuation_map.items():
-            text = text.replace(en, cn)
-        return text.strip()
+        return ' '.join(text.split()).translate(_PUNCTUATION_TABLE)
 
     def _save_blocks(self, blocks: List[Dict[str, Any]], output_path: Path) -> None:
         """保存文本块"""
@@ -132,49 +254,88 @@ class PDFCutter:
                 "blocks": blocks
             }, f, ensure_ascii=False, indent=2)
 
+    def _save_sections(self, json_path: Path) -> None:
+        """保存章节树：每个章节的标题、级别、起始页、类型和其下文本块的范围"""
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "source": "layout" if self.detector.learned else "regex",
+                **self.detector.summary(),
+                "sections": self.sections
+            }, f, ensure_ascii=False, indent=2)
+
+    def _save_table_items(self, json_path: Path, db_path: Path = None, report_id: int = None) -> None:
+        """保存报表中解析出的指标"""
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "total_items": len(self.table_items),
+                "items": self.table_items
+            }, f, ensure_ascii=False, indent=2)
+        if db_path is None:
+            return
+        if report_id is None:
+            # 没有关联的报告时无法替换旧记录，重复切分会写入重复的指标
+            self.logger.warning("未能确定报告年份，报表指标不写入数据库（可用--year指定）")
+            return
+        init_db(db_path)
+        writer = StorageWriter(db_path)
+        # 重新切分同一份报告时替换之前解析的报表指标
+        writer.write("DELETE FROM structured_data WHERE report_id = ? AND type = 'table'", [(report_id,)])
+        writer.write(STRUCTURED_INSERT_SQL, structured_rows(self.table_items, report_id=report_id))
+        writer.close()
+        self.logger.info(f"已写入 {writer.rows_written} 条报表指标到数据库")
+
     def _is_h1_title(self, line: str) -> bool:
         """判断是否为一级标题"""
-        patterns = [
-            r'^第[一二三四五六七八九十]+[章节]',
-            r'^\d+\.\s*[A-Z\u4e00-\u9fa5]',
-            r'^[一二三四五六七八九十]+、',
-            r'^[（(]\s*[一二三四五六七八九十]+\s*[)）]'
-        ]
-        return any(re.match(pattern, line.strip()) for pattern in patterns)
+        return _H1_RE.match(line.strip()) is not None
 
     def _is_h2_title(self, line: str) -> bool:
         """判断是否为二级标题"""
-        patterns = [
-            r'^\d+\.\d+\s+',
-            r'^（[一二三四五六七八九十]+）',
-            r'^\([1-9]\)',
-            r'^[（(]\s*\d+\s*[)）]'
-        ]
-        return any(re.match(pattern, line.strip()) for pattern in patterns)
+        return _H2_RE.match(line.strip()) is not None
 
     def _guess_block_type(self, text: str, titles: Dict[str, str]) -> str:
         """猜测文本块类型"""
-        keywords = {
-            "financial": ["财务", "收入", "利润", "资产", "负债"],
-            "business": ["业务", "客户", "市场", "产品", "服务"],
-            "risk": ["风险", "合规", "监管", "控制", "审计"],
-            "strategy": ["战略", "规划", "目标", "展望", "计划"],
-            "governance": ["治理", "董事会", "股东", "管理层", "组织"],
-            "other": []
-        }
-        text_full = f"{titles['h1']} {titles['h2']} {text}"
-        for type_name, type_keywords in keywords.items():
-            if any(k in text_full for k in type_keywords):
-                return type_name
-        return "other"
+        title_key = (titles['h1'], titles['h2'])
+        title_mask = self._title_masks.get(title_key)
+        if title_mask is None:
+            title_mask = self._title_masks[title_key] = _BLOCK_TYPE_MATCHER.mask(f"{titles['h1']} {titles['h2']}")
+        # 关键词不会跨越标题和正文之间的空格，分开匹配结果与拼接后匹配相同
+        return _BLOCK_TYPE_MATCHER.first_label(title_mask | _BLOCK_TYPE_MATCHER.mask(text), "other")
 
 def main():
     base_dir = Path(__file__).parent.parent
-    pdf_path = base_dir / "data" / "annual" / "2023年报.pdf"
-    output_path = base_dir / "data" / "cut.json"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    cutter = PDFCutter()
-    cutter.process_pdf(pdf_path, output_path)
+    parser = argparse.ArgumentParser(description="把年报PDF切分为文本块")
+    parser.add_argument("--pdf", type=Path, default=base_dir / "data" / "annual" / "2023年报.pdf", help="年报PDF")
+    parser.add_argument("--output", type=Path, default=base_dir / "data" / "cut.json", help="切分结果")
+    parser.add_argument("--db", type=Path, default=base_dir / "data" / "extracted.db", help="报表指标写入的数据库")
+    parser.add_argument("--company", default="", help="报告所属公司，默认从文件名推断")
+    parser.add_argument("--year", type=int, help="报告年份，用于解析相对期间并关联报告，默认从文件名推断")
+    parser.add_argument("--no-tables", action="store_true", help="不单独解析报表，全部切分为文本块")
+    parser.add_argument("--no-page-cache", action="store_true", help="不使用页面解析缓存，重新解析全部页面")
+    parser.add_argument("--regex-headings", action="store_true", help="只按正则规则识别标题，不使用字号等版面信息")
+    parser.add_argument("--sections", nargs="*", default=None,
+                        help="按目录只处理这些章节：别名（financial、mdna、summary、governance、risk、events、esg）"
+                             "或标题中的关键字，默认使用配置中的SECTION_FILTER")
+    add_cli_arguments(parser)
+    args = parser.parse_args()
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    
+    from config.settings import (PDF_WORKERS, METRICS_DIR, PROFILE, PAGE_CACHE_ENABLED, PAGE_CACHE_PATH,
+                                 SECTION_FILTER, BLOCK_MIN_CHARS, BLOCK_MAX_CHARS)
+    from src.data_storage import DataStorage
+    from src.page_cache import PageCache
+    from src.batch import infer_report_info
+    company, year = infer_report_info(args.pdf)
+    company, year = args.company or company, args.year or year
+    page_cache = PageCache(PAGE_CACHE_PATH) if PAGE_CACHE_ENABLED and not args.no_page_cache else None
+    cutter = PDFCutter(workers=PDF_WORKERS, extract_tables=not args.no_tables, year=year, page_cache=page_cache,
+                       layout_headings=not args.regex_headings, min_block_chars=BLOCK_MIN_CHARS,
+                       max_block_chars=BLOCK_MAX_CHARS)
+    with instrumented("cut", args.metrics_dir or METRICS_DIR, args.profile or PROFILE, log=cutter.logger):
+        report_id = DataStorage(args.db).register_report(company, year, args.pdf) if year else None
+        if year is None:
+            cutter.logger.warning(f"无法从文件名推断年份，相对期间无法解析: {args.pdf.name}")
+        cutter.process_pdf(args.pdf, args.output, db_path=args.db, report_id=report_id,
+                           sections=SECTION_FILTER if args.sections is None else args.sections)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
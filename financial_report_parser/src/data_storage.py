@@ -1,7 +1,241 @@
 import sqlite3
 import json
+import queue
+import threading
+import logging
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Sequence
+
+from .units import canonicalize, normalize_indicator, normalize_period
+from .metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+def connect(db_path: Path, check_same_thread: bool = True) -> sqlite3.Connection:
+    """打开数据库连接并启用WAL日志和NORMAL同步级别"""
+    # 批处理时多个进程共用一个数据库，遇到锁时等待而不是立即报错
+    conn = sqlite3.connect(db_path, check_same_thread=check_same_thread, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def _baseline_schema(conn: sqlite3.Connection) -> None:
+    """版本1：引入版本号之前就存在的表"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS financial_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            year INTEGER NOT NULL,
+            indicator_name TEXT NOT NULL,
+            value REAL NOT NULL,
+            unit TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute('''CREATE TABLE IF NOT EXISTS structured_data
+                    (id INTEGER PRIMARY KEY,
+                     type TEXT,
+                     name TEXT,
+                     value REAL,
+                     unit TEXT,
+                     time TEXT,
+                     block_id INTEGER)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS unstructured_data
+                    (id INTEGER PRIMARY KEY,
+                     type TEXT,
+                     content TEXT,
+                     time TEXT,
+                     block_id INTEGER)''')
+
+def _add_report_dimensions(conn: sqlite3.Connection) -> None:
+    """版本2：增加报告/公司/期间维度、规范化的指标名与单位，以及查询用的索引"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company TEXT NOT NULL DEFAULT '',
+            year INTEGER NOT NULL,
+            source_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(company, year)
+        )
+    """)
+    for column in ("report_id INTEGER REFERENCES reports(id)", "period TEXT", "block_id INTEGER",
+                   "indicator_key TEXT", "canonical_value REAL", "canonical_unit TEXT"):
+        conn.execute(f"ALTER TABLE financial_data ADD COLUMN {column}")
+    for column in ("report_id INTEGER REFERENCES reports(id)", "period TEXT",
+                   "indicator_key TEXT", "canonical_value REAL", "canonical_unit TEXT"):
+        conn.execute(f"ALTER TABLE structured_data ADD COLUMN {column}")
+    conn.execute("ALTER TABLE unstructured_data ADD COLUMN report_id INTEGER REFERENCES reports(id)")
+
+    # 回填已有数据
+    rows = conn.execute("SELECT id, year, indicator_name, value, unit FROM financial_data").fetchall()
+    conn.executemany(
+        "UPDATE financial_data SET period = ?, indicator_key = ?, canonical_value = ?, canonical_unit = ? WHERE id = ?",
+        [(str(year), normalize_indicator(name), *canonicalize(value, unit), row_id)
+         for row_id, year, name, value, unit in rows]
+    )
+    rows = conn.execute("SELECT id, name, value, unit, time FROM structured_data").fetchall()
+    conn.executemany(
+        "UPDATE structured_data SET period = ?, indicator_key = ?, canonical_value = ?, canonical_unit = ? WHERE id = ?",
+        [(normalize_period(time), normalize_indicator(name), *canonicalize(value, unit), row_id)
+         for row_id, name, value, unit, time in rows]
+    )
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_year ON reports(year)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_financial_data_indicator_period ON financial_data(indicator_key, period)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_financial_data_report_block ON financial_data(report_id, block_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_structured_data_indicator_period ON structured_data(indicator_key, period)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_structured_data_report_block ON structured_data(report_id, block_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_unstructured_data_report_block ON unstructured_data(report_id, block_id)")
+
+# 按顺序执行的迁移，第i个迁移把数据库升级到版本i+1；只能在末尾追加，不能修改已发布的迁移
+MIGRATIONS = [
+    _baseline_schema,
+    _add_report_dimensions,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """把数据库升级到最新版本（PRAGMA user_version记录当前版本），返回升级前的版本"""
+    if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+        return SCHEMA_VERSION
+    # 加写锁后重新读取版本，避免多个进程同时执行同一个迁移
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f"数据库版本 {version} 高于程序支持的版本 {SCHEMA_VERSION}")
+        for target in range(version, SCHEMA_VERSION):
+            MIGRATIONS[target](conn)
+            conn.execute(f"PRAGMA user_version = {target + 1}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if version < SCHEMA_VERSION:
+        logger.info(f"数据库已从版本 {version} 升级到版本 {SCHEMA_VERSION}")
+    return version
+
+def init_db(db_path: Path) -> None:
+    """创建或升级数据库结构"""
+    conn = connect(db_path)
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
+
+def structured_rows(items: List[Dict[str, Any]], block_id: Optional[int] = None,
+                    report_id: Optional[int] = None) -> List[tuple]:
+    """把提取出的结构化数据转换为structured_data表的行（同时计算规范化的指标名、期间和数值）"""
+    rows = []
+    for item in items:
+        canonical_value, canonical_unit = canonicalize(item.get("value"), item.get("unit"))
+        rows.append((item.get("type"), item.get("name"), item.get("value"), item.get("unit"), item.get("time"),
+                     block_id, report_id, item.get("period") or normalize_period(item.get("time")),
+                     normalize_indicator(item.get("name")), canonical_value, canonical_unit))
+    return rows
+
+STRUCTURED_INSERT_SQL = '''INSERT INTO structured_data
+                        (type, name, value, unit, time, block_id, report_id, period,
+                         indicator_key, canonical_value, canonical_unit)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+
+UNSTRUCTURED_INSERT_SQL = '''INSERT INTO unstructured_data
+                        (type, content, time, block_id, report_id)
+                        VALUES (?, ?, ?, ?, ?)'''
+
+class StorageWriter:
+    """共享单个连接的批量写入器
+
+    写入请求先进入队列，由后台线程合并为批次，在一个事务内用executemany写入，
+    调用方（例如LLM工作线程）不会因为磁盘写入而阻塞。
+    """
+    _FLUSH = object()
+    _STOP = object()
+
+    def __init__(self, db_path: Path, batch_size: int = 500, flush_interval: float = 1.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self.logger = logging.getLogger(__name__)
+        self._queue = queue.Queue()
+        self._error = None
+        self._conn = connect(db_path, check_same_thread=False)
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, sql: str, rows: Sequence[Sequence[Any]]) -> None:
+        """提交一组写入（同一条SQL的多行参数），立即返回"""
+        self._raise_if_failed()
+        if rows:
+            self._queue.put((sql, list(rows)))
+
+    def flush(self) -> None:
+        """等待队列中已有的写入全部提交"""
+        if not self._thread.is_alive():
+            # 已关闭：写入线程退出前已提交全部数据，没有人处理新的请求
+            self._raise_if_failed()
+            return
+        done = threading.Event()
+        self._queue.put((self._FLUSH, done))
+        done.wait()
+        self._raise_if_failed()
+
+    def close(self) -> None:
+        """写入剩余数据并关闭连接"""
+        if self._thread.is_alive():
+            self._queue.put((self._STOP, None))
+            self._thread.join()
+        self._conn.close()
+        self._raise_if_failed()
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self) -> None:
+        batch = []  # [(sql, rows)]，相邻的同一条SQL合并
+        pending_rows = 0
+        while True:
+            try:
+                sql, payload = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                sql, payload = self._FLUSH, None
+
+            if sql is self._FLUSH or sql is self._STOP:
+                self._commit(batch)
+                batch, pending_rows = [], 0
+                if payload is not None:
+                    payload.set()
+                if sql is self._STOP:
+                    return
+                continue
+
+            if batch and batch[-1][0] == sql:
+                batch[-1][1].extend(payload)
+            else:
+                batch.append((sql, payload))
+            pending_rows += len(payload)
+            if pending_rows >= self.batch_size:
+                self._commit(batch)
+                batch, pending_rows = [], 0
+
+    def _commit(self, batch: List) -> None:
+        if not batch:
+            return
+        try:
+            metrics = get_metrics()
+            with metrics.timer("storage.commit"):
+                with self._conn:
+                    for sql, rows in batch:
+                        self._conn.executemany(sql, rows)
+            rows_written = sum(len(rows) for _, rows in batch)
+            self.rows_written += rows_written
+            metrics.count("storage.rows", rows_written)
+        except Exception as e:
+            self.logger.error(f"批量写入数据库失败: {str(e)}")
+            self._error = e
 
 class DataStorage:
     def __init__(self, db_path: Path):
@@ -10,29 +244,67 @@ class DataStorage:
 
     def _init_db(self):
         """初始化数据库表"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS financial_data (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    year INTEGER NOT NULL,
-                    indicator_name TEXT NOT NULL,
-                    value REAL NOT NULL,
-                    unit TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        init_db(self.db_path)
+
+    def register_report(self, company: str, year: int, source_path: Path = None) -> int:
+        """登记一份报告（同一公司同一年份只登记一次），返回report_id"""
+        conn = connect(self.db_path)
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO reports (company, year, source_path) VALUES (?, ?, ?)",
+                    (company or "", year, str(source_path) if source_path else None)
                 )
-            """)
+                if source_path:
+                    conn.execute("UPDATE reports SET source_path = ? WHERE company = ? AND year = ?",
+                                 (str(source_path), company or "", year))
+            return conn.execute("SELECT id FROM reports WHERE company = ? AND year = ?",
+                                (company or "", year)).fetchone()[0]
+        finally:
+            conn.close()
 
     def save_json(self, data: Dict[str, Any], json_path: Path):
         """保存JSON数据"""
         with open(json_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
 
-    def save_to_db(self, data: Dict[str, Any], year: int):
-        """保存数据到SQLite数据库"""
-        with sqlite3.connect(self.db_path) as conn:
-            for indicator, value in data.items():
-                if isinstance(value, (int, float)):
-                    conn.execute(
-                        "INSERT INTO financial_data (year, indicator_name, value) VALUES (?, ?, ?)",
-                        (year, indicator, value)
-                    ) 
\ No newline at end of file
+    def save_to_db(self, data: Dict[str, Any], year: int, report_id: int = None):
+        """保存数据到SQLite数据库
+
+        data的值可以是数字（键为指标名），也可以是指标记录列表
+        （{"indicator_name", "value", "unit", "time"}，即LLM提取结果的格式）。
+        """
+        records = []
+        for key, value in data.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                records.append({"indicator_name": key, "value": value})
+            elif isinstance(value, list):
+                records.extend(item for item in value if isinstance(item, dict) and item.get("indicator_name"))
+
+        rows = []
+        for item in records:
+            canonical_value, canonical_unit = canonicalize(item.get("value"), item.get("unit"))
+            if canonical_value is None:
+                continue
+            value = item["value"] if isinstance(item["value"], (int, float)) else canonical_value
+            rows.append((year, item["indicator_name"], value, item.get("unit"), report_id,
+                         item.get("period") or normalize_period(item.get("time"), default_year=year), item.get("block_id"),
+                         normalize_indicator(item["indicator_name"]), canonical_value, canonical_unit))
+
+        conn = connect(self.db_path)
+        try:
+            with get_metrics().timer("storage.commit"), conn:
+                if report_id is not None:
+                    # 重新处理同一份报告时替换旧数据，避免重复
+                    conn.execute("DELETE FROM financial_data WHERE report_id = ?", (report_id,))
+                conn.executemany(
+                    """INSERT INTO financial_data
+                       (year, indicator_name, value, unit, report_id, period, block_id,
+                        indicator_key, canonical_value, canonical_unit)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    rows
+                )
+        finally:
+            conn.close()
+        get_metrics().count("storage.rows", len(rows))
+        logger.info(f"写入 {len(rows)} 条指标数据")
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+class RateLimiter:
+    """按分钟限制请求数(RPM)和token数(TPM)的滑动窗口限流器，可被多个线程共享
+
+    由LLMProcessor在每次发出请求前调用，重试、续写和逐块回退的请求同样计入配额。
+    """
+    def __init__(self, rpm: int = 0, tpm: int = 0, window: float = 60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = window
+        self._history = deque()  # (时间戳, token数)
+        self._tokens_in_window = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0) -> float:
+        """阻塞直到配额允许发送一个请求，返回等待的秒数"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._prune(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    self._history.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return waited
+            time.sleep(wait)
+            waited += wait
+
+    def _prune(self, now: float) -> None:
+        """移除窗口外的记录"""
+        while self._history and now - self._history[0][0] >= self.window:
+            _, tokens = self._history.popleft()
+            self._tokens_in_window -= tokens
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        """计算满足配额还需等待的时间"""
+        wait = 0.0
+        if self.rpm and len(self._history) >= self.rpm:
+            oldest = self._history[len(self._history) - self.rpm][0]
+            wait = max(wait, oldest + self.window - now)
+        if self.tpm and self._history and self._tokens_in_window + tokens > self.tpm:
+            # 找到释放足够token所需等待的最早时间点
+            released = 0
+            for timestamp, used in self._history:
+                released += used
+                if self._tokens_in_window - released + tokens <= self.tpm:
+                    break
+            wait = max(wait, timestamp + self.window - now)
+        return wait
+
+class ConcurrentDispatcher:
+    """并发调度器：限制同时在途的任务数，并按提交顺序返回结果"""
+    def __init__(self, max_workers: int = 4, max_in_flight: Optional[int] = None):
+        self.max_workers = max(1, max_workers)
+        self.max_in_flight = max(self.max_workers, max_in_flight or self.max_workers)
+
+    def map(self, fn: Callable[[Any], Any], items: Iterable[Any]) -> Iterator[Tuple[Any, Any, Optional[Exception]]]:
+        """并发执行fn(item)，按items顺序逐个产出(item, 结果, 异常)"""
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = deque()
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                pending.append((item, executor.submit(fn, item)))
+                if len(pending) >= self.max_in_flight:
+                    break
+
+            while pending:
+                item, future = pending.popleft()
+                try:
+                    yield item, future.result(), None
+                except Exception as e:
+                    yield item, None, e
+
+                for next_item in iterator:
+                    pending.append((next_item, executor.submit(fn, next_item)))
+                    break
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -1,7 +1,7 @@
+import argparse
 import json
-import sqlite3
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 import sys
 import os
 
@@ -9,29 +9,48 @@ import os
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from src.utils import setup_logging, stream_output, ProgressBar
+from src.utils import setup_logging, stream_output, ProgressBar, configure_output, VERBOSITY_VERBOSE
 from src.llm_processor import LLMProcessor
+from src.response_cache import ResponseCache
+from src.prompt_registry import PromptRegistry
+from src.checkpoint import CheckpointLog
+from src.resilience import LLMRequestError, RetryPolicy, CircuitBreaker
+from src.metrics import get_metrics, instrumented, add_cli_arguments
+import time
+from src.data_storage import (DataStorage, StorageWriter, init_db, structured_rows,
+                              STRUCTURED_INSERT_SQL, UNSTRUCTURED_INSERT_SQL)
 import colorama
 from colorama import Fore, Style
 
 class DataExtractor:
-    def __init__(self, api_key: str, api_base: str, db_path: Path):
+    def __init__(self, api_key: str, api_base: str, db_path: Path, model: str = "moonshot-v1-8k",
+                 cache: ResponseCache = None, use_cache: bool = True,
+                 timeout: Tuple[float, float] = (10, 120), report_id: int = None, max_continuations: int = 2,
+                 retry_policy: RetryPolicy = None, circuit_breaker: CircuitBreaker = None):
         self.logger = setup_logging()
-        self.llm = LLMProcessor(api_key, api_base)
+        self.llm = LLMProcessor(api_key, api_base, model=model, cache=cache, use_cache=use_cache, timeout=timeout,
+                                max_continuations=max_continuations, retry_policy=retry_policy,
+                                circuit_breaker=circuit_breaker)
         self.db_path = db_path
+        self.report_id = report_id
         colorama.init()
         
-        # 初始化数据库
+        # 初始化数据库，之后的写入都通过共享连接的批量写入器完成
         self._init_db()
+        self.writer = StorageWriter(db_path)
         
-    def process_blocks(self, cut_path: Path, prompts_path: Path, output_path: Path) -> None:
-        """处理所有文本块"""
+    def process_blocks(self, cut_path: Path, prompts_path: Path, output_path: Path, dead_letters_only: bool = False) -> None:
+        """处理所有文本块
+
+        提取失败的块记入死信队列（extract_dead_letters.jsonl）后继续，
+        dead_letters_only=True时只处理队列中的块，结果追加到已有的输出文件。
+        """
         # 加载数据
         with open(cut_path, 'r', encoding='utf-8') as f:
             blocks = json.load(f)["blocks"]
             
-        with open(prompts_path, 'r', encoding='utf-8') as f:
-            prompts = json.load(f)
+        # 按块编号直接查找提示词记录，提示词在调用时才渲染
+        prompts = PromptRegistry.load(prompts_path)
             
         # 准备输出数据
         output_data = {
@@ -39,66 +58,89 @@ class DataExtractor:
             "unstructured": []
         }
         
+        dead_letters = CheckpointLog(output_path.parent / "extract_dead_letters.jsonl")
+        block_ids = range(len(blocks))
+        if dead_letters_only:
+            block_ids = sorted({record["block_id"] for record in dead_letters if record["block_id"] < len(blocks)})
+            self.logger.info(f"{Fore.CYAN}只重新处理死信队列中的 {len(block_ids)} 个文本块{Style.RESET_ALL}")
+            if output_path.exists():
+                with open(output_path, 'r', encoding='utf-8') as f:
+                    output_data = json.load(f)
+        failures = []
+        
         # 显示进度
-        progress = ProgressBar(len(blocks), prefix='处理文本块:', suffix='完成')
+        progress = ProgressBar(max(len(block_ids), 1), prefix='处理文本块:', suffix='完成')
+        routed = 0
         
-        # 处理每个块
-        for i, block in enumerate(blocks):
-            self.logger.info(f"{Fore.GREEN}正在处理第 {i+1}/{len(blocks)} 个文本块{Style.RESET_ALL}")
-            
-            # 获取该块的提示词
-            block_prompts = self._get_block_prompts(prompts, i)
+        # 处理每个块；出错退出时也要把队列中的数据写入数据库
+        try:
+            for done, i in enumerate(block_ids, 1):
+                block = blocks[i]
+                self.logger.info(f"{Fore.GREEN}正在处理第 {i+1}/{len(blocks)} 个文本块{Style.RESET_ALL}")
             
-            # 提取数据
-            data = self._extract_block_data(block, block_prompts)
+                # 分流阶段已判定为没有内容或已用规则提取的块，不再调用LLM
+                entry = prompts.entry(i)
+                triage = entry.get("triage") if entry else None
+                if triage == "skip":
+                    routed += 1
+                    progress.print(done)
+                    continue
+                # 单个块出错（响应格式不对、写入失败等）记入死信队列后继续，只有致命错误才终止
+                try:
+                    if triage == "rules":
+                        routed += 1
+                        data = entry["data"]
+                    else:
+                        messages = prompts.messages(i, block)
+                        if messages is None:
+                            self.logger.warning(f"{Fore.YELLOW}第 {i+1} 个文本块没有可用的提示词，跳过{Style.RESET_ALL}")
+                            progress.print(done)
+                            continue
+                        # 提取数据
+                        data = self._extract_block_data(block, messages)
+                
+                    # 保存数据
+                    self._save_data(data, i)
+                except Exception as e:
+                    self.logger.error(f"{Fore.RED}第 {i+1} 个文本块提取失败: {str(e)}{Style.RESET_ALL}")
+                    if isinstance(e, LLMRequestError) and e.fatal:
+                        self._write_dead_letters(dead_letters, failures)
+                        raise
+                    failures.append({"block_id": i, "error": str(e), "status": getattr(e, "status", None),
+                                     "failed_at": time.strftime("%Y-%m-%d %H:%M:%S")})
+                    progress.print(done)
+                    continue
             
-            # 保存数据
-            self._save_data(data)
+                # 更新输出
+                if "structured" in data:
+                    output_data["structured"].extend(data["structured"])
+                if "unstructured" in data:
+                    output_data["unstructured"].extend(data["unstructured"])
             
-            # 更新输出
-            if "structured" in data:
-                output_data["structured"].extend(data["structured"])
-            if "unstructured" in data:
-                output_data["unstructured"].extend(data["unstructured"])
+                progress.print(done)
             
-            progress.print(i + 1)
+        finally:
+            self.writer.close()
+
+        self.logger.info(f"{Fore.GREEN}共写入 {self.writer.rows_written} 条数据，分流省去 {routed} 次LLM调用{Style.RESET_ALL}")
+        self._write_dead_letters(dead_letters, failures)
+        if failures:
+            self.logger.warning(f"{Fore.YELLOW}{len(failures)} 个文本块提取失败，已记入死信队列，可用 --dead-letters 重新处理{Style.RESET_ALL}")
             
         # 保存输出文件
         self._save_output(output_data, output_path)
         
+    def _write_dead_letters(self, dead_letters: CheckpointLog, failures: List[Dict[str, Any]]) -> None:
+        """用本次失败的块替换死信队列"""
+        dead_letters.clear()
+        if failures:
+            dead_letters.append_many(failures)
+        
     def _init_db(self) -> None:
-        """初始化数据库"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        # 创建表
-        c.execute('''CREATE TABLE IF NOT EXISTS structured_data
-                    (id INTEGER PRIMARY KEY,
-                     type TEXT,
-                     name TEXT,
-                     value REAL,
-                     unit TEXT,
-                     time TEXT,
-                     block_id INTEGER)''')
-                     
-        c.execute('''CREATE TABLE IF NOT EXISTS unstructured_data
-                    (id INTEGER PRIMARY KEY,
-                     type TEXT,
-                     content TEXT,
-                     time TEXT,
-                     block_id INTEGER)''')
-                     
-        conn.commit()
-        conn.close()
-        
-    def _get_block_prompts(self, prompts: Dict[str, Any], block_id: int) -> Dict[str, Any]:
-        """获取特定块的提示词"""
-        for block_prompt in prompts["blocks"]:
-            if block_prompt["block_id"] == block_id:
-                return block_prompt["prompts"]
-        return prompts["default"]
-        
-    def _extract_block_data(self, block: Dict[str, Any], prompts: Dict[str, Any]) -> Dict[str, Any]:
+        """初始化数据库（表结构和迁移统一由data_storage维护）"""
+        init_db(self.db_path)
+        
+    def _extract_block_data(self, block: Dict[str, Any], messages: List[Dict[str, str]]) -> Dict[str, Any]:
         """从文本块中提取数据"""
         self.logger.info(f"\n{Fore.YELLOW}开始处理文本块{Style.RESET_ALL}")
         stream_output(f"\n{Fore.CYAN}文本信息:{Style.RESET_ALL}")
@@ -107,15 +149,17 @@ class DataExtractor:
         stream_output(f"长度: {block['length']} 字符")
         
         # 显示使用的提示词
-        stream_output(f"\n{Fore.CYAN}使用的提示词:{Style.RESET_ALL}")
-        stream_output(json.dumps(prompts, ensure_ascii=False, indent=2))
+        stream_output(f"\n{Fore.CYAN}使用的提示词:{Style.RESET_ALL}", level=VERBOSITY_VERBOSE)
+        stream_output(json.dumps(messages, ensure_ascii=False, indent=2), level=VERBOSITY_VERBOSE)
         
         # 使用LLM提取数据
         stream_output(f"\n{Fore.GREEN}正在调用LLM提取数据...{Style.RESET_ALL}")
-        response = self.llm._call_llm(prompts["analyze"]["messages"])
+        metrics = get_metrics()
+        with metrics.context(block_type=block["type"]), metrics.timer("extract.block"):
+            response = self.llm._call_llm_json(messages)
         
-        stream_output(f"\n{Fore.GREEN}LLM返回结果:{Style.RESET_ALL}")
-        stream_output(response)
+        stream_output(f"\n{Fore.GREEN}LLM返回结果:{Style.RESET_ALL}", level=VERBOSITY_VERBOSE)
+        stream_output(response, level=VERBOSITY_VERBOSE)
         
         try:
             data = json.loads(response)
@@ -164,33 +208,25 @@ class DataExtractor:
                 
         return normalized
         
-    def _save_data(self, data: Dict[str, Any]) -> None:
-        """保存数据到数据库"""
+    def _save_data(self, data: Dict[str, Any], block_id: int = None) -> None:
+        """把数据提交给批量写入器，由后台线程按批写入数据库"""
         stream_output(f"\n{Fore.YELLOW}正在保存数据到数据库...{Style.RESET_ALL}")
         
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
         # 保存结构化数据
-        for item in data.get("structured", []):
-            c.execute('''INSERT INTO structured_data
-                        (type, name, value, unit, time)
-                        VALUES (?, ?, ?, ?, ?)''',
-                     (item["type"], item["name"], item["value"],
-                      item["unit"], item["time"]))
-            stream_output(f"保存结构化数据: {item['name']}")
+        structured = data.get("structured", [])
+        self.writer.write(STRUCTURED_INSERT_SQL, structured_rows(structured, block_id, self.report_id))
+        for item in structured:
+            stream_output(f"保存结构化数据: {item['name']}", level=VERBOSITY_VERBOSE)
         
         # 保存非结构化数据
-        for item in data.get("unstructured", []):
-            c.execute('''INSERT INTO unstructured_data
-                        (type, content, time)
-                        VALUES (?, ?, ?)''',
-                     (item["type"], item["content"], item["time"]))
-            stream_output(f"保存非结构化数据: {item['type']}")
+        unstructured = data.get("unstructured", [])
+        self.writer.write(UNSTRUCTURED_INSERT_SQL,
+                          [(item["type"], item["content"], item["time"], block_id, self.report_id)
+                           for item in unstructured])
+        for item in unstructured:
+            stream_output(f"保存非结构化数据: {item['type']}", level=VERBOSITY_VERBOSE)
         
-        conn.commit()
-        conn.close()
-        stream_output(f"{Fore.GREEN}数据保存完成{Style.RESET_ALL}")
+        stream_output(f"{Fore.GREEN}数据已提交写入{Style.RESET_ALL}")
         
     def _save_output(self, data: Dict[str, Any], output_path: Path) -> None:
         """保存输出文件"""
@@ -200,17 +236,40 @@ class DataExtractor:
 def main():
     # 设置路径
     base_dir = Path(__file__).parent.parent
-    cut_path = base_dir / "data" / "cut.json"
-    prompts_path = base_dir / "data" / "prompts.json"
-    output_path = base_dir / "data" / "output.json"
-    db_path = base_dir / "data" / "extracted.db"
+    parser = argparse.ArgumentParser(description="按提示词从文本块中提取数据")
+    parser.add_argument("--cut", type=Path, default=base_dir / "data" / "cut.json", help="切分结果")
+    parser.add_argument("--prompts", type=Path, default=base_dir / "data" / "prompts.json", help="提示词")
+    parser.add_argument("--output", type=Path, default=base_dir / "data" / "output.json", help="提取结果")
+    parser.add_argument("--db", type=Path, default=base_dir / "data" / "extracted.db", help="数据库")
+    parser.add_argument("--company", default="", help="报告所属公司")
+    parser.add_argument("--year", type=int, help="报告年份，指定后数据会关联到该报告")
+    parser.add_argument("--dead-letters", action="store_true", help="只重新处理死信队列中之前失败的文本块")
+    add_cli_arguments(parser)
+    args = parser.parse_args()
+    cut_path, prompts_path, output_path, db_path = args.cut, args.prompts, args.output, args.db
+    report_id = DataStorage(db_path).register_report(args.company, args.year) if args.year else None
     
     # 从配置文件获取API配置
-    from config.settings import API_KEY, API_BASE
+    from config.settings import (API_KEY, API_BASE, LLM_MODEL, OUTPUT_MODE, OUTPUT_VERBOSITY, OUTPUT_STREAM_DELAY,
+                                 LLM_CACHE_ENABLED, LLM_CACHE_BYPASS, LLM_CACHE_PATH,
+                                 LLM_CACHE_MAX_MB, LLM_CACHE_MAX_AGE_DAYS,
+                                 LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT, LLM_MAX_CONTINUATIONS,
+                                 LLM_RETRY_ATTEMPTS, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY,
+                                 LLM_CIRCUIT_FAILURES, LLM_CIRCUIT_RESET, LLM_CIRCUIT_MAX_WAIT,
+                                 METRICS_DIR, PROFILE)
+    configure_output(OUTPUT_MODE, OUTPUT_VERBOSITY, OUTPUT_STREAM_DELAY)
+    cache = ResponseCache(LLM_CACHE_PATH, LLM_CACHE_MAX_MB * 1024 * 1024, LLM_CACHE_MAX_AGE_DAYS) if LLM_CACHE_ENABLED else None
     
     # 创建提取器并处理
-    extractor = DataExtractor(API_KEY, API_BASE, db_path)
-    extractor.process_blocks(cut_path, prompts_path, output_path)
+    extractor = DataExtractor(API_KEY, API_BASE, db_path, model=LLM_MODEL, cache=cache,
+                              use_cache=not LLM_CACHE_BYPASS,
+                              timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT), report_id=report_id,
+                              max_continuations=LLM_MAX_CONTINUATIONS,
+                              retry_policy=RetryPolicy(LLM_RETRY_ATTEMPTS, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY),
+                              circuit_breaker=CircuitBreaker(LLM_CIRCUIT_FAILURES, LLM_CIRCUIT_RESET,
+                                                             max_wait=LLM_CIRCUIT_MAX_WAIT))
+    with instrumented("extract", args.metrics_dir or METRICS_DIR, args.profile or PROFILE, log=extractor.logger):
+        extractor.process_blocks(cut_path, prompts_path, output_path, dead_letters_only=args.dead_letters)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
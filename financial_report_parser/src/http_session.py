@@ -0,0 +1,56 @@
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# 记录当前线程最近一次新建连接的耗时（TCP+TLS握手）
+_connect_timing = threading.local()
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_timing.seconds = time.perf_counter() - start
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_timing.seconds = time.perf_counter() - start
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """记录建连耗时的连接池适配器"""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool
+        }
+
+def reset_connect_time() -> None:
+    """清除当前线程的建连耗时记录"""
+    _connect_timing.seconds = None
+
+def last_connect_time():
+    """返回当前线程最近一次新建连接的耗时，复用连接时为None"""
+    return getattr(_connect_timing, "seconds", None)
+
+def create_session(pool_size: int = 10, headers: dict = None) -> requests.Session:
+    """创建带连接池和keep-alive的会话，可在多个线程间共享"""
+    session = requests.Session()
+    # pool_block=True：连接数达到上限时等待空闲连接，而不是新建后丢弃
+    adapter = TimedHTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    if headers:
+        session.headers.update(headers)
+    return session
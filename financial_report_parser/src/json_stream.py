@@ -0,0 +1,192 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+WATCHED_KEYS = ("structured_data", "unstructured_data", "results")
+
+class IncrementalJSONParser:
+    """增量JSON解析器：按流式响应的片段逐字推进
+
+    - 监视的数组（默认structured_data、unstructured_data、results）中的对象一闭合就返回；
+    - 记录最后一个完整值之后的位置，输出被截断时据此补齐括号，不会凭空添加记录；
+      监视数组中未闭合的对象整体丢弃，不会留下缺少字段的半条记录；
+    - 顶层值之前的内容（如```json）和之后的内容被忽略。
+    """
+    def __init__(self, watch: Iterable[str] = WATCHED_KEYS):
+        self.watch = set(watch)
+        self._buffer = ''
+        self._start = None        # 顶层值的起始位置
+        self._end = None          # 顶层值结束后的位置
+        self._stack = []          # 每层：[闭合符, 子值所属的键, 是否期待键, 当前键, 监视对象的起始位置]
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._cut = None          # (位置, 需要补齐的闭合符)
+        self.failed = False
+        self.items = 0
+
+    @property
+    def complete(self) -> bool:
+        return self._end is not None
+
+    @property
+    def text(self) -> str:
+        return self._buffer
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """输入一个片段，返回其中闭合的监视对象 [(键, 对象)]"""
+        if not chunk or self.complete or self.failed:
+            return []
+        offset = len(self._buffer)
+        self._buffer += chunk
+        emitted = []
+        stack = self._stack
+        for i, ch in enumerate(chunk):
+            pos = offset + i
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._end_string(pos)
+                continue
+            if self._start is None:
+                if ch in '{[':
+                    self._start = pos
+                    self._open(ch, pos)
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif ch in '{[':
+                self._open(ch, pos)
+            elif ch in '}]':
+                if not stack or stack[-1][0] != ch:
+                    self.failed = True
+                    break
+                item = self._close(pos)
+                if item is not None:
+                    emitted.append(item)
+                if self.complete:
+                    break
+            elif ch == ',' and stack:
+                # 逗号之前的值（包括数字、true等）已经完整
+                self._mark_cut(pos)
+                if stack[-1][0] == '}':
+                    stack[-1][2] = True
+            elif ch == ':' and stack and stack[-1][0] == '}':
+                stack[-1][2] = False
+        return emitted
+
+    def _open(self, ch: str, pos: int) -> None:
+        parent = self._stack[-1] if self._stack else None
+        key = None
+        if parent is not None:
+            key = parent[3] if parent[0] == '}' else parent[1]
+        watched = parent is not None and parent[0] == ']' and ch == '{' and parent[1] in self.watch
+        self._stack.append(['}' if ch == '{' else ']', key, ch == '{', None, pos if watched else None])
+        # 数组和不在数组中的对象可以在打开后立即截断（补齐为空值），数组中的对象不行
+        if ch == '[' or parent is None or parent[0] != ']':
+            self._mark_cut(pos + 1)
+
+    def _close(self, pos: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        closer, key, _, _, start = self._stack.pop()
+        if not self._stack:
+            self._end = pos + 1
+            return None
+        self._mark_cut(pos + 1)
+        if start is None:
+            return None
+        try:
+            item = json.loads(self.text[start:pos + 1])
+        except json.JSONDecodeError:
+            return None
+        self.items += 1
+        return key, item
+
+    def _end_string(self, pos: int) -> None:
+        if not self._stack:
+            return
+        top = self._stack[-1]
+        if top[0] == '}' and top[2]:
+            top[3] = json.loads(self.text[self._string_start:pos + 1])
+        else:
+            self._mark_cut(pos + 1)
+
+    def _mark_cut(self, pos: int) -> None:
+        # 监视对象内部不是截断点：修复时退回到上一个已闭合的元素
+        if any(level[4] is not None for level in self._stack):
+            return
+        self._cut = (pos, ''.join(level[0] for level in reversed(self._stack)))
+
+    def value(self) -> Optional[str]:
+        """完整的顶层JSON文本，未完成时返回None"""
+        if not self.complete:
+            return None
+        return self.text[self._start:self._end]
+
+    def partial(self) -> str:
+        """已收到的内容，用作续写请求的前缀"""
+        return self.text
+
+    def repair(self) -> Optional[str]:
+        """截断到最后一个完整的值并补齐括号；连一个完整的值都没有时返回None"""
+        if self.complete:
+            return self.value()
+        if self._cut is None:
+            return None
+        pos, closers = self._cut
+        text = self.text[self._start:pos].rstrip()
+        if text.endswith(','):
+            text = text[:-1]
+        return text + closers
+
+def repair_json(text: str, watch: Iterable[str] = WATCHED_KEYS) -> Optional[str]:
+    """修复被截断的JSON：保留最后一个完整的值之前的内容，补齐未闭合的括号"""
+    parser = IncrementalJSONParser(watch)
+    parser.feed(text)
+    return parser.repair()
+
+def iter_json_array(path: Path, key: str, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """逐个产出JSON文件中顶层对象某个数组键下的元素，内存中只保留当前元素附近的内容
+
+    用于cut.json这类只有一个大数组的文件：数组之前的字段被跳过，找不到该键时不产出任何元素。
+    """
+    decoder = json.JSONDecoder()
+    marker = json.dumps(key)
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        # 定位到数组的起始位置
+        while True:
+            found = buffer.find(marker)
+            start = buffer.find('[', found + len(marker)) if found >= 0 else -1
+            if start >= 0:
+                buffer = buffer[start + 1:]
+                break
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            # 保留末尾可能被截断的键名
+            buffer = buffer[-len(marker):] + chunk if found < 0 else buffer + chunk
+
+        eof = False
+        while True:
+            stripped = buffer.lstrip(' \t\r\n,')
+            if stripped.startswith(']'):
+                return
+            try:
+                item, end = decoder.raw_decode(stripped)
+                # 数字等标量可能被片段截断，后面没有内容时读入更多再判断
+                if end == len(stripped) and not eof:
+                    raise json.JSONDecodeError("元素可能不完整", stripped, end)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = stripped + chunk
+                continue
+            yield item
+            buffer = stripped[end:]
@@ -0,0 +1,174 @@
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Any, Iterable, List, Tuple
+
+# 粗体字体名：西文字体的Bold/Black/Heavy等，中文字体的黑体
+_BOLD_FONT_RE = re.compile(r'(?i)bold|black|heavy|semibold|demi|medi|hei(?!ght)|黑')
+_DIGITS_RE = re.compile(r'\d+')
+_SENTENCE_END = ('。', '；', ';', '，', ',', '：', ':')
+
+LINE_TOLERANCE = 3.0      # 词的top相差不超过这么多时属于同一行（与pdfplumber的y_tolerance一致）
+SIZE_STEP = 0.5           # 字号按0.5pt归并，消除同一样式的细微差异
+MAX_HEADING_LEVELS = 2    # 对应文本块的h1_title/h2_title
+
+def is_bold(fontname: str) -> bool:
+    return bool(fontname) and _BOLD_FONT_RE.search(fontname.split('+')[-1]) is not None
+
+def page_lines(record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """把页面记录中的词（page_cache.WORD_FIELDS）合并为行，报表区域内的词不计入
+
+    每行为 {"text", "size", "bold", "top", "bottom", "x0", "x1", "page"}，
+    行的字号和字重取字数最多的字体。
+    """
+    statements = [table["bbox"] for table in record.get("tables", []) if table.get("bbox")]
+
+    def outside_tables(word: List[Any]) -> bool:
+        x = (word[1] + word[3]) / 2
+        y = (word[2] + word[4]) / 2
+        return not any(x0 <= x <= x1 and top <= y <= bottom for x0, top, x1, bottom in statements)
+
+    lines = []
+    current = []
+    for word in record.get("words", []):
+        if statements and not outside_tables(word):
+            continue
+        if current and abs(word[2] - current[0][2]) > LINE_TOLERANCE:
+            lines.append(_make_line(current, record["page"]))
+            current = []
+        current.append(word)
+    if current:
+        lines.append(_make_line(current, record["page"]))
+    return lines
+
+def _make_line(words: List[List[Any]], page: int) -> Dict[str, Any]:
+    fonts = Counter()
+    for text, _, _, _, _, size, fontname in words:
+        fonts[(size, fontname)] += len(text)
+    (size, fontname), _ = fonts.most_common(1)[0]
+    return {
+        "text": ' '.join(word[0] for word in words),
+        "size": size,
+        "bold": is_bold(fontname),
+        "top": min(word[2] for word in words),
+        "bottom": max(word[4] for word in words),
+        "x0": min(word[1] for word in words),
+        "x1": max(word[3] for word in words),
+        "page": page
+    }
+
+def _style(line: Dict[str, Any]) -> Tuple[float, bool]:
+    return round(line["size"] / SIZE_STEP) * SIZE_STEP, line["bold"]
+
+class HeadingDetector:
+    """根据字号、字重和位置识别标题
+
+    learn()扫描整份文档的行一次，学习本文档的标题样式：
+    - 正文字号为字数最多的字号；
+    - 在多页重复出现的页眉页脚不参与统计，也不会被识别为标题；
+    - 比正文大或比正文粗、出现过多次、行都很短且不占多数的样式作为标题样式，
+      按字号从大到小（同字号时粗体优先）依次为一级、二级标题。
+    没有版面信息或学不到标题样式时learned为False，调用方应退回按文字规则识别。
+    """
+    def __init__(self, max_heading_chars: int = 40, min_occurrences: int = 2,
+                 max_style_share: float = 0.15, running_page_ratio: float = 0.3):
+        self.max_heading_chars = max_heading_chars  # 标题行的最大字数
+        self.min_occurrences = min_occurrences      # 标题样式至少出现的次数
+        self.max_style_share = max_style_share      # 标题样式的行数最多占全部行的比例
+        self.running_page_ratio = running_page_ratio  # 出现在这么多比例的页面上的行视为页眉页脚
+        self.body_size = None
+        self.levels = {}   # 样式 -> 标题级别
+        self.styles = []   # 学到的标题样式，用于输出
+        self._running = set()
+
+    @property
+    def learned(self) -> bool:
+        return bool(self.levels)
+
+    @staticmethod
+    def _running_key(line: Dict[str, Any]) -> str:
+        # 页眉页脚中的页码每页不同，比较时忽略数字
+        return _DIGITS_RE.sub('#', ''.join(line["text"].split()))
+
+    def learn(self, lines: Iterable[Dict[str, Any]]) -> None:
+        lines = [line for line in lines if line["text"].strip()]
+        self.levels, self.styles, self._running = {}, [], set()
+        if not lines:
+            return
+
+        pages = defaultdict(set)
+        for line in lines:
+            pages[self._running_key(line)].add(line["page"])
+        page_count = len({line["page"] for line in lines})
+        threshold = max(3, page_count * self.running_page_ratio)
+        self._running = {key for key, seen in pages.items() if len(seen) >= threshold}
+        lines = [line for line in lines if self._running_key(line) not in self._running]
+        if not lines:
+            return
+
+        chars = Counter()
+        for line in lines:
+            chars[_style(line)] += len(line["text"])
+        (self.body_size, body_bold), _ = chars.most_common(1)[0]
+
+        by_style = defaultdict(list)
+        for line in lines:
+            by_style[_style(line)].append(line)
+        candidates = []
+        for style, style_lines in by_style.items():
+            size, bold = style
+            larger = size > self.body_size
+            bolder = bold and not body_bold and size >= self.body_size
+            if not (larger or bolder):
+                continue
+            lengths = sorted(len(line["text"]) for line in style_lines)
+            if (len(style_lines) < self.min_occurrences
+                    or len(style_lines) > max(self.min_occurrences, len(lines) * self.max_style_share)
+                    or lengths[len(lengths) // 2] > self.max_heading_chars):
+                continue
+            candidates.append((style, len(style_lines)))
+
+        candidates.sort(key=lambda item: (-item[0][0], not item[0][1]))
+        for level, (style, count) in enumerate(candidates[:MAX_HEADING_LEVELS], 1):
+            self.levels[style] = level
+            self.styles.append({"size": style[0], "bold": style[1], "level": level, "lines": count})
+
+    def level(self, line: Dict[str, Any]) -> int:
+        """行的标题级别，正文和页眉页脚返回0"""
+        if self.is_running(line):
+            return 0
+        level = self.levels.get(_style(line), 0)
+        text = line["text"].strip()
+        if level and (len(text) > self.max_heading_chars or text.endswith(_SENTENCE_END)):
+            return 0
+        return level
+
+    def is_running(self, line: Dict[str, Any]) -> bool:
+        """是否为页眉页脚"""
+        return self._running_key(line) in self._running
+
+    def summary(self) -> Dict[str, Any]:
+        return {"body_size": self.body_size, "styles": self.styles}
+
+class SectionTreeBuilder:
+    """按出现顺序接收标题，生成章节树；每个章节记录其下文本块的范围 [start_block, end_block)"""
+    def __init__(self):
+        self.roots = []
+        self._stack = []  # 当前路径上的章节
+
+    def add(self, title: str, level: int, page: int, block_index: int) -> Dict[str, Any]:
+        while self._stack and self._stack[-1]["level"] >= level:
+            self._stack.pop()["end_block"] = block_index
+        node = {"title": title, "level": level, "page": page,
+                "start_block": block_index, "end_block": None, "children": []}
+        (self._stack[-1]["children"] if self._stack else self.roots).append(node)
+        self._stack.append(node)
+        return node
+
+    def extend_title(self, node: Dict[str, Any], text: str) -> None:
+        """标题折行时把下一行并入标题"""
+        node["title"] = f"{node['title']} {text}"
+
+    def finish(self, block_count: int) -> List[Dict[str, Any]]:
+        while self._stack:
+            self._stack.pop()["end_block"] = block_count
+        return self.roots
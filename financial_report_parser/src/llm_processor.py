@@ -1,14 +1,26 @@
 import os
 import json
+import time
+import threading
 import requests
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple, Callable, Optional
 from time import sleep
 import logging
-from .utils import stream_output, ProgressBar
+from .utils import stream_output, ProgressBar, VERBOSITY_VERBOSE, percentile, estimate_tokens
+from .response_cache import ResponseCache
+from .http_session import create_session, reset_connect_time, last_connect_time
+from .json_stream import IncrementalJSONParser
+from .metrics import get_metrics
+from .resilience import RetryPolicy, CircuitBreaker, PauseGate, classify_error, error_from_response
+from .dispatcher import RateLimiter
 from pathlib import Path
 
 class LLMProcessor:
-    def __init__(self, api_key: str, api_base: str, model: str = "moonshot-v1-8k", temperature: float = 0.1):
+    def __init__(self, api_key: str, api_base: str, model: str = "moonshot-v1-8k", temperature: float = 0.1,
+                 cache: ResponseCache = None, use_cache: bool = True,
+                 pool_size: int = 10, timeout: Tuple[float, float] = (10, 120), max_continuations: int = 2,
+                 retry_policy: RetryPolicy = None, circuit_breaker: CircuitBreaker = None,
+                 rate_limiter: RateLimiter = None, output_token_reserve: int = 512):
         self.logger = logging.getLogger(__name__)
         
         # API配置
@@ -17,6 +29,33 @@ class LLMProcessor:
         self.model = model
         self.temperature = temperature
         
+        # 响应缓存，use_cache=False时跳过读取但仍写入最新结果
+        self.cache = cache
+        self.use_cache = use_cache
+        
+        # 共享的HTTP会话：连接池+keep-alive，超时为(建连, 读取)秒数，读取超时也覆盖流式响应中的停顿
+        self.session = create_session(pool_size, headers={
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        })
+        self.timeout = timeout
+        
+        # 重试策略、熔断器和429时的全局暂停，由所有工作线程共享
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.pause_gate = PauseGate()
+        
+        # RPM/TPM限流：每次实际发出的请求（含重试和续写）都按估算的输入+输出token计入
+        self.rate_limiter = rate_limiter
+        self.output_token_reserve = output_token_reserve
+        
+        # JSON输出被截断时最多续写的次数
+        self.max_continuations = max_continuations
+        
+        # 每个请求的耗时记录
+        self.request_metrics = []
+        self._metrics_lock = threading.Lock()
+        
         # 加载提示词配置
         prompt_path = Path(__file__).parent.parent / "data" / "prompt.json"
         with open(prompt_path, 'r', encoding='utf-8') as f:
@@ -43,7 +82,7 @@ class LLMProcessor:
         
         # 2. 根据分析结果提取具体数据
         stream_output("\n第二步：提取具体数据...")
-        data = self._call_llm(
+        data = self._call_llm_json(
             messages=self._format_messages(
                 self.prompts["extract"],
                 text=text
@@ -53,15 +92,127 @@ class LLMProcessor:
         # 3. 解析并返回数据
         return self._parse_response(data)
 
-    def _call_llm(self, messages: List[Dict[str, str]], max_retries: int = 3) -> str:
-        """调用LLM API"""
-        for attempt in range(max_retries):
+    def _call_llm(self, messages: List[Dict[str, str]], max_retries: int = None, use_cache: bool = None) -> str:
+        """调用LLM API（优先读取响应缓存）"""
+        cache_key = None
+        if self.cache is not None:
+            cache_key = ResponseCache.make_key(messages, self.model, self.temperature)
+            if self.use_cache if use_cache is None else use_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    self.logger.debug(f"命中响应缓存: {cache_key[:12]}")
+                    get_metrics().count("llm.cache_hits")
+                    stream_output(cached, level=VERBOSITY_VERBOSE)
+                    return cached
+        
+        response = self._request_llm(messages, max_retries)
+        if cache_key is not None and response:
+            self.cache.put(cache_key, response, model=self.model)
+        return response
+
+    def _call_llm_json(self, messages: List[Dict[str, str]], max_retries: int = None, use_cache: bool = None,
+                       on_item: Callable[[str, Dict[str, Any]], None] = None, output_tokens: int = None) -> str:
+        """调用LLM并增量解析返回的JSON
+
+        structured_data等数组中的对象一闭合就交给on_item（重试时可能重复回调）；
+        输出被截断（finish_reason=length或流结束时JSON未闭合）时带着已输出的内容续写，而不是整体重试；
+        续写次数用完仍不完整时，截断到最后一个完整的值并补齐括号。
+        output_tokens为限流时预计的输出token数，默认为output_token_reserve。
+        """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = ResponseCache.make_key(messages, self.model, self.temperature)
+            if self.use_cache if use_cache is None else use_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    self.logger.debug(f"命中响应缓存: {cache_key[:12]}")
+                    get_metrics().count("llm.cache_hits")
+                    stream_output(cached, level=VERBOSITY_VERBOSE)
+                    parser = IncrementalJSONParser()
+                    for key, item in parser.feed(cached):
+                        if on_item is not None:
+                            on_item(key, item)
+                    return parser.value() or cached
+        
+        parser = IncrementalJSONParser()
+        prefix = ""
+        
+        def restart() -> None:
+            # 每次（重新）发送请求时，解析器回到续写前缀的状态
+            nonlocal parser
+            parser = IncrementalJSONParser()
+            parser.feed(prefix)
+        
+        def on_delta(content: str) -> bool:
+            for key, item in parser.feed(content):
+                if on_item is not None:
+                    on_item(key, item)
+            # JSON结构出错时不再读取剩余的输出
+            return not parser.failed
+        
+        finish_reason = self._stream_completion(messages, max_retries, on_delta=on_delta, on_attempt=restart,
+                                                output_tokens=output_tokens)
+        continuations = 0
+        while not parser.complete and not parser.failed and continuations < self.max_continuations:
+            reason = "达到输出长度上限" if finish_reason == "length" else "JSON未闭合"
+            continuations += 1
+            get_metrics().count("llm.continuations")
+            self.logger.info(f"响应被截断（{reason}，已解析 {parser.items} 项），第 {continuations} 次续写")
+            prefix = parser.partial()
+            finish_reason = self._stream_completion(messages, max_retries, on_delta=on_delta,
+                                                    on_attempt=restart, prefix=prefix, output_tokens=output_tokens)
+            if parser.partial() == prefix:
+                break
+        
+        response = parser.value()
+        metrics = get_metrics()
+        metrics.count("json.responses")
+        if response is None:
+            metrics.count("json.repairs", source="stream")
+            response = parser.repair()
+            self.logger.warning(
+                f"响应JSON不完整（{'结构错误' if parser.failed else '截断'}），"
+                f"{'已截断到最后一个完整的值' if response is not None else '无法修复'}"
+            )
+            return response if response is not None else parser.partial()
+        if cache_key is not None:
+            self.cache.put(cache_key, response, model=self.model)
+        return response
+
+    def _request_llm(self, messages: List[Dict[str, str]], max_retries: int = None) -> str:
+        """发送LLM API请求"""
+        full_response = []
+        self._stream_completion(messages, max_retries,
+                                on_delta=lambda content: full_response.append(content) or True,
+                                on_attempt=full_response.clear)
+        return ''.join(full_response)
+
+    def _stream_completion(self, messages: List[Dict[str, str]], max_retries: int = None,
+                           on_delta: Callable[[str], bool] = None, on_attempt: Callable[[], None] = None,
+                           prefix: str = None, output_tokens: int = None) -> Optional[str]:
+        """发送流式请求，每段输出交给on_delta（返回False时提前结束读取），返回finish_reason
+
+        on_attempt在每次尝试开始时调用，用于重试前清理已收到的内容；
+        指定prefix时以partial模式让模型从这段内容之后接着输出。
+        429、5xx和网络错误按重试策略退避重试，429时所有线程一起暂停；
+        其他错误和重试用尽时抛出LLMRequestError。
+        """
+        if prefix:
+            messages = messages + [{"role": "assistant", "content": prefix, "partial": True}]
+        tokens = self.request_tokens(messages, output_tokens)
+        attempts = max_retries or self.retry_policy.max_attempts
+        for attempt in range(attempts):
+            if on_attempt is not None:
+                on_attempt()
+            self.circuit_breaker.before_call()
+            paused = self.pause_gate.wait()
+            if paused > 0:
+                self.logger.debug(f"限流暂停 {paused:.1f} 秒")
+            if self.rate_limiter is not None:
+                waited = self.rate_limiter.acquire(tokens)
+                if waited > 0:
+                    self.logger.debug(f"限流等待 {waited:.1f} 秒")
             try:
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                
                 request_data = {
                     "model": self.model,
                     "messages": messages,
@@ -70,56 +221,142 @@ class LLMProcessor:
                 }
                 
                 # 显示请求信息
-                stream_output("\n发送请求:")
-                stream_output(f"URL: {self.api_base}")
-                stream_output(f"模型: {self.model}")
+                stream_output("\n发送请求:", level=VERBOSITY_VERBOSE)
+                stream_output(f"URL: {self.api_base}", level=VERBOSITY_VERBOSE)
+                stream_output(f"模型: {self.model}", level=VERBOSITY_VERBOSE)
                 
-                # 使用stream=True进行请求
-                response = requests.post(
+                # 使用stream=True进行请求，连接从会话的连接池中获取
+                reset_connect_time()
+                start = time.perf_counter()
+                first_byte = None
+                with self.session.post(
                     self.api_base,
-                    headers=headers,
                     json=request_data,
-                    stream=True
-                )
-                
-                if response.status_code == 401:
-                    raise Exception(f"API认证失败: {response.text}")
-                
-                response.raise_for_status()
-                
-                # 用于收集完整响应
-                full_response = []
-                
-                # 流式处理响应
-                for line in response.iter_lines():
-                    if line:
-                        # 移除 "data: " 前缀并解析JSON
-                        json_str = line.decode('utf-8').replace('data: ', '')
-                        if json_str.strip() == '[DONE]':
-                            break
-                        
-                        try:
-                            chunk = json.loads(json_str)
-                            if chunk.get('choices') and chunk['choices'][0].get('delta', {}).get('content'):
-                                content = chunk['choices'][0]['delta']['content']
-                                stream_output(content, end='', delay=0)  # 实时输出，无延迟
-                                full_response.append(content)
-                        except json.JSONDecodeError:
-                            continue
+                    stream=True,
+                    timeout=self.timeout
+                ) as response:
+                    connect_time = last_connect_time()
+                    
+                    if response.status_code >= 400:
+                        raise error_from_response(response)
+                    
+                    finish_reason = None
+                    usage = None
+                    
+                    # 流式处理响应
+                    for line in response.iter_lines():
+                        if first_byte is None:
+                            first_byte = time.perf_counter()
+                        if line:
+                            # 移除 "data: " 前缀并解析JSON
+                            json_str = line.decode('utf-8').replace('data: ', '')
+                            if json_str.strip() == '[DONE]':
+                                break
+                            
+                            try:
+                                chunk = json.loads(json_str)
+                            except json.JSONDecodeError:
+                                continue
+                            choice = chunk['choices'][0] if chunk.get('choices') else {}
+                            finish_reason = choice.get('finish_reason') or finish_reason
+                            # 用量在最后一个分片中：OpenAI兼容接口放在顶层，Moonshot放在choice中
+                            usage = chunk.get('usage') or choice.get('usage') or usage
+                            content = choice.get('delta', {}).get('content')
+                            if content:
+                                stream_output(content, end='', delay=0, level=VERBOSITY_VERBOSE)  # 实时输出，无延迟
+                                if on_delta is not None and on_delta(content) is False:
+                                    break
                 
-                stream_output('\n')  # 最后添加换行
-                return ''.join(full_response)
+                end = time.perf_counter()
+                self._record_request(connect_time, (first_byte or end) - start, end - start)
+                self._record_usage(usage)
+                self.circuit_breaker.record_success()
+                stream_output('\n', level=VERBOSITY_VERBOSE)  # 最后添加换行
+                return finish_reason
                 
             except Exception as e:
-                if attempt == max_retries - 1:
-                    raise
-                wait_time = 2 ** attempt
-                self.logger.info(f"请求失败，{wait_time}秒后重试: {str(e)}")
+                error = classify_error(e)
+                if error.retryable and not error.rate_limited:
+                    # 只有服务端和网络错误计入熔断，限流和请求本身的问题不算
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.release()
+                if not error.retryable or attempt == attempts - 1:
+                    if error is e:
+                        raise
+                    raise error from e
+                get_metrics().count("llm.retries", reason=error.status or "network")
+                wait_time = self.retry_policy.delay(attempt, error.retry_after)
+                if error.rate_limited:
+                    self.pause_gate.pause_for(wait_time)
+                self.logger.info(f"请求失败，{wait_time:.1f}秒后重试（第 {attempt + 1}/{attempts - 1} 次）: {str(error)}")
                 sleep(wait_time)
 
+    def request_tokens(self, messages: List[Dict[str, str]], output_tokens: int = None) -> int:
+        """估算一次请求消耗的token数（输入+预计输出），用于TPM限流"""
+        if output_tokens is None:
+            output_tokens = self.output_token_reserve
+        return sum(estimate_tokens(message["content"]) for message in messages) + output_tokens
+    
+    def _record_request(self, connect: float, ttfb: float, total: float) -> None:
+        """记录一次请求的耗时：connect为新建连接耗时（复用连接时为None），ttfb为首字节时间"""
+        with self._metrics_lock:
+            self.request_metrics.append({
+                "connect": connect,
+                "ttfb": ttfb,
+                "total": total,
+                "reused": connect is None
+            })
+        metrics = get_metrics()
+        metrics.observe("llm.request", total)
+        metrics.observe("llm.ttfb", ttfb)
+        self.logger.debug(
+            f"请求耗时: 建连={'复用' if connect is None else f'{connect:.3f}s'}, 首字节={ttfb:.3f}s, 总计={total:.3f}s"
+        )
+
+    def prompt_tokens(self, names: Tuple[str, ...] = ("summarize", "extract")) -> int:
+        """提示词模板本身（不含文本块）估算的token数，取各模板中最大的，用于推算文本块的大小"""
+        templates = [self.prompts[name] for name in names if name in self.prompts]
+        return max((sum(estimate_tokens(message["content"].replace("{text}", "")) for message in template.get("messages", []))
+                    for template in templates), default=0)
+
+    def _record_usage(self, usage: Optional[Dict[str, Any]]) -> None:
+        """累计token用量，按当前线程上下文中的block_type等标签归类"""
+        if not usage:
+            return
+        metrics = get_metrics()
+        metrics.count("llm.prompt_tokens", usage.get("prompt_tokens", 0))
+        metrics.count("llm.completion_tokens", usage.get("completion_tokens", 0))
+
+    def get_request_stats(self) -> Dict[str, Any]:
+        """汇总请求耗时统计"""
+        with self._metrics_lock:
+            metrics = list(self.request_metrics)
+        connects = [m["connect"] for m in metrics if m["connect"] is not None]
+        stats = {
+            "requests": len(metrics),
+            "new_connections": len(connects),
+            "reused_connections": len(metrics) - len(connects)
+        }
+        for name, values in (("connect", connects),
+                             ("ttfb", [m["ttfb"] for m in metrics]),
+                             ("total", [m["total"] for m in metrics])):
+            stats[name] = {
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "max": max(values) if values else 0.0
+            }
+        return stats
+
+    def close(self) -> None:
+        """关闭HTTP会话和缓存"""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
     def _format_messages(self, prompt_template: Dict[str, Any], **kwargs) -> List[Dict[str, str]]:
-        """格式化消息模板"""
-        messages = prompt_template["messages"].copy()
+        """格式化消息模板（在副本上填充，共享的模板保持不变）"""
+        messages = [dict(message) for message in prompt_template["messages"]]
         for message in messages:
             if message["role"] == "user":
                 try:
@@ -0,0 +1,63 @@
+import re
+from typing import Dict, Iterable, List, Pattern
+
+def compile_alternation(patterns: Iterable[str]) -> Pattern:
+    """把多个正则合并成一个预编译的交替表达式，一次match即可判断是否命中任意一个"""
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """把关键词组织成前缀树形式的正则，公共前缀只比较一次"""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+class KeywordMatcher:
+    """多关键词匹配器（Aho-Corasick风格）
+
+    所有关键词编译为一个前缀树形式的正则，由正则引擎单遍扫描文本；
+    用零宽前瞻报告所有位置上的命中，相互重叠的关键词（如"资产"和"产品"）也不会漏掉；
+    同一位置只报告最长的关键词，因此每个关键词的掩码包含了它所含的较短关键词。
+    每个关键词对应一个或多个标签，扫描结果是命中标签的位掩码。
+    """
+    def __init__(self, groups: Dict[str, List[str]]):
+        self.labels = list(groups)
+        self._masks = {}
+        for index, label in enumerate(self.labels):
+            for word in groups[label]:
+                self._masks[word] = self._masks.get(word, 0) | (1 << index)
+        self._masks = {word: self._contained_mask(word) for word in self._masks}
+        self._pattern = re.compile(f'(?=({_trie_pattern(self._masks)}))') if self._masks else None
+
+    def _contained_mask(self, word: str) -> int:
+        mask = 0
+        for other, other_mask in self._masks.items():
+            if other in word:
+                mask |= other_mask
+        return mask
+
+    def mask(self, text: str) -> int:
+        """返回文本命中的标签位掩码，第i位对应第i个标签"""
+        if self._pattern is None or not text:
+            return 0
+        mask = 0
+        for word in self._pattern.findall(text):
+            mask |= self._masks[word]
+        return mask
+
+    def first_label(self, mask: int, default: str) -> str:
+        """按定义顺序返回掩码中的第一个标签"""
+        if not mask:
+            return default
+        return self.labels[(mask & -mask).bit_length() - 1]
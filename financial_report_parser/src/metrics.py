@@ -0,0 +1,215 @@
+import cProfile
+import csv
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .utils import percentile
+from .checkpoint import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+def _format_key(key: Tuple[str, Tuple[Tuple[str, str], ...]]) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+class Metrics:
+    """进程内的计时器和计数器，可被多个线程共享
+
+    计时和计数都可以带标签（例如block_type），线程上下文中设置的标签会自动附加，
+    便于在调用LLM的位置之外标注"这次请求属于哪类文本块"。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings = {}   # key -> [秒数]
+        self._counters = {}  # key -> 数值
+        self._context = threading.local()
+        self.started_at = time.time()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+            self.started_at = time.time()
+
+    def _labels(self, labels: Dict[str, Any]) -> Dict[str, Any]:
+        context = getattr(self._context, "labels", None)
+        return {**context, **labels} if context else labels
+
+    @contextmanager
+    def context(self, **labels) -> Iterator[None]:
+        """在当前线程内给之后记录的指标附加标签"""
+        previous = getattr(self._context, "labels", None)
+        self._context.labels = {**(previous or {}), **labels}
+        try:
+            yield
+        finally:
+            self._context.labels = previous
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """记录一次耗时"""
+        key = _key(name, self._labels(labels))
+        with self._lock:
+            self._timings.setdefault(key, []).append(seconds)
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        """累加计数"""
+        key = _key(name, self._labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """计时一段代码（异常时也记录）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter(self, name: str, **labels) -> float:
+        """某个计数器在所有标签下的合计，指定标签时只统计匹配的"""
+        wanted = set(_key(name, labels)[1])
+        with self._lock:
+            return sum(value for (key_name, key_labels), value in self._counters.items()
+                       if key_name == name and wanted <= set(key_labels))
+
+    def summary(self) -> Dict[str, Any]:
+        """汇总：各计时器的次数、总耗时和p50/p95，各计数器的值，以及token和JSON修复的派生统计"""
+        with self._lock:
+            timings = {key: list(values) for key, values in self._timings.items()}
+            counters = dict(self._counters)
+        timers = {}
+        for key, values in sorted(timings.items()):
+            timers[_format_key(key)] = {
+                "count": len(values),
+                "total": sum(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "max": max(values)
+            }
+
+        tokens = {}
+        for (name, labels), value in counters.items():
+            if name in ("llm.prompt_tokens", "llm.completion_tokens"):
+                block_type = dict(labels).get("block_type", "unknown")
+                tokens.setdefault(block_type, {"prompt": 0, "completion": 0})
+                tokens[block_type]["prompt" if name == "llm.prompt_tokens" else "completion"] += value
+
+        responses = self.counter("json.responses")
+        repairs = self.counter("json.repairs")
+        return {
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started_at)),
+            "elapsed": time.time() - self.started_at,
+            "timers": timers,
+            "counters": {_format_key(key): value for key, value in sorted(counters.items())},
+            "tokens_by_type": tokens,
+            "json_repair_rate": repairs / responses if responses else 0.0
+        }
+
+    def export(self, path: Path) -> Dict[str, Any]:
+        """把汇总写入 <path>.json 和 <path>.csv，返回汇总"""
+        summary = self.summary()
+        atomic_write_json(path.with_suffix(".json"), summary)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["kind", "metric", "count", "total", "p50", "p95", "max"])
+        for name, stats in summary["timers"].items():
+            writer.writerow(["timer", name, stats["count"], f"{stats['total']:.6f}",
+                             f"{stats['p50']:.6f}", f"{stats['p95']:.6f}", f"{stats['max']:.6f}"])
+        for name, value in summary["counters"].items():
+            writer.writerow(["counter", name, "", value, "", "", ""])
+        with open(path.with_suffix(".csv"), 'w', encoding='utf-8', newline='') as f:
+            f.write(buffer.getvalue())
+        return summary
+
+    def log_summary(self, summary: Dict[str, Any] = None, log: logging.Logger = None) -> None:
+        """在日志中输出主要的耗时和token统计"""
+        log = log or logger
+        summary = summary or self.summary()
+        for name, stats in summary["timers"].items():
+            log.info(f"{name}: {stats['count']} 次，共 {stats['total']:.2f}s，"
+                        f"p50={stats['p50'] * 1000:.1f}ms p95={stats['p95'] * 1000:.1f}ms")
+        for block_type, used in summary["tokens_by_type"].items():
+            log.info(f"token[{block_type}]: 输入 {used['prompt']:.0f}，输出 {used['completion']:.0f}")
+        if summary["json_repair_rate"]:
+            log.info(f"JSON修复率: {summary['json_repair_rate']:.1%}")
+
+_metrics = Metrics()
+
+def get_metrics() -> Metrics:
+    """返回进程内共享的指标对象"""
+    return _metrics
+
+@contextmanager
+def profiling(mode: Optional[str], output_dir: Path, name: str) -> Iterator[None]:
+    """按mode开启性能分析：cpu使用cProfile，mem使用tracemalloc，all两者都开
+
+    结果写入output_dir：<name>.prof（可用snakeviz等工具查看）、<name>_cpu.txt和<name>_mem.txt。
+    """
+    modes = {"cpu", "mem"} if mode == "all" else {mode} if mode else set()
+    profiler = cProfile.Profile() if "cpu" in modes else None
+    if "mem" in modes:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if modes:
+            _dump_profiles(profiler, "mem" in modes, output_dir, name)
+
+def _dump_profiles(profiler: Optional[cProfile.Profile], trace_memory: bool, output_dir: Path, name: str) -> None:
+    """写出性能分析结果"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(str(output_dir / f"{name}.prof"))
+        with open(output_dir / f"{name}_cpu.txt", 'w', encoding='utf-8') as f:
+            pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(50)
+        logger.info(f"CPU分析结果已保存: {output_dir / (name + '.prof')}")
+    if trace_memory:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(output_dir / f"{name}_mem.txt", 'w', encoding='utf-8') as f:
+            f.write(f"current={current / 1024 / 1024:.1f}MB peak={peak / 1024 / 1024:.1f}MB\n")
+            for stat in snapshot.statistics("lineno")[:50]:
+                f.write(f"{stat}\n")
+        logger.info(f"内存峰值 {peak / 1024 / 1024:.1f}MB，分析结果已保存: {output_dir / (name + '_mem.txt')}")
+
+def run_name(stage: str) -> str:
+    """指标和分析结果文件名：<阶段>_<时间>"""
+    return f"{stage}_{time.strftime('%Y%m%d_%H%M%S')}"
+
+@contextmanager
+def instrumented(stage: str, metrics_dir: Path, profile: Optional[str] = None,
+                 log: logging.Logger = None) -> Iterator[Metrics]:
+    """运行一个阶段：按需开启性能分析，结束时（包括出错时）导出本次运行的指标汇总"""
+    log = log or logger
+    metrics = get_metrics()
+    metrics.reset()
+    name = run_name(stage)
+    try:
+        with profiling(profile, metrics_dir, name):
+            yield metrics
+    finally:
+        summary = metrics.export(metrics_dir / name)
+        metrics.log_summary(summary, log)
+        log.info(f"运行指标已保存: {metrics_dir / name}.json")
+
+def add_cli_arguments(parser) -> None:
+    """给命令行入口添加指标和性能分析的参数"""
+    parser.add_argument("--metrics-dir", type=Path, help="运行指标的输出目录（默认使用配置中的METRICS_DIR）")
+    parser.add_argument("--profile", choices=["cpu", "mem", "all"], help="开启cProfile/tracemalloc性能分析")
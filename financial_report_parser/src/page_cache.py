@@ -0,0 +1,150 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+import logging
+from pathlib import Path
+from typing import Dict, Any, Optional, Set
+
+from .table_extractor import TABLE_SETTINGS, FALLBACK_TABLE_SETTINGS, CAPTION_HEIGHT
+
+PAGE_CACHE_FORMAT = "1"  # 页面记录的字段或解析方式变化时递增，旧记录自动失效
+# 词和字符以数组保存，字段顺序如下
+WORD_FIELDS = ("text", "x0", "top", "x1", "bottom", "size", "fontname")
+CHAR_FIELDS = ("text", "x0", "top", "x1", "bottom", "size", "fontname")
+
+def _parser_version() -> str:
+    """缓存版本：记录格式加上报表识别参数，参数调整后已缓存的页面需要重新解析"""
+    settings = json.dumps([TABLE_SETTINGS, FALLBACK_TABLE_SETTINGS, CAPTION_HEIGHT], sort_keys=True)
+    return f"{PAGE_CACHE_FORMAT}:{hashlib.sha1(settings.encode('utf-8')).hexdigest()[:8]}"
+
+def file_digest(path: Path, chunk_size: int = 1 << 20) -> str:
+    """文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class PageCache:
+    """PDF逐页解析结果的持久化缓存
+
+    以PDF内容哈希和页码为键，保存正文、去掉报表后的正文、报表候选、带坐标和字号的词与字符，
+    记录压缩后存放在SQLite中。PDFProcessor、PDFCutter和报表提取都从这里读取，
+    只有缺失或版本失效的页面才重新用pdfplumber解析。
+    """
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.version = _parser_version()
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._digests = {}  # (路径, 修改时间, 大小) -> 内容哈希，同一进程内不重复计算
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # 批处理时多个进程共用同一个缓存文件，写入冲突时等待而不是报错
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                pdf_hash TEXT PRIMARY KEY,
+                pages INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                pdf_hash TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                version TEXT NOT NULL,
+                data BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (pdf_hash, page)
+            )
+        """)
+        removed = self._conn.execute("DELETE FROM pages WHERE version != ?", (self.version,)).rowcount
+        self._conn.commit()
+        if removed:
+            self.logger.info(f"页面缓存版本变化，清除了 {removed} 页旧记录")
+
+    def fingerprint(self, pdf_path: Path) -> str:
+        """PDF的内容哈希；文件未变化时直接返回上次的结果"""
+        stat = Path(pdf_path).stat()
+        key = (str(pdf_path), stat.st_mtime_ns, stat.st_size)
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = self._digests[key] = file_digest(pdf_path)
+        return digest
+
+    def page_count(self, pdf_hash: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute("SELECT pages FROM documents WHERE pdf_hash = ?", (pdf_hash,)).fetchone()
+        return row[0] if row else None
+
+    def set_page_count(self, pdf_hash: str, pages: int) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO documents (pdf_hash, pages, created_at) VALUES (?, ?, ?)",
+                               (pdf_hash, pages, time.time()))
+            self._conn.commit()
+
+    def cached_pages(self, pdf_hash: str) -> Set[int]:
+        """当前版本已缓存的页码"""
+        with self._lock:
+            rows = self._conn.execute("SELECT page FROM pages WHERE pdf_hash = ? AND version = ?",
+                                      (pdf_hash, self.version)).fetchall()
+        return {row[0] for row in rows}
+
+    def get(self, pdf_hash: str, page: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM pages WHERE pdf_hash = ? AND page = ? AND version = ?",
+                                     (pdf_hash, page, self.version)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def put(self, pdf_hash: str, record: Dict[str, Any]) -> None:
+        """保存一页的解析结果；解析出错的页面不缓存，下次重新解析"""
+        if record.get("error"):
+            return
+        data = {key: value for key, value in record.items() if key not in ("error", "elapsed")}
+        blob = zlib.compress(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (pdf_hash, page, version, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                (pdf_hash, record["page"], self.version, blob, time.time())
+            )
+            self._conn.commit()
+
+    def invalidate(self, pdf_hash: str = None) -> int:
+        """删除某份PDF（不指定时为全部）的缓存页面，返回删除的页数"""
+        with self._lock:
+            if pdf_hash is None:
+                removed = self._conn.execute("DELETE FROM pages").rowcount
+            else:
+                removed = self._conn.execute("DELETE FROM pages WHERE pdf_hash = ?", (pdf_hash,)).rowcount
+            self._conn.commit()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息"""
+        with self._lock:
+            pages, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM pages"
+            ).fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "pages": pages,
+            "size_bytes": size
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
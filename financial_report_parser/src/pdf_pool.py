@@ -0,0 +1,159 @@
+import os
+import time
+import logging
+import pdfplumber
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Iterable, Iterator, List, Sequence
+
+from .table_extractor import extract_page_tables
+from .metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+def count_pages(pdf_path: Path, cache=None) -> int:
+    """获取PDF页数；指定页面缓存时优先使用缓存中记录的页数"""
+    pdf_hash = cache.fingerprint(pdf_path) if cache is not None else None
+    if pdf_hash is not None:
+        pages = cache.page_count(pdf_hash)
+        if pages is not None:
+            return pages
+    with pdfplumber.open(pdf_path) as pdf:
+        pages = len(pdf.pages)
+    if pdf_hash is not None:
+        cache.set_page_count(pdf_hash, pages)
+    return pages
+
+def split_page_groups(indices: Sequence[int], pages_per_range: int) -> List[List[int]]:
+    """把待解析的页面下标按顺序分为不超过pages_per_range页的组（页面缓存命中后可能不连续）"""
+    pages_per_range = max(1, pages_per_range)
+    return [list(indices[start:start + pages_per_range]) for start in range(0, len(indices), pages_per_range)]
+
+def _round(value: float) -> float:
+    return round(float(value), 2)
+
+def extract_page_layout(page) -> Dict[str, Any]:
+    """页面的版面信息：尺寸、带坐标和字号的词、字符（字段顺序见page_cache.WORD_FIELDS/CHAR_FIELDS）"""
+    words = page.extract_words(extra_attrs=["size", "fontname"])
+    return {
+        "width": _round(page.width),
+        "height": _round(page.height),
+        "words": [[w["text"], _round(w["x0"]), _round(w["top"]), _round(w["x1"]), _round(w["bottom"]),
+                   _round(w["size"]), w["fontname"]] for w in words],
+        "chars": [[c["text"], _round(c["x0"]), _round(c["top"]), _round(c["x1"]), _round(c["bottom"]),
+                   _round(c["size"]), c["fontname"]] for c in page.chars]
+    }
+
+def extract_page(page, with_tables: bool = False, detailed: bool = False) -> Dict[str, Any]:
+    """提取一页的文本；with_tables时识别出的报表单独返回，正文中不再包含报表内容
+
+    detailed时同时保留完整正文（full_text）和版面信息，供页面缓存使用。
+    elapsed为本页在pdfplumber中的耗时（在工作进程中测量，由调用方汇总到运行指标）。
+    """
+    start = time.perf_counter()
+    record = {"page": page.page_number, "text": "", "tables": [], "error": None}
+    try:
+        if with_tables:
+            tables, text = extract_page_tables(page)
+            record.update(text=text, tables=tables)
+            if detailed:
+                record["full_text"] = (page.extract_text() or "") if tables else text
+        else:
+            record["text"] = page.extract_text() or ""
+        if detailed:
+            record.update(extract_page_layout(page))
+    except Exception as e:
+        record["error"] = str(e)
+    finally:
+        # 释放pdfplumber缓存的页面对象，避免内存随页数增长
+        page.flush_cache()
+    record["elapsed"] = time.perf_counter() - start
+    return record
+
+def extract_page_range(pdf_path: str, indices: Sequence[int], with_tables: bool = False,
+                       detailed: bool = False) -> List[Dict[str, Any]]:
+    """在工作进程中独立打开PDF并提取指定下标的各页"""
+    with pdfplumber.open(pdf_path) as pdf:
+        return [extract_page(pdf.pages[index], with_tables, detailed) for index in indices]
+
+def _parse_pages(pdf_path: Path, indices: Sequence[int], workers: int, pages_per_range: int,
+                 with_tables: bool, detailed: bool) -> Iterator[Dict[str, Any]]:
+    """按顺序解析指定下标的页面，workers>1时由多个进程并行提取"""
+    if not indices:
+        return
+    if workers <= 1 or len(indices) <= 1:
+        with pdfplumber.open(pdf_path) as pdf:
+            for index in indices:
+                yield extract_page(pdf.pages[index], with_tables, detailed)
+        return
+
+    # 分组较小且数量多于进程数，让耗时不均的页面也能均衡分配
+    groups = iter(split_page_groups(indices, pages_per_range))
+    logger.info(f"使用 {workers} 个进程并行提取 {len(indices)} 页")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for group in groups:
+            pending.append(executor.submit(extract_page_range, str(pdf_path), group, with_tables, detailed))
+            if len(pending) >= workers * 2:
+                break
+
+        while pending:
+            records = pending.popleft().result()
+            for group in groups:
+                pending.append(executor.submit(extract_page_range, str(pdf_path), group, with_tables, detailed))
+                break
+            for record in records:
+                yield record
+
+def _page_view(record: Dict[str, Any], with_tables: bool, cached: bool) -> Dict[str, Any]:
+    """把缓存中的完整页面记录转换为调用方需要的形式"""
+    view = dict(record)
+    if not with_tables:
+        view["text"] = record.get("full_text", record["text"])
+        view["tables"] = []
+    view.setdefault("error", None)
+    view["elapsed"] = 0.0 if cached else record.get("elapsed", 0.0)
+    view["cached"] = cached
+    return view
+
+def iter_pages(pdf_path: Path, workers: int = None, pages_per_range: int = 4,
+               with_tables: bool = False, cache=None, layout: bool = False,
+               pages: Iterable[int] = None) -> Iterator[Dict[str, Any]]:
+    """按页码顺序逐页产出 {"page", "text", "tables", "error"}，workers>1时由多个进程并行提取
+
+    提取是流式的：同时只有约 2*workers 个分组在处理或等待消费，
+    因此内存占用只与这几页有关，下游可以在最后一页解析完之前就开始处理。
+    指定页面缓存（PageCache）或layout时，记录中还包括版面信息（words、chars、width、height）；
+    使用页面缓存时，已缓存的页面直接读取，只解析缺失或失效的页面。
+    指定pages（页码从1开始）时只处理这些页，其余页面不会被解析。
+    """
+    workers = workers or os.cpu_count() or 1
+    total_pages = count_pages(pdf_path, cache)
+    if pages is None:
+        indices = list(range(total_pages))
+    else:
+        indices = sorted({page - 1 for page in pages if 1 <= page <= total_pages})
+    if cache is None:
+        yield from _parse_pages(pdf_path, indices, workers, pages_per_range, with_tables, layout)
+        return
+
+    pdf_hash = cache.fingerprint(pdf_path)
+    cached = cache.cached_pages(pdf_hash)
+    missing = [index for index in indices if index + 1 not in cached]
+    cache.misses += len(missing)
+    metrics = get_metrics()
+    metrics.count("pdf.page_cache_hits", len(indices) - len(missing))
+    metrics.count("pdf.page_cache_misses", len(missing))
+    if missing:
+        logger.info(f"页面缓存命中 {len(indices) - len(missing)}/{len(indices)} 页，解析其余 {len(missing)} 页")
+    # 缓存记录总是包含报表和完整正文，同一份缓存可以满足是否单独提取报表的两种调用
+    parsed = _parse_pages(pdf_path, missing, workers, pages_per_range, True, True)
+    for index in indices:
+        record = cache.get(pdf_hash, index + 1) if index + 1 in cached else None
+        if record is not None:
+            yield _page_view(record, with_tables, cached=True)
+            continue
+        record = next(parsed) if index + 1 not in cached else extract_page_range(str(pdf_path), [index], True, True)[0]
+        cache.put(pdf_hash, record)
+        yield _page_view(record, with_tables, cached=False)
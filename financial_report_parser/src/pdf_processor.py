@@ -1,58 +1,59 @@
-import pdfplumber
 from pathlib import Path
-from typing import List, Generator
-from .utils import ProgressBar, stream_output
+from typing import List, Generator, Iterable, Dict, Any, Set
+from .utils import ProgressBar, stream_output, estimate_tokens, VERBOSITY_VERBOSE
+from .pdf_pool import count_pages, iter_pages
+from .chunker import TokenChunker
+from .metrics import get_metrics
 import logging
 
 class PDFProcessor:
-    def __init__(self, chunk_size: int = 4000):
-        self.chunk_size = chunk_size
+    def __init__(self, max_tokens: int = 4000, overlap_tokens: int = 0, workers: int = 1, extract_tables: bool = False,
+                 page_cache=None):
+        self.chunker = TokenChunker(max_tokens, overlap_tokens)  # 按token数切分，段落和报表不会被拆开
+        self.workers = workers  # 并行提取页面的进程数
+        self.extract_tables = extract_tables  # 报表单独返回，不进入文本块
+        self.page_cache = page_cache  # 页面解析缓存（PageCache），为None时每次都重新解析
         self.logger = logging.getLogger(__name__)
 
-    def extract_text(self, pdf_path: Path) -> str:
-        """从PDF文件中提取文本"""
-        text = ""
+    def iter_pages(self, pdf_path: Path, pages: Set[int] = None) -> Generator[Dict[str, Any], None, None]:
+        """逐页产出 {"page", "text", "tables"}，不在内存中保留整份文档；指定pages时只处理这些页"""
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                total_pages = len(pdf.pages)
-                progress = ProgressBar(total_pages, prefix='提取PDF文本:', suffix='完成')
-                
-                for i, page in enumerate(pdf.pages):
-                    page_text = page.extract_text() or ""
-                    text += page_text
-                    progress.print(i + 1)
-                    stream_output(f"第{i+1}页: 提取了{len(page_text)}个字符")
+            total_pages = len(pages) if pages is not None else count_pages(pdf_path, self.page_cache)
+            progress = ProgressBar(total_pages, prefix='提取PDF文本:', suffix='完成')
+            
+            metrics = get_metrics()
+            for i, record in enumerate(iter_pages(pdf_path, self.workers, with_tables=self.extract_tables,
+                                                  cache=self.page_cache, pages=pages)):
+                metrics.observe("pdf.extract_page", record.get("elapsed", 0.0))
+                metrics.count("pdf.pages")
+                if record["error"]:
+                    raise Exception(f"第{record['page']}页: {record['error']}")
+                progress.print(i + 1)
+                stream_output(f"第{i+1}页: 提取了{len(record['text'])}个字符", level=VERBOSITY_VERBOSE)
+                yield {"page": record["page"], "text": record["text"], "tables": record["tables"]}
                     
         except Exception as e:
             raise Exception(f"PDF处理错误: {str(e)}")
-        return text
+
+    def extract_text(self, pdf_path: Path) -> str:
+        """从PDF文件中提取全部文本"""
+        return "".join(record["text"] for record in self.iter_pages(pdf_path))
 
     def split_text(self, text: str) -> Generator[str, None, None]:
         """将文本分割成较小的块"""
-        words = text.split()
-        current_chunk = []
-        current_length = 0
-
-        total_words = len(words)
-        progress = ProgressBar(total_words, prefix='分割文本:', suffix='完成')
-        processed_words = 0
+        yield from self._counted(self.chunker.chunk_text(text))
 
-        for word in words:
-            word_length = len(word) + 1  # +1 for space
-            if current_length + word_length > self.chunk_size:
-                chunk_text = ' '.join(current_chunk)
-                stream_output(f"生成文本块: {len(chunk_text)}字符")
-                yield chunk_text
-                current_chunk = [word]
-                current_length = word_length
-            else:
-                current_chunk.append(word)
-                current_length += word_length
-            
-            processed_words += 1
-            progress.print(processed_words)
+    def split_pages(self, pages: Iterable[Dict[str, Any]]) -> Generator[str, None, None]:
+        """惰性地把逐页文本切分为文本块，读到一块就产出一块"""
+        yield from self._counted(self.chunker.chunk_pages(pages))
 
-        if current_chunk:
-            chunk_text = ' '.join(current_chunk)
-            stream_output(f"生成最后一个文本块: {len(chunk_text)}字符")
+    def _counted(self, chunks: Iterable[str]) -> Generator[str, None, None]:
+        """记录每个文本块的字符数和估算的token数"""
+        metrics = get_metrics()
+        for chunk_text in chunks:
+            tokens = estimate_tokens(chunk_text)
+            stream_output(f"生成文本块: {len(chunk_text)}字符，约{tokens} token")
+            metrics.count("chunk.chunks")
+            metrics.count("chunk.chars", len(chunk_text))
+            metrics.count("chunk.tokens", tokens)
             yield chunk_text 
\ No newline at end of file
@@ -0,0 +1,55 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PROMPTS_FORMAT_VERSION = "2.0"  # prompts.json格式：模板单独存放，块记录只引用模板id
+
+def make_template(name: str, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+    """构造模板记录，版本为消息内容的摘要，内容变化时id随之变化"""
+    digest = hashlib.sha1(json.dumps(messages, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()[:8]
+    return {"id": f"{name}@{digest}", "name": name, "version": digest, "messages": messages}
+
+class PromptRegistry:
+    """prompts.json的只读视图：按块编号O(1)查找，调用时才把模板渲染为消息
+
+    模板中的{text}、{h1_title}、{h2_title}用文本块的内容填充，其余花括号已转义。
+    旧版prompts.json中每个块直接保存了完整的提示词，仍然可以读取。
+    """
+    def __init__(self, data: Dict[str, Any]):
+        self.version = data.get("version", "1.0")
+        self.templates = data.get("templates", {})
+        self._entries = {entry["block_id"]: entry for entry in data.get("blocks", [])}
+        # 同名模板可能有多个版本，后写入的为当前版本
+        self._by_name = {template["name"]: template_id for template_id, template in self.templates.items()}
+
+    @classmethod
+    def load(cls, path: Path) -> "PromptRegistry":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def entry(self, block_id: int) -> Optional[Dict[str, Any]]:
+        """块的记录，没有时返回None"""
+        return self._entries.get(block_id)
+
+    def messages(self, block_id: int, block: Dict[str, Any]) -> Optional[List[Dict[str, str]]]:
+        """块的提取消息；块没有记录时使用其类型的当前模板，都没有时返回None"""
+        entry = self._entries.get(block_id)
+        if entry is not None and "prompts" in entry and entry["prompts"]:
+            return entry["prompts"]["analyze"]["messages"]
+        template_id = entry.get("template") if entry is not None else None
+        if template_id is None:
+            template_id = self._by_name.get(f"extract.{block.get('type', 'other')}") or self._by_name.get("extract.other")
+        if template_id is None or template_id not in self.templates:
+            return None
+        return self.render(template_id, block)
+
+    def render(self, template_id: str, block: Dict[str, Any]) -> List[Dict[str, str]]:
+        """用文本块的内容渲染模板"""
+        params = {"text": block.get("text", ""), "h1_title": block.get("h1_title", ""),
+                  "h2_title": block.get("h2_title", "")}
+        return [{"role": message["role"], "content": message["content"].format(**params)}
+                for message in self.templates[template_id]["messages"]]
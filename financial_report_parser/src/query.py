@@ -0,0 +1,97 @@
+import sqlite3
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Union
+
+from .data_storage import DataStorage, connect
+from .units import normalize_indicator
+
+# 两张指标表的列名映射：financial_data来自main.py的流程，structured_data来自extract.py
+_SOURCES = {
+    "financial_data": "indicator_name",
+    "structured_data": "name"
+}
+
+class IndicatorQuery:
+    """跨报告、跨年度的指标查询
+
+    指标名按规范形式（见units.normalize_indicator）精确匹配，期间按字符串区间过滤，
+    都落在 (indicator_key, period) 索引上，不需要扫描全表。
+    """
+    def __init__(self, storage: Union[DataStorage, Path], sources: List[str] = None):
+        db_path = storage.db_path if isinstance(storage, DataStorage) else Path(storage)
+        if not isinstance(storage, DataStorage):
+            DataStorage(db_path)  # 确保表结构是最新版本
+        self.sources = sources or list(_SOURCES)
+        self.conn = connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+
+    def _select(self, where: str) -> str:
+        """生成对各指标表执行同一条件的UNION ALL查询"""
+        parts = [
+            f"""SELECT r.company AS company, r.year AS report_year, t.period AS period,
+                       t.{_SOURCES[source]} AS indicator, t.canonical_value AS value,
+                       t.canonical_unit AS unit, t.report_id AS report_id, t.block_id AS block_id,
+                       '{source}' AS source
+                FROM {source} t LEFT JOIN reports r ON r.id = t.report_id
+                WHERE {where}"""
+            for source in self.sources
+        ]
+        return " UNION ALL ".join(parts)
+
+    def time_series(self, indicator: str, company: Optional[str] = None,
+                    start: Union[int, str, None] = None, end: Union[int, str, None] = None) -> List[Dict[str, Any]]:
+        """某个指标在一段期间内的取值，start/end为年份或期间（如2019、"2023H1"），包含两端"""
+        where = ["t.indicator_key = ?"]
+        params = [normalize_indicator(indicator)]
+        if start is not None:
+            where.append("t.period >= ?")
+            params.append(str(start))
+        if end is not None:
+            # "~"大于"H"、"Q"，使"2023"同时包含"2023H1"、"2023Q4"等期间
+            where.append("t.period <= ?")
+            params.append(f"{end}~")
+        if company is not None:
+            where.append("r.company = ?")
+            params.append(company)
+        sql = self._select(" AND ".join(where)) + " ORDER BY company, period"
+        return self._fetch(sql, params * len(self.sources))
+
+    def cross_section(self, indicator: str, period: Union[int, str],
+                      companies: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """同一期间内各公司的指标取值"""
+        where = ["t.indicator_key = ?", "t.period = ?"]
+        params = [normalize_indicator(indicator), str(period)]
+        if companies:
+            where.append(f"r.company IN ({','.join('?' * len(companies))})")
+            params.extend(companies)
+        sql = self._select(" AND ".join(where)) + " ORDER BY company"
+        return self._fetch(sql, params * len(self.sources))
+
+    def report_blocks(self, report_id: int, block_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """某份报告（或其中某个文本块）提取出的全部指标"""
+        where = ["t.report_id = ?"]
+        params = [report_id]
+        if block_id is not None:
+            where.append("t.block_id = ?")
+            params.append(block_id)
+        sql = self._select(" AND ".join(where)) + " ORDER BY block_id, period"
+        return self._fetch(sql, params * len(self.sources))
+
+    def indicators(self, prefix: str = "", limit: int = 100) -> List[str]:
+        """按前缀列出已有的指标名（规范形式）"""
+        key = normalize_indicator(prefix)
+        names = set()
+        for source in self.sources:
+            # 前缀匹配改写为区间条件，才能用上索引
+            rows = self.conn.execute(
+                f"SELECT DISTINCT indicator_key FROM {source} WHERE indicator_key >= ? AND indicator_key < ? LIMIT ?",
+                (key, key + "\U0010ffff", limit)
+            )
+            names.update(row[0] for row in rows)
+        return sorted(names)[:limit]
+
+    def _fetch(self, sql: str, params: List[Any]) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def close(self) -> None:
+        self.conn.close()
@@ -1,6 +1,8 @@
+import argparse
+import hashlib
 import json
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 import sys
 import os
 import sqlite3
@@ -9,22 +11,68 @@ import sqlite3
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from src.utils import setup_logging, stream_output, ProgressBar
+from src.utils import (setup_logging, stream_output, ProgressBar, estimate_tokens,
+                       configure_output, get_console, VERBOSITY_VERBOSE)
 from src.llm_processor import LLMProcessor
+from src.dispatcher import ConcurrentDispatcher, RateLimiter
+from src.response_cache import ResponseCache
+from src.checkpoint import CheckpointLog, atomic_write_json
+from src.triage import Triage, summarize as summarize_triage, LLM as TRIAGE_LLM
+from src.json_stream import repair_json
+from src.prompt_registry import PromptRegistry, make_template, PROMPTS_FORMAT_VERSION
+from src.cut import BLOCK_TYPE_KEYWORDS
+from src.resilience import LLMRequestError, RetryPolicy, CircuitBreaker
+from src.metrics import get_metrics, instrumented, add_cli_arguments
+import time
 import colorama
 from colorama import Fore, Style
 
 class TextAnalyzer:
-    def __init__(self, api_key: str, api_base: str):
+    def __init__(self, api_key: str, api_base: str, model: str = "moonshot-v1-8k", max_workers: int = 1,
+                 max_in_flight: int = None,
+                 rpm_limit: int = 0, tpm_limit: int = 0, output_token_reserve: int = 512,
+                 cache: ResponseCache = None, use_cache: bool = True,
+                 pool_size: int = 10, timeout: Tuple[float, float] = (10, 120),
+                 pack_blocks: bool = True, context_window: int = 8192,
+                 pack_max_blocks: int = 30, pack_output_tokens: int = 160,
+                 compact_every: int = 200, triage: Triage = None, max_continuations: int = 2,
+                 retry_policy: RetryPolicy = None, circuit_breaker: CircuitBreaker = None):
         self.logger = setup_logging()
-        self.llm = LLMProcessor(api_key, api_base)
+        # 限流在LLMProcessor中对每次发出的请求生效，打包请求、逐块回退、续写和重试共用同一配额
+        rate_limiter = RateLimiter(rpm=rpm_limit, tpm=tpm_limit) if (rpm_limit or tpm_limit) else None
+        # 打包大小按context_window推算，请求必须发给同一个模型
+        self.llm = LLMProcessor(api_key, api_base, model=model, cache=cache, use_cache=use_cache,
+                                pool_size=max(pool_size, max_workers), timeout=timeout,
+                                max_continuations=max_continuations, retry_policy=retry_policy,
+                                circuit_breaker=circuit_breaker,
+                                rate_limiter=rate_limiter, output_token_reserve=output_token_reserve)
         colorama.init()
         
+        # 并发调度配置
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight
+        self.output_token_reserve = output_token_reserve
+        
+        # 打包配置：同一章节的相邻文本块合并为一次请求
+        self.pack_blocks = pack_blocks
+        self.context_window = context_window
+        self.pack_max_blocks = pack_max_blocks
+        self.pack_output_tokens = pack_output_tokens  # 预计每个文本块占用的输出token数
+        
+        # 每提交多少个文本块，把检查点日志压缩为prompts.json/read.json快照
+        self.compact_every = compact_every
+        
+        # 各类型的提取模板，prompts.json中只保存一份，块记录引用模板id
+        self._templates = {}
+        
+        # 分流：没有内容的块跳过，简单数值用规则提取，其余才调用LLM
+        self.triage = triage
+        
         # 初始化数据库连接
         db_path = Path(__file__).parent.parent / "data" / "analysis.db"
         self._init_db(db_path)
         
-        # 加载提示词
+        # 加载提示词，提示词的摘要作为版本计入文本块指纹
         self.prompts = {
             "system": """你是一个专业的金融文本分析专家。请分析每个句子并提取以下信息：
 1. 数值型数据：财务数据、业务指标、风险指标等
@@ -63,8 +111,48 @@ class TextAnalyzer:
             }}
         ]
     }}
+}}""",
+            
+            "batch_user": """请逐句分析以下句子，它们来自同一章节，提取关键信息并按JSON格式返回：
+
+标题信息：
+一级标题：{h1_title}
+二级标题：{h2_title}
+
+句子列表（每行以[编号]开头）：
+{items}
+
+请为每个句子返回一项结果，block_id必须与句子编号一致，不要遗漏任何句子：
+{{
+    "results": [
+        {{
+            "block_id": 编号,
+            "analysis": {{
+                "structured_data": [
+                    {{
+                        "name": "指标名称",
+                        "type": "指标类型",
+                        "value": "具体数值",
+                        "unit": "单位",
+                        "time": "时间信息",
+                        "importance": "重要程度1-5"
+                    }}
+                ],
+                "unstructured_data": [
+                    {{
+                        "type": "信息类型",
+                        "content": "具体内容",
+                        "importance": "重要程度1-5",
+                        "time_sensitivity": "时间敏感度"
+                    }}
+                ]
+            }}
+        }}
+    ]
 }}"""
         }
+        self.prompt_version = hashlib.sha1(
+            json.dumps(self.prompts, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()[:12]
 
     def _init_db(self, db_path: Path) -> None:
         """初始化数据库"""
@@ -109,119 +197,28 @@ class TextAnalyzer:
         conn.close()
 
     def _fix_json(self, json_str: str) -> str:
-        """尝试修复不完整的JSON"""
-        try:
-            # 首先尝试找到最后一个完整的结构
-            if '"unstructured_data": [' in json_str:
-                # 找到unstructured_data数组的开始位置
-                start_pos = json_str.find('"unstructured_data": [')
-                if start_pos > 0:
-                    # 找到最后一个完整的对象
-                    last_complete = json_str[:start_pos].rfind('}')
-                    if last_complete > 0:
-                        # 构造新的JSON
-                        fixed_json = json_str[:last_complete+1] + '''
-                ],
-                "unstructured_data": [
-                    {
-                        "type": "其他信息",
-                        "description": "其他未能完整解析的信息",
-                        "importance": 1,
-                        "related_topics": ["其他"],
-                        "time_sensitivity": "低"
-                    }
-                ]
-            }
-        }'''
-                        
-                        # 验证修复后的JSON
-                        try:
-                            json.loads(fixed_json)
-                            self.logger.info(f"{Fore.GREEN}JSON修复成功{Style.RESET_ALL}")
-                            return fixed_json
-                        except json.JSONDecodeError:
-                            pass
-
-            # 如果上述修复失败，尝试找到最后一个完整的structured_data项
-            if '"structured_data": [' in json_str:
-                start_pos = json_str.find('"structured_data": [')
-                if start_pos > 0:
-                    # 找到最后一个完整的对象
-                    content = json_str[start_pos:]
-                    bracket_count = 0
-                    last_complete = -1
-                    
-                    for i, char in enumerate(content):
-                        if char == '{':
-                            bracket_count += 1
-                        elif char == '}':
-                            bracket_count -= 1
-                            if bracket_count == 0:
-                                last_complete = start_pos + i
-                    
-                    if last_complete > 0:
-                        # 构造完整的JSON
-                        fixed_json = json_str[:last_complete+1] + '''
-                ],
-                "unstructured_data": []
-            }
-        }'''
-                        
-                        try:
-                            json.loads(fixed_json)
-                            self.logger.info(f"{Fore.GREEN}JSON修复成功（基础修复）{Style.RESET_ALL}")
-                            return fixed_json
-                        except json.JSONDecodeError:
-                            pass
-
-            # 如果还是失败，尝试最基本的修复
-            # 计算括号数量
-            open_braces = json_str.count('{')
-            close_braces = json_str.count('}')
-            open_brackets = json_str.count('[')
-            close_brackets = json_str.count(']')
-            
-            # 添加缺失的闭合括号
-            if open_braces > close_braces:
-                json_str += '}' * (open_braces - close_braces)
-            if open_brackets > close_brackets:
-                json_str += ']' * (open_brackets - close_brackets)
-            
-            # 尝试解析修复后的JSON
+        """修复不完整的JSON：截断到最后一个完整的值并补齐括号，不会添加原文中没有的记录"""
+        get_metrics().count("json.repairs", source="fix_json")
+        fixed = repair_json(json_str)
+        if fixed is not None:
             try:
-                json.loads(json_str)
-                self.logger.info(f"{Fore.GREEN}JSON修复成功（简单修复）{Style.RESET_ALL}")
-                return json_str
-            except json.JSONDecodeError as e:
-                self.logger.error(f"JSON修复失败: {str(e)}")
-                self.logger.error(f"修复后的内容:\n{json_str}")
-                
-                # 返回一个基本的有效JSON结构
-                basic_json = {
-                    "analysis": {
-                        "text_type": "未能完整解析的文本",
-                        "main_topic": "解析失败",
-                        "key_elements": [],
-                        "structured_data": [],
-                        "unstructured_data": [
-                            {
-                                "type": "错误信息",
-                                "description": "JSON解析失败，原始内容已保存",
-                                "importance": 1,
-                                "related_topics": ["错误处理"],
-                                "time_sensitivity": "高"
-                            }
-                        ]
-                    }
-                }
-                return json.dumps(basic_json, ensure_ascii=False)
-                
-        except Exception as e:
-            self.logger.error(f"JSON修复过程出错: {str(e)}")
-            raise
+                json.loads(fixed)
+                self.logger.info(f"{Fore.GREEN}JSON修复成功{Style.RESET_ALL}")
+                return fixed
+            except json.JSONDecodeError:
+                pass
+        self.logger.error(f"{Fore.RED}JSON修复失败，按没有提取到数据处理{Style.RESET_ALL}")
+        self.logger.error(f"原始内容:\n{json_str}")
+        return json.dumps({
+            "analysis": {
+                "structured_data": [],
+                "unstructured_data": [],
+                "parse_error": "无法解析的响应"
+            }
+        }, ensure_ascii=False)
 
-    def _save_analysis_result(self, block_id: int, block: Dict[str, Any], analysis: Dict[str, Any]) -> None:
-        """保存分析结果到JSON文件"""
+    def _save_analysis_result(self, block_id: int, block: Dict[str, Any], analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """解析分析结果，返回写入read.json的记录"""
         try:
             # 尝试解析LLM返回的JSON
             if isinstance(analysis.get("raw_analysis"), str):
@@ -239,19 +236,9 @@ class TextAnalyzer:
                         raise
             else:
                 self.logger.error(f"{Fore.RED}无效的分析结果格式{Style.RESET_ALL}")
-                return
+                return None
 
-            # 保存到JSON文件
-            analysis_path = Path(__file__).parent.parent / "data" / "read.json"
-            
-            # 加载现有数据或创建新的
-            if analysis_path.exists():
-                with open(analysis_path, 'r', encoding='utf-8') as f:
-                    all_analysis = json.load(f)
-            else:
-                all_analysis = {"blocks": []}
-            
-            # 添加新的分析结果
+            # 新的分析结果，由调用方追加到检查点日志，定期写入read.json
             block_analysis = {
                 "block_id": block_id,
                 "h1_title": block["h1_title"],
@@ -260,27 +247,19 @@ class TextAnalyzer:
                 "type": block["type"],
                 "analysis": parsed_analysis
             }
-            
-            # 检查是否已存在相同block_id的分析
-            for i, existing in enumerate(all_analysis["blocks"]):
-                if existing["block_id"] == block_id:
-                    all_analysis["blocks"][i] = block_analysis
-                    break
-            else:
-                all_analysis["blocks"].append(block_analysis)
-            
-            # 保存到JSON文件
-            with open(analysis_path, 'w', encoding='utf-8') as f:
-                json.dump(all_analysis, f, ensure_ascii=False, indent=2)
-            
-            self.logger.info(f"{Fore.GREEN}分析结果已保存到JSON文件{Style.RESET_ALL}")
+            return block_analysis
             
         except Exception as e:
             self.logger.error(f"{Fore.RED}保存分析结果失败: {str(e)}{Style.RESET_ALL}")
             raise
 
-    def analyze_blocks(self, input_path: Path, output_path: Path) -> None:
-        """分析文本块并生成提示词"""
+    def analyze_blocks(self, input_path: Path, output_path: Path, dead_letters_only: bool = False) -> None:
+        """分析文本块并生成提示词
+
+        单个文本块失败时记入死信队列（read_dead_letters.jsonl）并继续处理其余的块，
+        只有认证失败、服务长时间不可用这类所有请求都会失败的错误才中止运行。
+        dead_letters_only=True时只重新处理死信队列中的块。
+        """
         # 检查输入文件
         if not input_path.exists():
             raise FileNotFoundError(f"找不到输入文件: {input_path}")
@@ -291,157 +270,342 @@ class TextAnalyzer:
         
         blocks = data["blocks"]
         
-        # 加载或创建进度文件
-        progress_path = output_path.parent / "read_progress.json"
+        # 检查点日志：每个文本块提交时追加一行，定期压缩为快照
+        analysis_path = output_path.parent / "read.json"
+        checkpoint = CheckpointLog(output_path.parent / "read_checkpoint.jsonl")
         
-        # 检查是否需要重新开始
-        if self._should_restart(input_path, progress_path, output_path):
-            self.logger.info(f"{Fore.YELLOW}检测到cut.json已更新，需要重新开始解析{Style.RESET_ALL}")
-            user_input = input("是否要清理之前的所有分析结果并重新开始？(y/n): ")
-            if user_input.lower() == 'y':
-                self._clean_previous_files()
-                prompts = self._create_new_prompts()
-            else:
-                self.logger.info(f"{Fore.YELLOW}继续使用现有的分析结果{Style.RESET_ALL}")
-                prompts = self._load_progress(progress_path, output_path)
-        else:
-            prompts = self._load_progress(progress_path, output_path)
+        # 已有结果按内容指纹对应到当前的文本块，只有内容变化的块需要重新分析
+        prompts, results = self._load_progress(checkpoint, output_path, analysis_path)
+        if self._reconcile_progress(blocks, prompts, results):
+            # 检查点日志中的编号已经过时，立即写入快照
+            self._save_progress(prompts, results, checkpoint, output_path, analysis_path)
         
         # 获取已处理的块ID
         processed_blocks = {block["block_id"] for block in prompts["blocks"]}
         
+        # 之前失败的块按指纹记录在死信队列中，它们没有提交，本次会重新分析
+        dead_letters = CheckpointLog(output_path.parent / "read_dead_letters.jsonl")
+        previous_failures = {record["fingerprint"]: record for record in dead_letters}
+        if previous_failures:
+            self.logger.info(f"{Fore.YELLOW}死信队列中有 {len(previous_failures)} 个之前失败的文本块{Style.RESET_ALL}")
+        
         # 显示进度
         total_blocks = len(blocks)
         remaining_blocks = total_blocks - len(processed_blocks)
-        self.logger.info(f"{Fore.CYAN}��计 {total_blocks} 个文本块，已处理 {len(processed_blocks)} 个，剩余 {remaining_blocks} 个{Style.RESET_ALL}")
+        self.logger.info(f"{Fore.CYAN}共计 {total_blocks} 个文本块，已处理 {len(processed_blocks)} 个，剩余 {remaining_blocks} 个{Style.RESET_ALL}")
         
         if remaining_blocks == 0:
+            dead_letters.clear()
             self.logger.info(f"{Fore.GREEN}所有文本块已处理完成{Style.RESET_ALL}")
             return
         
-        progress = ProgressBar(remaining_blocks, prefix='分析文本块:', suffix='完成')
+        # 待分析的块按章节打包，LLM请求并发执行，结果按块顺序提交
+        pending = [(i, block) for i, block in enumerate(blocks) if i not in processed_blocks]
+        if dead_letters_only:
+            pending = [(i, block) for i, block in pending if self._fingerprint(block) in previous_failures]
+            self.logger.info(f"{Fore.CYAN}只重新处理死信队列中的 {len(pending)} 个文本块{Style.RESET_ALL}")
+        if self.triage is not None:
+            pending = self._apply_triage(blocks, pending, prompts, results, checkpoint, output_path)
+        
+        progress = ProgressBar(max(len(pending), 1), prefix='分析文本块:', suffix='完成')
         processed_count = 0
+        packs = self._pack_blocks(pending) if self.pack_blocks else [[item] for item in pending]
+        self.logger.info(f"{Fore.CYAN}{len(pending)} 个文本块打包为 {len(packs)} 个请求{Style.RESET_ALL}")
+        dispatcher = ConcurrentDispatcher(
+            max_workers=self.max_workers,
+            max_in_flight=self.max_in_flight
+        )
+        self.logger.info(f"{Fore.CYAN}并发线程数: {dispatcher.max_workers}，最大在途请求数: {dispatcher.max_in_flight}{Style.RESET_ALL}")
+        
+        outcomes = dispatcher.map(self._analyze_pack, packs)
         
         # 处理未分析的块
-        for i, block in enumerate(blocks):
-            if i in processed_blocks:
-                self.logger.info(f"{Fore.YELLOW}跳过已处理的文本块 {i+1}/{total_blocks}{Style.RESET_ALL}")
-                continue
+        failures = {}
+        for pack, pack_analysis, error in outcomes:
+            for i, block in pack:
+                self.logger.info(f"{Fore.CYAN}正在保存第 {i+1}/{total_blocks} 个文本块的分析结果{Style.RESET_ALL}")
+                stream_output(f"标题: {block['h1_title']} - {block['h2_title']}")
                 
-            self.logger.info(f"{Fore.CYAN}正在分析第 {i+1}/{total_blocks} 个文本块{Style.RESET_ALL}")
-            stream_output(f"标题: {block['h1_title']} - {block['h2_title']}")
-            
-            try:
-                # 分析文本块
-                analysis = self._analyze_block(block)
-                
-                # 保存分析结果
-                self._save_analysis_result(i, block, analysis)
-                
-                # 生成该块的提示词
-                block_prompts = self._generate_prompts(block, analysis)
-                prompts["blocks"].append({
-                    "block_id": i,
-                    "type": block["type"],
-                    "prompts": block_prompts
-                })
-                
-                # 保存当前进度
-                self._save_progress(prompts, progress_path, output_path)
-                
-                processed_count += 1
-                progress.print(processed_count)
-                
-            except Exception as e:
-                self.logger.error(f"{Fore.RED}处理文本块 {i+1} 时出错: {str(e)}{Style.RESET_ALL}")
-                self.logger.error(f"{Fore.RED}保存当前进度并退出{Style.RESET_ALL}")
-                self._save_progress(prompts, progress_path, output_path)
-                raise
+                try:
+                    if error is not None:
+                        raise error
+                    analysis = pack_analysis[i]
+                    
+                    # 解析分析结果
+                    block_analysis = self._save_analysis_result(i, block, analysis)
+                    
+                    # 该块提取时使用的模板，提示词在调用时才渲染
+                    template_id = self._generate_prompts(block, analysis)
+                    fingerprint = self._fingerprint(block)
+                    entry = {
+                        "block_id": i,
+                        "type": block["type"],
+                        "fingerprint": fingerprint,
+                        "template": template_id
+                    }
+                    prompts["blocks"].append(entry)
+                    if block_analysis is not None:
+                        block_analysis["fingerprint"] = fingerprint
+                        results[i] = block_analysis
+                    
+                    # 追加到检查点日志，定期写入完整快照
+                    checkpoint.append({"block_id": i, "prompts": entry, "analysis": block_analysis})
+                    processed_count += 1
+                    if processed_count % self.compact_every == 0:
+                        self._save_progress(prompts, results, checkpoint, output_path, analysis_path)
+                    
+                    progress.print(processed_count)
+                    
+                except Exception as e:
+                    self.logger.error(f"{Fore.RED}处理文本块 {i+1} 时出错: {str(e)}{Style.RESET_ALL}")
+                    if isinstance(e, LLMRequestError) and e.fatal:
+                        self.logger.error(f"{Fore.RED}保存当前进度并退出{Style.RESET_ALL}")
+                        self._save_progress(prompts, results, checkpoint, output_path, analysis_path)
+                        self._write_dead_letters(dead_letters, blocks, prompts, previous_failures, failures)
+                        raise
+                    fingerprint = self._fingerprint(block)
+                    failures[fingerprint] = {
+                        "block_id": i,
+                        "fingerprint": fingerprint,
+                        "error": str(e),
+                        "status": getattr(e, "status", None),
+                        "failed_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                        "attempts": previous_failures.get(fingerprint, {}).get("attempts", 0) + 1
+                    }
+        
+        # 处理完成后写入最终快照并清空检查点日志
+        self._save_progress(prompts, results, checkpoint, output_path, analysis_path)
+        remaining = self._write_dead_letters(dead_letters, blocks, prompts, previous_failures, failures)
+        if remaining:
+            self.logger.warning(
+                f"{Fore.YELLOW}{len(failures)} 个文本块本次处理失败，死信队列中共 {remaining} 个，"
+                f"可用 --dead-letters 重新处理{Style.RESET_ALL}"
+            )
+        
+        if self.llm.cache is not None:
+            stats = self.llm.cache.stats()
+            self.logger.info(f"{Fore.CYAN}响应缓存: 命中 {stats['hits']} 次，未命中 {stats['misses']} 次，命中率 {stats['hit_rate']:.1%}{Style.RESET_ALL}")
         
-        # 处理完成后删除进度文件
-        if progress_path.exists():
-            progress_path.unlink()
+        stats = self.llm.get_request_stats()
+        if stats["requests"]:
+            self.logger.info(
+                f"{Fore.CYAN}请求统计: 共 {stats['requests']} 次，新建连接 {stats['new_connections']} 次，"
+                f"首字节 p50={stats['ttfb']['p50']:.2f}s p95={stats['ttfb']['p95']:.2f}s，"
+                f"总耗时 p50={stats['total']['p50']:.2f}s p95={stats['total']['p95']:.2f}s{Style.RESET_ALL}"
+            )
         
         self.logger.info(f"{Fore.GREEN}所有文本块处理完成{Style.RESET_ALL}")
     
-    def _should_restart(self, input_path: Path, progress_path: Path, output_path: Path) -> bool:
-        """检查是否需要重新开始解析"""
-        # 获取cut.json的修改时间
-        cut_mtime = input_path.stat().st_mtime
-        
-        # 检查进度文件
-        if progress_path.exists():
-            progress_mtime = progress_path.stat().st_mtime
-            if cut_mtime > progress_mtime:
-                return True
-        
-        # 检查输出文件
-        if output_path.exists():
-            output_mtime = output_path.stat().st_mtime
-            if cut_mtime > output_mtime:
-                return True
-        
-        return False
-
-    def _clean_previous_files(self) -> None:
-        """清理之前的所有相关文件"""
-        base_dir = Path(__file__).parent.parent / "data"
-        files_to_clean = [
-            "read_progress.json",
-            "prompts.json",
-            "read.json",
-            "analysis.db"
-        ]
+    def _apply_triage(self, blocks: List[Dict[str, Any]], pending: List[Tuple[int, Dict[str, Any]]],
+                      prompts: Dict[str, Any], results: Dict[int, Dict[str, Any]],
+                      checkpoint: CheckpointLog, output_path: Path) -> List[Tuple[int, Dict[str, Any]]]:
+        """对待处理的块分流：跳过和规则提取的块直接提交，返回仍需LLM分析的块，并写出分流报告"""
+        labels = self.triage.classify(blocks)
+        llm_pending = [(i, block) for i, block in pending if labels[i]["label"] == TRIAGE_LLM]
+        routed = [(i, block) for i, block in pending if labels[i]["label"] != TRIAGE_LLM]
         
-        self.logger.info(f"{Fore.YELLOW}正在清理之前的文件...{Style.RESET_ALL}")
-        for file_name in files_to_clean:
-            file_path = base_dir / file_name
-            if file_path.exists():
-                try:
-                    file_path.unlink()
-                    self.logger.info(f"{Fore.GREEN}已删除: {file_name}{Style.RESET_ALL}")
-                except Exception as e:
-                    self.logger.error(f"{Fore.RED}删除 {file_name} 失败: {str(e)}{Style.RESET_ALL}")
+        records = []
+        for i, block in routed:
+            label = labels[i]
+            fingerprint = self._fingerprint(block)
+            analysis = {"analysis": {"structured_data": label["data"], "unstructured_data": []}}
+            block_analysis = {
+                "block_id": i,
+                "h1_title": block["h1_title"],
+                "h2_title": block["h2_title"],
+                "page": block["page"],
+                "type": block["type"],
+                "triage": label["label"],
+                "fingerprint": fingerprint,
+                "analysis": analysis
+            }
+            # extract.py根据triage字段跳过这些块或直接使用规则提取的数据
+            entry = {
+                "block_id": i,
+                "type": block["type"],
+                "triage": label["label"],
+                "fingerprint": fingerprint,
+                "data": {"structured": label["data"], "unstructured": []}
+            }
+            prompts["blocks"].append(entry)
+            results[i] = block_analysis
+            records.append({"block_id": i, "prompts": entry, "analysis": block_analysis})
+        if records:
+            checkpoint.append_many(records)
+        
+        # 按打包后的请求数统计实际节省的调用
+        calls_before = len(self._pack_blocks(pending)) if self.pack_blocks else len(pending)
+        calls_after = len(self._pack_blocks(llm_pending)) if self.pack_blocks else len(llm_pending)
+        summary = summarize_triage([labels[i] for i, _ in pending])
+        summary.update({
+            "analysis_calls_before": calls_before,
+            "analysis_calls_after": calls_after,
+            "analysis_calls_saved": calls_before - calls_after,
+            "extraction_calls_saved": len(routed)
+        })
+        atomic_write_json(output_path.parent / "triage.json", {"summary": summary, "blocks": labels})
+        self.logger.info(
+            f"{Fore.CYAN}分流: 跳过 {summary['skip']} 个，规则提取 {summary['rules']} 个，LLM分析 {summary['llm']} 个；"
+            f"分析请求 {calls_before} -> {calls_after}，提取请求减少 {len(routed)} 次{Style.RESET_ALL}"
+        )
+        return llm_pending
+    
+    def _write_dead_letters(self, dead_letters: CheckpointLog, blocks: List[Dict[str, Any]], prompts: Dict[str, Any],
+                            previous: Dict[str, Dict[str, Any]], failures: Dict[str, Dict[str, Any]]) -> int:
+        """重写死信队列：本次失败的块，加上之前失败、本次没有重新处理的块；返回队列长度"""
+        processed = {entry["block_id"] for entry in prompts["blocks"]}
+        unprocessed = {self._fingerprint(block): i for i, block in enumerate(blocks) if i not in processed}
+        records = {fingerprint: dict(record, block_id=unprocessed[fingerprint])
+                   for fingerprint, record in previous.items() if fingerprint in unprocessed}
+        records.update(failures)
+        dead_letters.clear()
+        if records:
+            dead_letters.append_many(sorted(records.values(), key=lambda record: record["block_id"]))
+        return len(records)
+
+    def _fingerprint(self, block: Dict[str, Any]) -> str:
+        """文本块的内容指纹：正文、标题、类型、提示词版本和该类型的提取模板版本，任何一项变化都需要重新分析"""
+        content = json.dumps([block["text"], block["h1_title"], block["h2_title"], block["type"], self.prompt_version,
+                              self._extraction_template(block["type"])["id"]], ensure_ascii=False)
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _same_legacy_text(entry: Dict[str, Any], result: Dict[str, Any], block: Dict[str, Any]) -> bool:
+        """旧版结果是否对应这段正文：结果中保存了正文时直接比较，否则在当时的提示词中查找；无法确认时视为不同"""
+        text = block["text"]
+        if "text" in result:
+            return result["text"] == text
+        if not text:
+            return False
+        return any(text in message.get("content", "")
+                   for prompt in entry.get("prompts", {}).values() if isinstance(prompt, dict)
+                   for message in prompt.get("messages", []))
+
+    def _reconcile_progress(self, blocks: List[Dict[str, Any]], prompts: Dict[str, Any],
+                            results: Dict[int, Dict[str, Any]]) -> bool:
+        """按内容指纹把已有结果对应到当前的文本块，返回是否有变化
+
+        重新切分后块的编号可能整体偏移，指纹相同的块沿用之前的结果（编号改为新的），
+        指纹变化的块留给后续重新分析，不再对应任何块的旧结果被丢弃。
+        """
+        fingerprints = [self._fingerprint(block) for block in blocks]
+        previous = {}
+        for entry in prompts["blocks"]:
+            block_id = entry["block_id"]
+            result = results.get(block_id)
+            fingerprint = entry.get("fingerprint")
+            if fingerprint is None:
+                # 旧版结果没有指纹：同一编号的块正文、标题和类型都一致时才沿用
+                if block_id < len(blocks) and result is not None and all(
+                        result.get(key) == blocks[block_id][key] for key in ("h1_title", "h2_title", "type")
+                ) and self._same_legacy_text(entry, result, blocks[block_id]):
+                    fingerprint = fingerprints[block_id]
+                else:
+                    continue
+            previous.setdefault(fingerprint, (entry, result))
+        
+        entries = []
+        reconciled = {}
+        for i, fingerprint in enumerate(fingerprints):
+            if fingerprint not in previous:
+                continue
+            entry, result = previous[fingerprint]
+            entries.append(self._normalize_entry(dict(entry, block_id=i, fingerprint=fingerprint)))
+            if result is not None:
+                reconciled[i] = dict(result, block_id=i, page=blocks[i]["page"], fingerprint=fingerprint)
+        
+        changed = entries != prompts["blocks"] or reconciled != results
+        if changed:
+            dropped = len(prompts["blocks"]) - len(previous)
+            self.logger.info(
+                f"{Fore.YELLOW}按内容指纹复用 {len(entries)} 个文本块的结果，"
+                f"{len(blocks) - len(entries)} 个需要分析，丢弃 {dropped} 个不再匹配的旧结果{Style.RESET_ALL}"
+            )
+        prompts["blocks"] = entries
+        results.clear()
+        results.update(reconciled)
+        return changed
 
     def _create_new_prompts(self) -> Dict[str, Any]:
         """创建新的提示词配置"""
-        # 删除旧的进度文件（如果存在）
-        progress_path = Path("data/read_progress.json")
-        if progress_path.exists():
-            progress_path.unlink()
-        
+        # 旧版进度文件由_save_progress在输出目录中清理
         # 创建新的配置
         return {
-            "version": "1.0",
+            "version": PROMPTS_FORMAT_VERSION,
             "default": self._get_default_prompts(),
+            "templates": {},
             "blocks": []
         }
 
-    def _load_progress(self, progress_path: Path, output_path: Path) -> Dict[str, Any]:
-        """加载处理进度"""
-        if progress_path.exists():
-            # 如果有进度文件���加载之前的进度
+    def _load_progress(self, checkpoint: CheckpointLog, output_path: Path,
+                       analysis_path: Path) -> Tuple[Dict[str, Any], Dict[int, Dict[str, Any]]]:
+        """加载处理进度：读取最近的快照，再按顺序重放检查点日志"""
+        legacy_progress_path = output_path.parent / "read_progress.json"
+        if legacy_progress_path.exists():
+            # 旧版本的完整进度文件
             self.logger.info(f"{Fore.YELLOW}发现未完成的处理进度{Style.RESET_ALL}")
-            with open(progress_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(legacy_progress_path, 'r', encoding='utf-8') as f:
+                prompts = json.load(f)
         elif output_path.exists():
             # 如果有输出文件，使用输出文件作为起点
             self.logger.info(f"{Fore.YELLOW}使用已有的输出文件{Style.RESET_ALL}")
             with open(output_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                prompts = json.load(f)
         else:
             # 创建新的提示词配置
-            return self._create_new_prompts()
+            prompts = self._create_new_prompts()
+        
+        results = {}
+        if analysis_path.exists():
+            with open(analysis_path, 'r', encoding='utf-8') as f:
+                results = {item["block_id"]: item for item in json.load(f)["blocks"]}
+        
+        # 重放检查点日志，相同block_id以日志中的记录为准
+        entries = {entry["block_id"]: entry for entry in prompts["blocks"]}
+        replayed = 0
+        for record in checkpoint:
+            entries[record["block_id"]] = record["prompts"]
+            if record.get("analysis") is not None:
+                results[record["block_id"]] = record["analysis"]
+            replayed += 1
+        if replayed:
+            self.logger.info(f"{Fore.YELLOW}从检查点日志恢复了 {replayed} 个文本块{Style.RESET_ALL}")
+        # 旧版块记录中的完整提示词留到_reconcile_progress比对正文之后再转换为模板id
+        prompts["blocks"] = [entries[block_id] for block_id in sorted(entries)]
+        prompts["version"] = PROMPTS_FORMAT_VERSION
+        return prompts, results
+
+    def _normalize_entry(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """块记录只保留模板引用：旧版完整的提示词改为模板id，已有的模板id保持不变"""
+        if entry.get("triage") in ("skip", "rules"):
+            entry.pop("prompts", None)
+            return entry
+        if "prompts" not in entry:
+            return entry
+        entry = {key: value for key, value in entry.items() if key != "prompts"}
+        entry.setdefault("template", self._extraction_template(entry["type"])["id"])
+        return entry
     
-    def _save_progress(self, prompts: Dict[str, Any], progress_path: Path, output_path: Path) -> None:
-        """保存处理进度"""
-        # 保存进度文件
-        with open(progress_path, 'w', encoding='utf-8') as f:
-            json.dump(prompts, f, ensure_ascii=False, indent=2)
+    def _save_progress(self, prompts: Dict[str, Any], results: Dict[int, Dict[str, Any]],
+                       checkpoint: CheckpointLog, output_path: Path, analysis_path: Path) -> None:
+        """写入完整快照（prompts.json和read.json）并压缩检查点日志"""
+        prompts["blocks"].sort(key=lambda entry: entry["block_id"])
+        # 模板只存一份：当前各类型的模板，加上仍被引用的旧版本
+        referenced = {entry["template"] for entry in prompts["blocks"] if "template" in entry}
+        templates = {template_id: template for template_id, template in prompts.get("templates", {}).items()
+                     if template_id in referenced}
+        for block_type in self._block_types():
+            template = self._extraction_template(block_type)
+            templates[template["id"]] = template
+        prompts["templates"] = templates
+        atomic_write_json(output_path, prompts)
+        atomic_write_json(analysis_path, {"blocks": [results[block_id] for block_id in sorted(results)]})
         
-        # 同时更新输出文件
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(prompts, f, ensure_ascii=False, indent=2)
+        # 快照已包含日志中的全部内容，删除旧版进度文件并清空日志
+        legacy_progress_path = output_path.parent / "read_progress.json"
+        if legacy_progress_path.exists():
+            legacy_progress_path.unlink()
+        checkpoint.clear()
         
         self.logger.info(f"{Fore.GREEN}进度已保存{Style.RESET_ALL}")
     
@@ -464,29 +628,19 @@ class TextAnalyzer:
         
         # 使用统一的分析提示词
         analysis_prompt = {
-            "messages": [
-                {
-                    "role": "system",
-                    "content": self.prompts["system"]
-                },
-                {
-                    "role": "user",
-                    "content": self.prompts["user"].format(
-                        h1_title=block['h1_title'],
-                        h2_title=block['h2_title'],
-                        text=block['text']
-                    )
-                }
-            ]
+            "messages": self._build_analysis_messages(block)
         }
         
         # 显示提示词
-        self.logger.info(f"\n{Fore.MAGENTA}【分析提示词】{Style.RESET_ALL}")
-        self.logger.info(json.dumps(analysis_prompt, ensure_ascii=False, indent=2))
+        if get_console().enabled(VERBOSITY_VERBOSE):
+            self.logger.info(f"\n{Fore.MAGENTA}【分析提示词】{Style.RESET_ALL}")
+            self.logger.info(json.dumps(analysis_prompt, ensure_ascii=False, indent=2))
         
         # 调用LLM并流式显示结果
         self.logger.info(f"\n{Fore.GREEN}【LLM分析结果】{Style.RESET_ALL}")
-        response = self.llm._call_llm(analysis_prompt["messages"])
+        metrics = get_metrics()
+        with metrics.context(block_type=block["type"]), metrics.timer("read.analyze_block"):
+            response = self.llm._call_llm_json(analysis_prompt["messages"])
         
         # 验证JSON完整性
         try:
@@ -501,6 +655,112 @@ class TextAnalyzer:
             "block_type": block["type"]
         }
     
+    def _build_analysis_messages(self, block: Dict[str, Any]) -> List[Dict[str, str]]:
+        """构造文本块的分析消息"""
+        return [
+            {
+                "role": "system",
+                "content": self.prompts["system"]
+            },
+            {
+                "role": "user",
+                "content": self.prompts["user"].format(
+                    h1_title=block['h1_title'],
+                    h2_title=block['h2_title'],
+                    text=block['text']
+                )
+            }
+        ]
+    
+    def _build_pack_messages(self, pack: List[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, str]]:
+        """构造多个文本块合并分析的消息"""
+        first = pack[0][1]
+        items = "\n".join(f"[{i}] {block['text']}" for i, block in pack)
+        return [
+            {
+                "role": "system",
+                "content": self.prompts["system"]
+            },
+            {
+                "role": "user",
+                "content": self.prompts["batch_user"].format(
+                    h1_title=first['h1_title'],
+                    h2_title=first['h2_title'],
+                    items=items
+                )
+            }
+        ]
+    
+    def _pack_blocks(self, pending: List[Tuple[int, Dict[str, Any]]]) -> List[List[Tuple[int, Dict[str, Any]]]]:
+        """把同一章节下相邻的文本块打包，使每个请求的输入和预计输出不超过模型上下文窗口
+
+        相邻指在待分析的块中相邻：中间被分流跳过或已处理的块不会打断同一章节的打包。
+        """
+        # 提示词本身的开销按空句子列表估算，并为每个句子的编号前缀预留token
+        overhead = sum(estimate_tokens(m["content"]) for m in self._build_pack_messages([(0, {"h1_title": "", "h2_title": "", "text": ""})]))
+        budget = self.context_window - self.output_token_reserve
+        
+        packs = []
+        current = []
+        used = 0
+        for i, block in pending:
+            cost = estimate_tokens(block["text"]) + 4 + self.pack_output_tokens
+            same_section = bool(current) and (
+                current[-1][1]["h1_title"] == block["h1_title"]
+                and current[-1][1]["h2_title"] == block["h2_title"]
+            )
+            if current and (not same_section
+                            or len(current) >= self.pack_max_blocks
+                            or overhead + estimate_tokens(block["h1_title"] + block["h2_title"]) + used + cost > budget):
+                packs.append(current)
+                current = []
+                used = 0
+            current.append((i, block))
+            used += cost
+        if current:
+            packs.append(current)
+        return packs
+    
+    def _analyze_pack(self, pack: List[Tuple[int, Dict[str, Any]]]) -> Dict[int, Dict[str, Any]]:
+        """分析一个打包请求，返回 block_id -> 分析结果；缺失的块退回单独分析"""
+        if len(pack) == 1:
+            i, block = pack[0]
+            return {i: self._analyze_block(block)}
+        
+        self.logger.info(f"{Fore.YELLOW}合并分析 {len(pack)} 个文本块 ({pack[0][0]+1}-{pack[-1][0]+1}){Style.RESET_ALL}")
+        results = {}
+        
+        def collect(key: str, item: Dict[str, Any]) -> None:
+            # 每个块的结果一闭合就收下，响应被截断时已完成的块不必重新分析
+            if key != "results" or not isinstance(item.get("analysis"), dict):
+                return
+            try:
+                results[int(item.get("block_id", -1))] = item["analysis"]
+            except (TypeError, ValueError):
+                pass
+        
+        # 合并请求的token按块类型归类，类型不一致时记为mixed
+        types = {block["type"] for _, block in pack}
+        metrics = get_metrics()
+        with metrics.context(block_type=types.pop() if len(types) == 1 else "mixed"), \
+                metrics.timer("read.analyze_pack"):
+            self.llm._call_llm_json(self._build_pack_messages(pack), on_item=collect,
+                                    output_tokens=self.pack_output_tokens * len(pack))
+        missing = len(pack) - len(results.keys() & {i for i, _ in pack})
+        if missing:
+            self.logger.warning(f"{Fore.YELLOW}合并分析缺少 {missing} 个块的结果，改为逐块分析{Style.RESET_ALL}")
+        
+        pack_analysis = {}
+        for i, block in pack:
+            if i in results:
+                pack_analysis[i] = {
+                    "raw_analysis": json.dumps({"analysis": results[i]}, ensure_ascii=False),
+                    "block_type": block["type"]
+                }
+            else:
+                pack_analysis[i] = self._analyze_block(block)
+        return pack_analysis
+    
     def _parse_analysis(self, response: str) -> Dict[str, Any]:
         """解析LLM的分析结果"""
         # 这里可以添加更复杂的解析逻辑
@@ -517,34 +777,29 @@ class TextAnalyzer:
             "unstructured_fields": []
         }
     
-    def _generate_prompts(self, block: Dict[str, Any], analysis: Dict[str, Any]) -> Dict[str, Any]:
-        """为文本块生成专门的提示词"""
-        self.logger.info(f"\n{Fore.YELLOW}正在生成提取提示词...{Style.RESET_ALL}")
+    def _generate_prompts(self, block: Dict[str, Any], analysis: Dict[str, Any]) -> str:
+        """选择文本块的提取模板，返回模板id"""
+        template = self._extraction_template(block["type"])
         
-        # 根据分析结果生成提示词
-        system_prompt = self._get_system_prompt(block["type"])
-        extraction_prompt = self._get_extraction_prompt(block["type"], analysis)
+        # 直接打印渲染后的提示词，不使用流式输出
+        if get_console().enabled(VERBOSITY_VERBOSE):
+            self.logger.info(f"\n{Fore.GREEN}生成的提示词:{Style.RESET_ALL}")
+            messages = PromptRegistry({"templates": {template["id"]: template}}).render(template["id"], block)
+            self.logger.info(json.dumps(messages, ensure_ascii=False, indent=2))
         
-        prompts = {
-            "analyze": {
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": extraction_prompt
-                    }
-                ]
-            }
-        }
-        
-        # 直接打印提示词，不使用流式输出
-        self.logger.info(f"\n{Fore.GREEN}生成的提示词:{Style.RESET_ALL}")
-        self.logger.info(json.dumps(prompts, ensure_ascii=False, indent=2))
-        
-        return prompts
+        return template["id"]
+    
+    def _extraction_template(self, block_type: str) -> Dict[str, Any]:
+        """各类型的提取模板，按类型缓存"""
+        if block_type not in self._templates:
+            self._templates[block_type] = make_template(f"extract.{block_type}", [
+                {"role": "system", "content": self._get_system_prompt(block_type).replace('{', '{{').replace('}', '}}')},
+                {"role": "user", "content": self._get_extraction_prompt(block_type)}
+            ])
+        return self._templates[block_type]
+    
+    def _block_types(self) -> List[str]:
+        return list(BLOCK_TYPE_KEYWORDS) + ["other"]
     
     def _get_system_prompt(self, block_type: str) -> str:
         """获取系统提示词"""
@@ -619,12 +874,12 @@ class TextAnalyzer:
         }
         return prompts.get(block_type, """你是一个专业的信息提取专家，请仔细分析文本并提取有价值的信息...""")
     
-    def _get_extraction_prompt(self, block_type: str, analysis: Dict[str, Any]) -> str:
-        """生成提取提示词"""
-        base_prompt = f"""请从以下文本中提取关键信息，并按照规定格式返回JSON：
+    def _get_extraction_prompt(self, block_type: str) -> str:
+        """生成提取提示词模板，{text}在调用时替换为文本块内容"""
+        base_prompt = """请从以下文本中提取关键信息，并按照规定格式返回JSON：
 
 文本内容：
-{analysis.get('text', '')}
+{text}
 
 需要提取的信息类型：
 """
@@ -790,7 +1045,8 @@ class TextAnalyzer:
     ]
 }""")
 
-        return base_prompt + type_prompt
+        # 返回格式中的花括号需要转义
+        return base_prompt + type_prompt.replace('{', '{{').replace('}', '}}')
     
     def _get_default_prompts(self) -> Dict[str, Any]:
         """获取默认提示词"""
@@ -877,12 +1133,13 @@ class TextAnalyzer:
         ]
         
         # 显示提示词
-        self.logger.info(f"\n{Fore.MAGENTA}【分析提示词】{Style.RESET_ALL}")
-        self.logger.info(json.dumps(messages, ensure_ascii=False, indent=2))
+        if get_console().enabled(VERBOSITY_VERBOSE):
+            self.logger.info(f"\n{Fore.MAGENTA}【分析提示词】{Style.RESET_ALL}")
+            self.logger.info(json.dumps(messages, ensure_ascii=False, indent=2))
         
         # 调用LLM并流式显示结果
         self.logger.info(f"\n{Fore.GREEN}【LLM分析结果】{Style.RESET_ALL}")
-        response = self.llm._call_llm(messages)
+        response = self.llm._call_llm_json(messages)
         
         # 验证JSON完整性
         try:
@@ -995,15 +1252,55 @@ class TextAnalyzer:
 def main():
     # 设置路径
     base_dir = Path(__file__).parent.parent
-    input_path = base_dir / "data" / "cut.json"
-    output_path = base_dir / "data" / "prompts.json"
+    parser = argparse.ArgumentParser(description="分析文本块并生成提取提示词")
+    parser.add_argument("--input", type=Path, default=base_dir / "data" / "cut.json", help="切分结果")
+    parser.add_argument("--output", type=Path, default=base_dir / "data" / "prompts.json",
+                        help="提示词输出文件，分析结果和检查点保存在同一目录")
+    parser.add_argument("--dead-letters", action="store_true", help="只重新处理死信队列中之前失败的文本块")
+    add_cli_arguments(parser)
+    args = parser.parse_args()
+    input_path = args.input
+    output_path = args.output
     
     # 从配置文件获取API配置
-    from config.settings import API_KEY, API_BASE
+    from config.settings import (API_KEY, API_BASE, LLM_MAX_WORKERS, LLM_MAX_IN_FLIGHT,
+                                 LLM_RPM_LIMIT, LLM_TPM_LIMIT, LLM_OUTPUT_TOKEN_RESERVE,
+                                 OUTPUT_MODE, OUTPUT_VERBOSITY, OUTPUT_STREAM_DELAY,
+                                 LLM_CACHE_ENABLED, LLM_CACHE_BYPASS, LLM_CACHE_PATH,
+                                 LLM_CACHE_MAX_MB, LLM_CACHE_MAX_AGE_DAYS,
+                                 LLM_POOL_SIZE, LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT,
+                                 LLM_MODEL, LLM_CONTEXT_WINDOWS, PACK_BLOCKS, PACK_MAX_BLOCKS,
+                                 PACK_OUTPUT_TOKENS_PER_BLOCK, TRIAGE_ENABLED, LLM_MAX_CONTINUATIONS,
+                                 LLM_RETRY_ATTEMPTS, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY,
+                                 LLM_CIRCUIT_FAILURES, LLM_CIRCUIT_RESET, LLM_CIRCUIT_MAX_WAIT,
+                                 METRICS_DIR, PROFILE)
+    configure_output(OUTPUT_MODE, OUTPUT_VERBOSITY, OUTPUT_STREAM_DELAY)
+    cache = ResponseCache(LLM_CACHE_PATH, LLM_CACHE_MAX_MB * 1024 * 1024, LLM_CACHE_MAX_AGE_DAYS) if LLM_CACHE_ENABLED else None
     
     # 创建分析器并处理
-    analyzer = TextAnalyzer(API_KEY, API_BASE)
-    analyzer.analyze_blocks(input_path, output_path)
+    analyzer = TextAnalyzer(
+        API_KEY, API_BASE,
+        model=LLM_MODEL,
+        max_workers=LLM_MAX_WORKERS,
+        max_in_flight=LLM_MAX_IN_FLIGHT,
+        rpm_limit=LLM_RPM_LIMIT,
+        tpm_limit=LLM_TPM_LIMIT,
+        output_token_reserve=LLM_OUTPUT_TOKEN_RESERVE,
+        cache=cache,
+        use_cache=not LLM_CACHE_BYPASS,
+        pool_size=LLM_POOL_SIZE,
+        timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT),
+        pack_blocks=PACK_BLOCKS,
+        context_window=LLM_CONTEXT_WINDOWS.get(LLM_MODEL, 8192),
+        pack_max_blocks=PACK_MAX_BLOCKS,
+        pack_output_tokens=PACK_OUTPUT_TOKENS_PER_BLOCK,
+        triage=Triage() if TRIAGE_ENABLED else None,
+        max_continuations=LLM_MAX_CONTINUATIONS,
+        retry_policy=RetryPolicy(LLM_RETRY_ATTEMPTS, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY),
+        circuit_breaker=CircuitBreaker(LLM_CIRCUIT_FAILURES, LLM_CIRCUIT_RESET, max_wait=LLM_CIRCUIT_MAX_WAIT)
+    )
+    with instrumented("read", args.metrics_dir or METRICS_DIR, args.profile or PROFILE, log=analyzer.logger):
+        analyzer.analyze_blocks(input_path, output_path, dead_letters_only=args.dead_letters)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
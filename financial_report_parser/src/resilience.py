@@ -0,0 +1,179 @@
+import random
+import threading
+import time
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+
+class LLMRequestError(Exception):
+    """LLM请求失败
+
+    retryable：稍后重试可能成功（429、5xx、网络错误）；
+    fatal：所有请求都会失败（认证失败等），继续运行没有意义；
+    retry_after：服务端要求的等待秒数（来自Retry-After）。
+    """
+    def __init__(self, message: str, status: int = None, retryable: bool = False,
+                 fatal: bool = False, retry_after: float = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.fatal = fatal
+        self.retry_after = retry_after
+
+    @property
+    def rate_limited(self) -> bool:
+        return self.status == 429
+
+class CircuitOpenError(LLMRequestError):
+    """服务端持续不可用，熔断器在最长等待时间内没有恢复"""
+    def __init__(self, message: str):
+        super().__init__(message, retryable=False, fatal=True)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After：秒数或HTTP日期"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def error_from_response(response: requests.Response) -> LLMRequestError:
+    """按HTTP状态码分类错误"""
+    status = response.status_code
+    try:
+        detail = response.text[:500]
+    except Exception:
+        detail = ""
+    if status in (401, 403):
+        return LLMRequestError(f"API认证失败({status}): {detail}", status=status, fatal=True)
+    if status == 429:
+        return LLMRequestError(f"请求过于频繁(429): {detail}", status=status, retryable=True,
+                               retry_after=parse_retry_after(response.headers.get("Retry-After")))
+    if status == 408 or status >= 500:
+        return LLMRequestError(f"服务端错误({status}): {detail}", status=status, retryable=True,
+                               retry_after=parse_retry_after(response.headers.get("Retry-After")))
+    return LLMRequestError(f"请求被拒绝({status}): {detail}", status=status)
+
+def classify_error(error: Exception) -> LLMRequestError:
+    """把请求过程中的异常统一为LLMRequestError"""
+    if isinstance(error, LLMRequestError):
+        return error
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error_from_response(error.response)
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)):
+        return LLMRequestError(f"网络错误: {error}", retryable=True)
+    return LLMRequestError(f"{type(error).__name__}: {error}")
+
+class RetryPolicy:
+    """指数退避+完全抖动：第n次重试等待 [0, min(max_delay, base_delay*2^n)] 内的随机时间，
+    服务端给出Retry-After时至少等待这么久"""
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: float = None) -> float:
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            return max(retry_after, backoff)
+        return backoff
+
+class PauseGate:
+    """所有工作线程共享的暂停闸门：遇到429时整体暂停，而不是各线程各自重试加剧限流"""
+    def __init__(self):
+        self._until = 0.0
+        self._lock = threading.Lock()
+
+    def pause_for(self, seconds: float) -> None:
+        with self._lock:
+            self._until = max(self._until, time.monotonic() + seconds)
+
+    def wait(self) -> float:
+        """阻塞到暂停结束，返回等待的秒数"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                remaining = self._until - time.monotonic()
+            if remaining <= 0:
+                return waited
+            time.sleep(remaining)
+            waited += remaining
+
+class CircuitBreaker:
+    """熔断器：连续失败达到阈值后断开，期间所有请求等待；
+    冷却结束后只放行一个探测请求，成功则恢复，失败则加倍冷却时间。
+    等待超过max_wait仍未恢复时抛出CircuitOpenError。
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 max_reset_timeout: float = 300.0, max_wait: float = 900.0):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.max_wait = max_wait
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._cond = threading.Condition()
+        self.logger = logging.getLogger(__name__)
+
+    def before_call(self) -> None:
+        """请求前调用：熔断时阻塞，直到可以发送请求"""
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self.state == self.CLOSED:
+                    return
+                if self.state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                    self.state = self.HALF_OPEN
+                if self.state == self.HALF_OPEN and not self._probing:
+                    self._probing = True
+                    return
+                if now >= deadline:
+                    raise CircuitOpenError(f"服务持续不可用，熔断器在 {self.max_wait:.0f} 秒内没有恢复")
+                wait = self._opened_at + self.reset_timeout - now if self.state == self.OPEN else 1.0
+                self._cond.wait(max(0.05, min(wait, deadline - now)))
+
+    def record_success(self) -> None:
+        with self._cond:
+            if self.state != self.CLOSED:
+                self.logger.info("探测请求成功，熔断器恢复")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.reset_timeout = self.base_reset_timeout
+            self._probing = False
+            self._cond.notify_all()
+
+    def record_failure(self) -> None:
+        with self._cond:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+                self._open()
+            elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+            self._cond.notify_all()
+
+    def release(self) -> None:
+        """请求以不计入熔断的方式结束（例如被拒绝的请求）时释放探测名额"""
+        with self._cond:
+            if self.state == self.HALF_OPEN and self._probing:
+                self._probing = False
+                self._cond.notify_all()
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probing = False
+        self.logger.warning(f"连续失败 {self.failures} 次，熔断 {self.reset_timeout:.0f} 秒")
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+class ResponseCache:
+    """LLM响应的持久化缓存
+
+    以规范化后的消息列表、模型和温度的哈希作为键，保存在SQLite中，
+    支持按条目大小和存活时间淘汰，并统计命中/未命中次数。
+    """
+    def __init__(self, db_path: Path, max_bytes: int = 512 * 1024 * 1024, max_age_days: float = 30):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400 if max_age_days else 0
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                hit_count INTEGER DEFAULT 0
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(messages: List[Dict[str, str]], model: str, temperature: float) -> str:
+        """根据规范化的消息列表、模型和温度计算缓存键"""
+        normalized = [
+            {"role": m.get("role", ""), "content": " ".join(str(m.get("content", "")).split())}
+            for m in messages
+        ]
+        payload = json.dumps(
+            {"model": model, "temperature": round(float(temperature), 4), "messages": normalized},
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，过期或不存在时返回None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.max_age and now - row[1] > self.max_age):
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ?, hit_count = hit_count + 1 WHERE key = ?",
+                (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str, model: str = None) -> None:
+        """写入缓存"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO responses (key, model, response, size, created_at, accessed_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (key, model, response, len(response.encode('utf-8')), now, now)
+            )
+            self._conn.commit()
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= 100:
+                self._evict()
+
+    def evict(self) -> int:
+        """按存活时间和总大小淘汰缓存，返回删除的条目数"""
+        with self._lock:
+            return self._evict()
+
+    def _evict(self) -> int:
+        self._writes_since_evict = 0
+        removed = 0
+        if self.max_age:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age,)
+            )
+            removed += cursor.rowcount
+        if self.max_bytes:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                # 按最近访问时间从旧到新删除，直到总大小降到上限以下
+                excess = total - self.max_bytes
+                keys = []
+                for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+                    keys.append((key,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+                removed += len(keys)
+        self._conn.commit()
+        if removed:
+            self.logger.info(f"响应缓存淘汰了 {removed} 条记录")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+            "size_bytes": size
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
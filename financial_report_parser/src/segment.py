@@ -0,0 +1,132 @@
+import re
+from collections import Counter
+from typing import Dict, Any, List, Tuple
+
+# 句末标点（可带右引号、右括号），一次匹配出整句；没有句末标点的尾部单独成句
+_SENTENCE_RE = re.compile(r'[^。！？；!?;]+(?:[。！？；!?;]+[”’」』）)]*)?|[。！？；!?;]+[”’」』）)]*')
+# 句子超长时在分句标点处再切
+_CLAUSE_RE = re.compile(r'[^，,、：:]+[，,、：:]*|[，,、：:]+')
+# 以这些标点结尾的行可能是段落的最后一行
+_PARAGRAPH_END = ('。', '！', '？', '!', '?', '；', ';', '：', ':', '”', '）', ')')
+_ASCII_WORD = re.compile(r'[A-Za-z0-9%]')
+
+def split_sentences(text: str) -> List[str]:
+    """按句末标点切分句子"""
+    return [sentence.strip() for sentence in _SENTENCE_RE.findall(text) if sentence.strip()]
+
+def _join(left: str, right: str) -> str:
+    """拼接折行：中文直接相连，西文单词和数字之间补一个空格"""
+    if not left:
+        return right
+    if _ASCII_WORD.match(left[-1]) and _ASCII_WORD.match(right[:1]):
+        return f"{left} {right}"
+    return left + right
+
+def split_text(text: str, max_chars: int) -> List[str]:
+    """把超长的文本按句子（句子仍超长时按分句，再不行按字数）切成不超过max_chars的片段，各片段长度尽量均匀"""
+    if len(text) <= max_chars:
+        return [text]
+    pieces = []
+    for sentence in split_sentences(text):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in _CLAUSE_RE.findall(sentence):
+            pieces.extend(clause[i:i + max_chars] for i in range(0, len(clause), max_chars))
+
+    parts = -(-len(text) // max_chars)
+    target = len(text) / parts
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and (len(current) + len(piece) > max_chars or len(current) >= target):
+            chunks.append(current)
+            current = ""
+        current = _join(current, piece)
+    if current:
+        chunks.append(current)
+    return chunks
+
+class ParagraphSegmenter:
+    """把按行读出的正文重新组合成段落，再切分为长度在[min_chars, max_chars]之间的文本块
+
+    折行和跨页的句子合并回段落：有版面信息时按行距、首行缩进和上一行是否提前结束判断段落边界，
+    否则只按行末标点判断。不足min_chars的段落与同一章节的下一段合并，超过max_chars的段落按句子切开。
+    遇到标题或文档结束时调用flush()，文本块不会跨越标题。
+    """
+    def __init__(self, min_chars: int = 80, max_chars: int = 600, gap_ratio: float = 0.8):
+        self.min_chars = min_chars
+        self.max_chars = max(max_chars, min_chars)
+        self.gap_ratio = gap_ratio  # 行距超过字号的这么多倍时视为段落间距
+        self.paragraphs = 0
+        self._margins = {}  # 页码 -> (左边界, 右边界)
+        self._lines = []    # 当前段落的行
+        self._pending = None  # 不足min_chars、等待与下一段合并的 (文本, 页码)
+
+    def begin_page(self, page: int, lines: List[Dict[str, Any]]) -> None:
+        """记录页面正文的左右边界，用于判断首行缩进和提前结束的行
+
+        左边界取行数最多的起始位置（标题、编号等可能更靠左），右边界取最靠右的行尾。
+        """
+        positioned = [line for line in lines if "x0" in line]
+        if positioned:
+            left, _ = Counter(round(line["x0"]) for line in positioned).most_common(1)[0]
+            self._margins[page] = (left, max(line["x1"] for line in positioned))
+
+    def feed(self, line: Dict[str, Any]) -> List[Tuple[str, int]]:
+        """加入一行正文，返回由此完成的文本块 [(文本, 页码)]"""
+        if not line["text"].strip():
+            return []
+        blocks = []
+        if self._lines and self._breaks(self._lines[-1], line):
+            blocks = self._close_paragraph()
+        self._lines.append(line)
+        return blocks
+
+    def flush(self) -> List[Tuple[str, int]]:
+        """结束当前段落，返回剩余的文本块"""
+        blocks = self._close_paragraph()
+        if self._pending is not None:
+            blocks.append(self._pending)
+            self._pending = None
+        return blocks
+
+    def _breaks(self, previous: Dict[str, Any], line: Dict[str, Any]) -> bool:
+        """上一行与这一行之间是否为段落边界"""
+        ends = previous["text"].rstrip().endswith(_PARAGRAPH_END)
+        if "size" not in line or "size" not in previous:
+            return ends
+        size = line["size"] or previous["size"] or 1.0
+        if line["page"] != previous["page"]:
+            # 跨页：上一页最后一行没有结束时一定是同一段，否则看新页首行是否缩进
+            left, _ = self._margins.get(line["page"], (line["x0"], line["x1"]))
+            return ends and line["x0"] - left >= size
+        if line["top"] - previous["bottom"] > self.gap_ratio * size:
+            return True
+        if line["x0"] - previous["x0"] >= size:  # 比上一行缩进：新段落的首行
+            return True
+        _, right = self._margins.get(previous["page"], (previous["x0"], previous["x1"]))
+        return ends and right - previous["x1"] > 2 * size
+
+    def _close_paragraph(self) -> List[Tuple[str, int]]:
+        if not self._lines:
+            return []
+        text = ""
+        for line in self._lines:
+            text = _join(text, ' '.join(line["text"].split()))
+        page = self._lines[0]["page"]
+        self._lines = []
+        self.paragraphs += 1
+
+        if self._pending is not None:
+            pending_text, pending_page = self._pending
+            if len(pending_text) + len(text) < self.max_chars:
+                text, page = _join(pending_text, text), pending_page
+                self._pending = None
+
+        blocks = [] if self._pending is None else [self._pending]
+        self._pending = None
+        chunks = split_text(text, self.max_chars)
+        if len(chunks[-1]) < self.min_chars:
+            self._pending = (chunks.pop(), page)
+        blocks.extend((chunk, page) for chunk in chunks)
+        return blocks
@@ -1,43 +1,131 @@
-import json
+import argparse
+import csv
 from pathlib import Path
 import sys
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
 from rich.console import Console
 from rich.table import Table
-from rich.text import Text
 import textwrap
-import pandas as pd
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 
-class BlockTableViewer:
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.json_stream import iter_json_array
+
+HEADERS = ["序号", "一级标题", "二级标题", "文本预览", "类型", "长度", "页码"]
+COLUMN_WIDTHS = [8, 30, 30, 50, 15, 10, 8]
+EXPORT_FORMATS = ("xlsx", "csv", "parquet")
+PARQUET_BATCH_ROWS = 5000  # Parquet按行组写入，每组的行数
+
+def iter_blocks(json_path: Path) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """流式读取cut.json，逐个产出 (序号, 文本块)，序号从1开始"""
+    return enumerate(iter_json_array(json_path, "blocks"), 1)
+
+def filter_blocks(blocks: Iterable[Tuple[int, Dict[str, Any]]], types: List[str] = None,
+                  page_range: Tuple[int, int] = None, title: str = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """按类型、页码范围（闭区间）和标题关键字筛选，序号保持原文件中的位置"""
+    types = set(types) if types else None
+    for i, block in blocks:
+        if types is not None and block["type"] not in types:
+            continue
+        if page_range is not None and not page_range[0] <= block["page"] <= page_range[1]:
+            continue
+        if title and title not in block["h1_title"] and title not in block["h2_title"]:
+            continue
+        yield i, block
+
+def parse_page_range(value: str) -> Tuple[int, int]:
+    """解析页码范围：10-20、10-（到末尾）或单页10"""
+    start, sep, end = value.partition('-')
+    try:
+        first = int(start) if start else 1
+        last = (int(end) if end else sys.maxsize) if sep else first
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的页码范围: {value}")
+    return first, last
+
+class BlockStats:
+    """边读边累计的按类型统计，不需要保留文本块"""
     def __init__(self):
+        self.types = {}  # 类型 -> {"count", "total_length"}
+        self.total = 0
+        self.total_length = 0
+
+    def add(self, block: Dict[str, Any]) -> None:
+        stats = self.types.setdefault(block["type"], {"count": 0, "total_length": 0})
+        stats["count"] += 1
+        stats["total_length"] += block["length"]
+        self.total += 1
+        self.total_length += block["length"]
+
+class BlockTableViewer:
+    def __init__(self, page_size: int = 50):
         self.console = Console()
-        
-    def display_blocks(self, json_path: Path) -> None:
-        """显示文本块的表格视图并导出到Excel"""
-        # 加载数据
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        blocks = data["blocks"]
-        total_blocks = data["total_blocks"]
-        
-        # 创建表格并显示
-        self._display_console_table(blocks, total_blocks)
-        
-        # 导出到Excel
-        self._export_to_excel(blocks, total_blocks)
-        
-    def _display_console_table(self, blocks: List[Dict], total_blocks: int) -> None:
-        """在控制台显示表格"""
+        self.page_size = page_size  # 控制台每页显示的行数
+
+    def display_blocks(self, json_path: Path, page: int = 1, interactive: bool = None,
+                       **filters) -> BlockStats:
+        """分页显示文本块的表格视图
+
+        文本块从文件中流式读取，每次只为当前页构造表格；交互终端中按回车翻到下一页，
+        否则只显示第page页。统计信息覆盖筛选后的全部文本块。
+        """
+        interactive = self.console.is_terminal if interactive is None else interactive
+        stats = BlockStats()
+        rows = []
+        current = page
+        showing = True
+        for n, (i, block) in enumerate(filter_blocks(iter_blocks(json_path), **filters)):
+            stats.add(block)
+            if not showing:
+                continue
+            current = n // self.page_size + 1
+            if current < page:
+                continue
+            rows.append(self._row(i, block))
+            if len(rows) == self.page_size:
+                self._print_page(rows, current)
+                rows = []
+                showing = interactive and self._ask_next_page()
+        if showing and rows:
+            self._print_page(rows, current)
+        pages = -(-stats.total // self.page_size)
+        if page > pages:
+            self.console.print(f"[yellow]共 {pages} 页，没有第 {page} 页[/yellow]")
+
+        self.console.print(f"\n筛选后共 {stats.total} 个文本块，每页 {self.page_size} 行\n")
+        self._display_stats(stats)
+        return stats
+
+    def _ask_next_page(self) -> bool:
+        """交互模式下询问是否继续翻页"""
+        answer = self.console.input("[dim]回车显示下一页，输入q停止翻页: [/dim]")
+        return answer.strip().lower() != 'q'
+
+    def _row(self, i: int, block: Dict[str, Any]) -> List[str]:
+        return [
+            str(i),
+            self._format_title(block["h1_title"]),
+            self._format_title(block["h2_title"]),
+            self._get_text_preview(block["text"]),
+            block["type"],
+            str(block["length"]),
+            str(block["page"])
+        ]
+
+    def _print_page(self, rows: List[List[str]], page: int) -> None:
+        """在控制台显示一页表格"""
         table = Table(
-            title=f"文本块分析结果 (共 {total_blocks} 块)",
+            title=f"文本块分析结果 (第 {page} 页)",
             show_lines=True,
             width=None
         )
-        
+
         # 添加列
         table.add_column("序号", justify="right", style="cyan", no_wrap=True)
         table.add_column("一级标题", style="magenta")
@@ -46,153 +134,175 @@ class BlockTableViewer:
         table.add_column("类型", justify="center", style="yellow")
         table.add_column("长度", justify="right", style="cyan")
         table.add_column("页码", justify="right", style="cyan")
-        
-        # 添加行
-        for i, block in enumerate(blocks, 1):
-            preview = self._get_text_preview(block["text"])
-            table.add_row(
-                str(i),
-                self._format_title(block["h1_title"]),
-                self._format_title(block["h2_title"]),
-                preview,
-                block["type"],
-                str(block["length"]),
-                str(block["page"])
-            )
-        
-        # 显示表格
+
+        for row in rows:
+            table.add_row(*row)
+
         self.console.print("\n")
         self.console.print(table)
-        self.console.print("\n")
-        
-        # 显示统计信息
-        self._display_stats(blocks)
-    
-    def _export_to_excel(self, blocks: List[Dict], total_blocks: int) -> None:
-        """导出数据到Excel文件"""
-        # 创建工作簿
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "文本块分析"
-        
-        # 设置表头
-        headers = ["序号", "一级标题", "二级标题", "文本预览", "类型", "长度", "页码"]
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # 添加数据
-        for i, block in enumerate(blocks, 1):
-            row = i + 1
-            ws.cell(row=row, column=1, value=i)
-            ws.cell(row=row, column=2, value=block["h1_title"])
-            ws.cell(row=row, column=3, value=block["h2_title"])
-            ws.cell(row=row, column=4, value=self._get_text_preview(block["text"]))
-            ws.cell(row=row, column=5, value=block["type"])
-            ws.cell(row=row, column=6, value=block["length"])
-            ws.cell(row=row, column=7, value=block["page"])
-        
-        # 设置列宽
-        column_widths = [8, 30, 30, 50, 15, 10, 8]
-        for i, width in enumerate(column_widths, 1):
-            ws.column_dimensions[get_column_letter(i)].width = width
-        
-        # 添加边框
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
+
+    def export_blocks(self, json_path: Path, output_path: Path, fmt: str = None, **filters) -> BlockStats:
+        """把（筛选后的）文本块流式导出为xlsx、csv或parquet，格式默认取输出文件的后缀"""
+        fmt = fmt or output_path.suffix.lstrip('.').lower()
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}，可选: {', '.join(EXPORT_FORMATS)}")
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        stats = BlockStats()
+
+        def counted() -> Iterator[Tuple[int, Dict[str, Any]]]:
+            for i, block in filter_blocks(iter_blocks(json_path), **filters):
+                stats.add(block)
+                yield i, block
+
+        getattr(self, f"_export_{fmt}")(counted(), stats, output_path)
+        self.console.print(f"\n[green]{fmt}文件已保存到: {output_path}（{stats.total} 行）[/green]\n")
+        return stats
+
+    def _export_xlsx(self, blocks: Iterable[Tuple[int, Dict[str, Any]]], stats: BlockStats, output_path: Path) -> None:
+        """以write-only模式导出Excel：逐行写入磁盘，所有单元格共用命名样式"""
+        wb = Workbook(write_only=True)
+        thin = Side(style='thin')
+        border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        header_style = NamedStyle(
+            name="block_header",
+            font=Font(bold=True, color="FFFFFF"),
+            fill=PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid"),
+            alignment=Alignment(horizontal="center", vertical="center"),
+            border=border
         )
-        for row in ws.iter_rows(min_row=1, max_row=len(blocks)+1, min_col=1, max_col=len(headers)):
-            for cell in row:
-                cell.border = thin_border
-                cell.alignment = Alignment(vertical="center")
-        
-        # 添加统计信息
-        stats_row = len(blocks) + 3
-        ws.cell(row=stats_row, column=1, value="统计信息").font = Font(bold=True)
-        ws.cell(row=stats_row+1, column=1, value="总块数")
-        ws.cell(row=stats_row+1, column=2, value=total_blocks)
-        ws.cell(row=stats_row+2, column=1, value="平均长度")
-        ws.cell(row=stats_row+2, column=2, value=sum(b["length"] for b in blocks)/len(blocks))
-        
-        # 按类型统计
-        type_stats = {}
-        for block in blocks:
-            block_type = block["type"]
-            if block_type not in type_stats:
-                type_stats[block_type] = 0
-            type_stats[block_type] += 1
-        
-        stats_row += 4
-        ws.cell(row=stats_row, column=1, value="类型统计").font = Font(bold=True)
-        for i, (type_name, count) in enumerate(type_stats.items()):
-            ws.cell(row=stats_row+1+i, column=1, value=type_name)
-            ws.cell(row=stats_row+1+i, column=2, value=count)
-        
-        # 保存文件
-        excel_path = Path(__file__).parent.parent / "data" / "table.xlsx"
-        wb.save(str(excel_path))
-        self.console.print(f"\n[green]Excel文件已保存到: {excel_path}[/green]\n")
-    
+        cell_style = NamedStyle(name="block_cell", alignment=Alignment(vertical="center"), border=border)
+        bold_style = NamedStyle(name="block_bold", font=Font(bold=True))
+        for style in (header_style, cell_style, bold_style):
+            wb.add_named_style(style)
+
+        ws = wb.create_sheet("文本块分析")
+        # write-only模式下列宽和冻结窗格必须在写入行之前设置
+        for i, width in enumerate(COLUMN_WIDTHS, 1):
+            ws.column_dimensions[get_column_letter(i)].width = width
+        ws.freeze_panes = "A2"
+
+        def styled(value: Any, style: str) -> WriteOnlyCell:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.style = style
+            return cell
+
+        ws.append([styled(header, "block_header") for header in HEADERS])
+        for i, block in blocks:
+            ws.append([styled(value, "block_cell") for value in (
+                i, block["h1_title"], block["h2_title"], self._get_text_preview(block["text"]),
+                block["type"], block["length"], block["page"]
+            )])
+
+        # 统计信息写在数据之后（write-only模式不能回到前面的行）
+        ws.append([])
+        ws.append([styled("统计信息", "block_bold")])
+        ws.append(["总块数", stats.total])
+        ws.append(["平均长度", stats.total_length / stats.total if stats.total else 0])
+        ws.append([])
+        ws.append([styled("类型统计", "block_bold")])
+        for type_name, type_stats in stats.types.items():
+            ws.append([type_name, type_stats["count"]])
+        wb.save(str(output_path))
+
+    def _export_csv(self, blocks: Iterable[Tuple[int, Dict[str, Any]]], stats: BlockStats, output_path: Path) -> None:
+        """导出CSV（带BOM，Excel可直接打开），保留完整文本"""
+        with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(HEADERS[:3] + ["文本"] + HEADERS[4:])
+            for i, block in blocks:
+                writer.writerow([i, block["h1_title"], block["h2_title"], block["text"],
+                                 block["type"], block["length"], block["page"]])
+
+    def _export_parquet(self, blocks: Iterable[Tuple[int, Dict[str, Any]]], stats: BlockStats, output_path: Path) -> None:
+        """按行组导出Parquet，保留完整文本，需要安装pyarrow"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("导出Parquet需要安装pyarrow: pip install pyarrow")
+
+        schema = pa.schema([
+            ("index", pa.int64()), ("h1_title", pa.string()), ("h2_title", pa.string()),
+            ("text", pa.string()), ("type", pa.string()), ("length", pa.int64()), ("page", pa.int64())
+        ])
+        columns = {name: [] for name in schema.names}
+
+        with pq.ParquetWriter(str(output_path), schema) as writer:
+            def flush() -> None:
+                writer.write_table(pa.table(columns, schema=schema))
+                for values in columns.values():
+                    values.clear()
+
+            for i, block in blocks:
+                columns["index"].append(i)
+                for name in ("h1_title", "h2_title", "text", "type", "length", "page"):
+                    columns[name].append(block[name])
+                if len(columns["index"]) >= PARQUET_BATCH_ROWS:
+                    flush()
+            if columns["index"] or not stats.total:
+                flush()
+
     def _format_title(self, title: str) -> str:
         """格式化标题文本"""
         if not title:
             return "---"
         return textwrap.fill(title, width=30)
-    
+
     def _get_text_preview(self, text: str, max_length: int = 50) -> str:
         """获取文本预览"""
         text = text.replace('\n', ' ').strip()
         if len(text) > max_length:
             return text[:max_length] + "..."
         return text
-    
-    def _display_stats(self, blocks: List[Dict[str, Any]]) -> None:
+
+    def _display_stats(self, stats: BlockStats) -> None:
         """显示统计信息"""
         stats_table = Table(title="文本块统计", show_header=True, header_style="bold magenta")
         stats_table.add_column("类型", style="cyan")
         stats_table.add_column("数量", justify="right", style="green")
         stats_table.add_column("总字数", justify="right", style="green")
         stats_table.add_column("平均长度", justify="right", style="green")
-        
-        type_stats = {}
-        for block in blocks:
-            block_type = block["type"]
-            if block_type not in type_stats:
-                type_stats[block_type] = {"count": 0, "total_length": 0}
-            
-            type_stats[block_type]["count"] += 1
-            type_stats[block_type]["total_length"] += block["length"]
-        
-        for block_type, stats in type_stats.items():
-            avg_length = stats["total_length"] // stats["count"]
+
+        for block_type, type_stats in stats.types.items():
+            avg_length = type_stats["total_length"] // type_stats["count"]
             stats_table.add_row(
                 block_type,
-                str(stats["count"]),
-                str(stats["total_length"]),
+                str(type_stats["count"]),
+                str(type_stats["total_length"]),
                 str(avg_length)
             )
-        
+
         self.console.print(stats_table)
         self.console.print("\n")
 
 def main():
     # 设置路径
     base_dir = Path(__file__).parent.parent
-    json_path = base_dir / "data" / "cut.json"
-    
+    parser = argparse.ArgumentParser(description="分页查看文本块并导出")
+    parser.add_argument("--input", type=Path, default=base_dir / "data" / "cut.json", help="切分结果")
+    parser.add_argument("--type", dest="types", action="append", help="只显示该类型的文本块，可重复指定")
+    parser.add_argument("--pages", type=parse_page_range, help="PDF页码范围，如 10-20、10- 或 10")
+    parser.add_argument("--title", help="一级或二级标题中包含的关键字")
+    parser.add_argument("--page", type=int, default=1, help="从表格的第几页开始显示")
+    parser.add_argument("--page-size", type=int, default=50, help="每页显示的行数")
+    parser.add_argument("--no-display", action="store_true", help="不在控制台显示，只导出")
+    parser.add_argument("--export", choices=EXPORT_FORMATS + ("none",), default="xlsx", help="导出格式")
+    parser.add_argument("--output", type=Path, help="导出文件，默认为 data/table.<格式>")
+    args = parser.parse_args()
+    json_path = args.input
+
     # 检查文件是否存在
     if not json_path.exists():
         print(f"错误: 找不到文件 {json_path}")
         sys.exit(1)
-    
-    # 创建查看器并显示
-    viewer = BlockTableViewer()
-    viewer.display_blocks(json_path)
+
+    filters = {"types": args.types, "page_range": args.pages, "title": args.title}
+    viewer = BlockTableViewer(page_size=max(1, args.page_size))
+    if not args.no_display:
+        viewer.display_blocks(json_path, page=max(1, args.page), **filters)
+    if args.export != "none":
+        output_path = args.output or base_dir / "data" / f"table.{args.export}"
+        viewer.export_blocks(json_path, output_path, args.export, **filters)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
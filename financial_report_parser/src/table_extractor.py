@@ -0,0 +1,155 @@
+import re
+import unicodedata
+from typing import Dict, Any, List, Optional, Tuple
+
+from .units import parse_number, normalize_unit, normalize_period
+
+# 用表格线识别表格；年报里的报表基本都有横线，竖线缺失时用文字对齐补齐
+TABLE_SETTINGS = {
+    "vertical_strategy": "lines",
+    "horizontal_strategy": "lines",
+    "intersection_tolerance": 5
+}
+FALLBACK_TABLE_SETTINGS = {
+    "vertical_strategy": "text",
+    "horizontal_strategy": "lines",
+    "intersection_tolerance": 5
+}
+CAPTION_HEIGHT = 40  # 在表格上方多高的范围内寻找"单位："说明
+
+_UNIT_RE = re.compile(r'单位\s*[：:]\s*((?:人民币)?\s*[千万亿百十]*元|%|％)')
+_PAREN_UNIT_RE = re.compile(r'[(（]\s*((?:人民币)?\s*[千万亿百十]*元|%|％|个百分点|百分点|bps?|BP|户|人|个|家|笔|倍)\s*[)）]')
+# 表头中表示期间的单元格，例如"2023年"、"2023年12月31日"、"本期"、"上年同期"、"期末余额"
+_PERIOD_CELL_RE = re.compile(r'^(?:(?:19|20)\d{2}\s*(?:年|-|/|\.|$)|本年|本期|本报告期|上年|上期|期末|期初|年末|年初)')
+# 增减、占比、附注之类的列不作为指标值
+_DERIVED_COLUMN_RE = re.compile(r'增减|变动|变化|同比|比上年|幅度|增长|占比|比重|结构|附注')
+_EMPTY_VALUES = {"", "-", "—", "--", "——", "/", "不适用", "N/A", "n/a"}
+_RATIO_SUFFIXES = ("率", "比", "比例", "比率")
+# 两侧不都是英文字母或数字的空格
+_LAYOUT_SPACE_RE = re.compile(r'(?<![A-Za-z0-9]) | (?![A-Za-z0-9])')
+
+def _cell_text(cell: Optional[str]) -> str:
+    """合并单元格内折行的文字，去掉中文之间排版用的空格，英文单词之间保留一个空格"""
+    if cell is None:
+        return ""
+    text = " ".join(unicodedata.normalize("NFKC", cell).split())
+    return _LAYOUT_SPACE_RE.sub('', text)
+
+def _is_value(text: str) -> bool:
+    return text not in _EMPTY_VALUES and parse_number(text) is not None and not _PERIOD_CELL_RE.match(text)
+
+def find_unit(text: str) -> str:
+    """从"单位：人民币百万元"之类的说明中找出单位"""
+    match = _UNIT_RE.search(unicodedata.normalize("NFKC", text or ""))
+    return normalize_unit(match.group(1)) if match else ""
+
+def _split_label_unit(label: str) -> Tuple[str, str]:
+    """把"不良贷款率(%)"拆分为指标名和单位"""
+    match = _PAREN_UNIT_RE.search(label)
+    if not match:
+        return label, ""
+    return (label[:match.start()] + label[match.end():]).strip(), normalize_unit(match.group(1))
+
+def _header_periods(rows: List[List[str]], year: Optional[int]) -> Tuple[int, Dict[int, Tuple[str, str]], Dict[int, str]]:
+    """识别表头：返回表头行数、{列号: (期间原文, 规范期间)} 和 {列号: 列单位}"""
+    periods = {}
+    units = {}
+    header_rows = 0
+    for row in rows[:3]:
+        cells = row[1:]
+        if any(_is_value(cell) for cell in cells):
+            break
+        header_rows += 1
+        last = ""
+        for col, cell in enumerate(cells, 1):
+            # 合并单元格在pdfplumber中表现为空值，沿用左侧的表头
+            cell = cell or last
+            last = cell
+            if not cell:
+                continue
+            _, unit = _split_label_unit(cell)
+            if unit:
+                units[col] = unit
+            if _DERIVED_COLUMN_RE.search(cell):
+                periods[col] = None
+            elif _PERIOD_CELL_RE.match(cell) and periods.get(col, "") is not None:
+                period = normalize_period(cell, default_year=year)
+                periods[col] = (cell, period)
+    return header_rows, {col: p for col, p in periods.items() if p is not None}, units
+
+def parse_statement_table(rows: List[List[Optional[str]]], unit: str = "", year: Optional[int] = None,
+                          page: Optional[int] = None) -> List[Dict[str, Any]]:
+    """把一张报表解析为指标记录；不是报表（没有期间列或数值行）时返回空列表
+
+    每条记录为 {"type", "name", "value", "unit", "time", "period", "page"}，
+    与LLM提取的结构化数据格式一致，可以直接写入structured_data表。
+    """
+    rows = [[_cell_text(cell) for cell in row] for row in rows if row]
+    if len(rows) < 2 or max(len(row) for row in rows) < 2:
+        return []
+
+    header_rows, periods, column_units = _header_periods(rows, year)
+    if not periods:
+        return []
+
+    items = []
+    pending_label = ""
+    for row in rows[header_rows:]:
+        label = row[0]
+        values = {col: row[col] for col in periods if col < len(row) and _is_value(row[col])}
+        if not values:
+            # 只有名称没有数值：可能是"资产："这样的分组行，也可能是折行的名称
+            pending_label = label
+            continue
+        if not label:
+            label = pending_label
+        pending_label = ""
+        label = re.sub(r'^(?:其中|加|减)[：:]', '', label)
+        name, label_unit = _split_label_unit(label)
+        if not name:
+            continue
+        for col, text in values.items():
+            row_unit = label_unit or column_units.get(col) or ("%" if name.endswith(_RATIO_SUFFIXES) else unit)
+            time_text, period = periods[col]
+            items.append({
+                "type": "table",
+                "name": name,
+                "value": parse_number(text),
+                "unit": row_unit,
+                "time": time_text,
+                "period": period,
+                "page": page
+            })
+
+    # 有数值的行太少时多半是排版用的表格，不当作报表
+    if len({item["name"] for item in items}) < 2:
+        return []
+    return items
+
+def extract_page_tables(page, year: Optional[int] = None) -> Tuple[List[Dict[str, Any]], str]:
+    """识别页面上的报表，返回 (报表列表, 去掉报表区域后的正文)
+
+    报表为 {"bbox", "unit", "rows"}；不像报表的表格（例如人员名单）保留在正文中。
+    """
+    tables = page.find_tables(TABLE_SETTINGS) or page.find_tables(FALLBACK_TABLE_SETTINGS)
+    statements = []
+    for table in tables:
+        rows = table.extract()
+        caption_top = max(0, table.bbox[1] - CAPTION_HEIGHT)
+        caption = page.crop((0, caption_top, page.width, table.bbox[1])).extract_text() or ""
+        unit = find_unit(caption) or find_unit(" ".join(cell or "" for cell in (rows[0] if rows else [])))
+        if parse_statement_table(rows, unit, year, page.page_number):
+            statements.append({"bbox": table.bbox, "unit": unit, "rows": rows})
+
+    if not statements:
+        return [], page.extract_text() or ""
+
+    def outside_tables(obj) -> bool:
+        # 按字符中心点判断是否落在报表内
+        x = (obj.get("x0", 0) + obj.get("x1", 0)) / 2
+        y = (obj.get("top", 0) + obj.get("bottom", 0)) / 2
+        return not any(x0 <= x <= x1 and top <= y <= bottom for x0, top, x1, bottom in
+                       (statement["bbox"] for statement in statements))
+
+    text = page.filter(outside_tables).extract_text() or ""
+    return statements, text
@@ -0,0 +1,85 @@
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import config.settings as settings
+from src.batch import run_report
+from src.llm_processor import LLMProcessor
+
+PAGES = [
+    ["Revenue in 2023 was 120 million yuan.", "Net profit in 2023 was 15 million yuan."],
+    ["Total assets at the end of 2023 were 900 million yuan.", "The bank opened 12 new branches."]
+]
+
+def write_pdf(path: Path, pages) -> None:
+    """生成每页若干行Helvetica文本的最小PDF"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        stream = "BT /F1 12 Tf 72 720 Td 16 TL " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    output = "%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    path.write_bytes(output.encode("latin-1"))
+
+def test_run_report_with_stubbed_llm(tmp_path, monkeypatch):
+    """整份报告走完切分、LLM提取和入库，每个文本块的提示词都是它自己的正文"""
+    pdf_path = tmp_path / "测试银行_2023年年度报告.pdf"
+    write_pdf(pdf_path, PAGES)
+    db_path = tmp_path / "data.db"
+    for name, value in {"PAGE_CACHE_ENABLED": False, "LLM_CACHE_ENABLED": False, "TABLE_EXTRACTION": False,
+                        "CHUNK_MAX_TOKENS": 16, "CHUNK_OVERLAP_TOKENS": 0}.items():
+        monkeypatch.setattr(settings, name, value)
+
+    prompts = []
+
+    def fake_call_llm(self, messages, max_retries=None, use_cache=None):
+        return "摘要"
+
+    def fake_call_llm_json(self, messages, max_retries=None, use_cache=None, on_item=None):
+        text = messages[-1]["content"]
+        prompts.append(text)
+        data = [{"indicator_name": line.split(" in 2023")[0], "value": line.split(" was ")[1].split()[0],
+                 "unit": "百万元", "time": "2023年"}
+                for page in PAGES for line in page if line in text and " was " in line]
+        return json.dumps({"type": "财务", "data": data})
+
+    monkeypatch.setattr(LLMProcessor, "_call_llm", fake_call_llm)
+    monkeypatch.setattr(LLMProcessor, "_call_llm_json", fake_call_llm_json)
+
+    stats = run_report({"pdf_path": pdf_path, "company": "测试银行", "year": 2023, "db_path": db_path},
+                       tmp_path / "work")
+
+    assert stats["status"] == "ok", stats["error"]
+    assert stats["pages"] == 2
+    assert stats["blocks"] == len(prompts) > 1
+    # 模板不会被第一个文本块的内容覆盖
+    assert len(set(prompts)) == len(prompts)
+    assert all("{text}" not in prompt for prompt in prompts)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        names = {row[0] for row in conn.execute("SELECT indicator_name FROM financial_data")}
+    finally:
+        conn.close()
+    assert names == {"Revenue", "Net profit"}
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
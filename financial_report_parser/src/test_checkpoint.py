@@ -0,0 +1,48 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.checkpoint import CheckpointLog, atomic_write_json
+
+def test_replay_in_append_order(tmp_path):
+    log = CheckpointLog(tmp_path / "progress.jsonl", fsync=False)
+    log.append({"block_id": 0})
+    log.append_many([{"block_id": 1}, {"block_id": 0, "retry": True}])
+    log.close()
+    assert CheckpointLog(tmp_path / "progress.jsonl").load() == [
+        {"block_id": 0}, {"block_id": 1}, {"block_id": 0, "retry": True}
+    ]
+
+def test_torn_last_line_is_skipped_and_not_glued(tmp_path):
+    path = tmp_path / "progress.jsonl"
+    path.write_text('{"block_id": 0}\n{"block_id": 1, "ana', encoding="utf-8")
+    log = CheckpointLog(path, fsync=False)
+    assert log.load() == [{"block_id": 0}]
+    # 崩溃后继续追加的记录另起一行
+    log.append({"block_id": 2})
+    log.close()
+    assert log.load() == [{"block_id": 0}, {"block_id": 2}]
+
+def test_clear_compacts_after_snapshot(tmp_path):
+    log = CheckpointLog(tmp_path / "progress.jsonl", fsync=False)
+    log.append({"block_id": 0})
+    atomic_write_json(tmp_path / "read.json", {"0": {"block_id": 0}})
+    log.clear()
+    assert not log.path.exists() and log.load() == []
+    log.append({"block_id": 1})
+    log.close()
+    assert log.load() == [{"block_id": 1}]
+    assert json.loads((tmp_path / "read.json").read_text(encoding="utf-8")) == {"0": {"block_id": 0}}
+
+def test_atomic_write_leaves_no_temp_file(tmp_path):
+    path = tmp_path / "out" / "prompts.json"
+    atomic_write_json(path, {"名称": "值"})
+    atomic_write_json(path, {"名称": "新值"})
+    assert json.loads(path.read_text(encoding="utf-8")) == {"名称": "新值"}
+    assert [p.name for p in path.parent.iterdir()] == ["prompts.json"]
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,60 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.chunker import TokenChunker, chunk_token_budget
+from src.utils import estimate_tokens
+
+SENTENCE = "本行营业收入同比增长百分之八，净利润保持稳定增长。"  # 25个中文字符，约25个token
+
+def test_estimate_tokens_counts_cjk_per_char():
+    assert estimate_tokens("营业收入") == 4
+    assert estimate_tokens("revenue") == 2
+    assert estimate_tokens("收入：100") == 4
+
+def test_chunk_token_budget():
+    assert chunk_token_budget(8192, 1000, 1024, margin=0.1) == int((8192 - 2024) * 0.9)
+    assert chunk_token_budget(1000, 900, 500) == 256
+
+def test_chunks_fill_budget_without_splitting_paragraphs():
+    chunker = TokenChunker(max_tokens=60)
+    text = "\n".join([SENTENCE] * 5)
+    chunks = list(chunker.chunk_text(text))
+    assert chunks == ["\n".join([SENTENCE] * 2)] * 2 + [SENTENCE]
+    assert all(estimate_tokens(chunk) <= 60 for chunk in chunks)
+
+def test_long_cjk_text_is_cut_under_budget():
+    chunker = TokenChunker(max_tokens=40)
+    text = "资产" * 100  # 没有标点的200个中文字符
+    chunks = list(chunker.chunk_text(text))
+    assert "".join(chunks) == text
+    assert all(estimate_tokens(chunk) <= 40 for chunk in chunks)
+
+def test_wrapped_paragraph_stays_together_across_pages():
+    chunker = TokenChunker(max_tokens=200)
+    pages = [{"text": "报告期内，本行持续推进"}, {"text": "数字化转型。\n第二节 公司简介"}]
+    chunks = list(chunker.chunk_pages(pages))
+    assert chunks == ["报告期内，本行持续推进\n数字化转型。\n第二节 公司简介"]
+
+def test_new_section_starts_new_chunk_when_half_full():
+    chunker = TokenChunker(max_tokens=80)
+    text = "\n".join([SENTENCE, SENTENCE, "第二节 公司简介", SENTENCE])
+    chunks = list(chunker.chunk_text(text))
+    assert chunks[0] == f"{SENTENCE}\n{SENTENCE}"
+    assert chunks[1].startswith("第二节 公司简介")
+
+def test_overlap_repeats_tail_sentences():
+    chunker = TokenChunker(max_tokens=120, overlap_tokens=30)
+    paragraph = "第一句话内容较短。" + SENTENCE
+    chunks = list(chunker.chunk_text("\n".join([paragraph] * 4)))
+    assert chunks[0] == "\n".join([paragraph] * 3)
+    # 新块以上一块末尾不超过overlap_tokens的句子开头
+    assert chunks[1] == f"{SENTENCE}\n{paragraph}"
+    assert all(estimate_tokens(chunk) <= 120 for chunk in chunks)
+    # 重叠部分不超过max_tokens的四分之一
+    assert TokenChunker(max_tokens=60, overlap_tokens=30).overlap_tokens == 15
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
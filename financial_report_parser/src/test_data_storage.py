@@ -0,0 +1,100 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import src.data_storage as data_storage
+from src.data_storage import StorageWriter, DataStorage, migrate, init_db, SCHEMA_VERSION, STRUCTURED_INSERT_SQL
+
+def columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def test_migrate_from_user_version_0_backfills_rows(tmp_path):
+    """引入版本号之前的数据库（user_version=0）升级后，已有数据补齐规范化的列"""
+    db_path = tmp_path / "data.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("""CREATE TABLE financial_data (id INTEGER PRIMARY KEY AUTOINCREMENT, year INTEGER NOT NULL,
+                    indicator_name TEXT NOT NULL, value REAL NOT NULL, unit TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""")
+    conn.execute("INSERT INTO financial_data (year, indicator_name, value, unit) VALUES (2023, '净利润（亿元）', 1.5, '亿元')")
+    conn.commit()
+
+    assert migrate(conn) == 0
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    assert {"report_id", "period", "indicator_key", "canonical_value"} <= columns(conn, "financial_data")
+    assert "report_id" in columns(conn, "unstructured_data")
+    row = conn.execute("SELECT period, indicator_key, canonical_value, canonical_unit FROM financial_data").fetchone()
+    assert row == ("2023", "净利润", 1.5e8, "元")
+    # 已是最新版本时不再执行迁移
+    assert migrate(conn) == SCHEMA_VERSION
+    conn.close()
+
+def test_migrate_rolls_back_failed_step(tmp_path, monkeypatch):
+    def broken(conn):
+        conn.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("迁移失败")
+
+    monkeypatch.setattr(data_storage, "MIGRATIONS", data_storage.MIGRATIONS + [broken])
+    monkeypatch.setattr(data_storage, "SCHEMA_VERSION", SCHEMA_VERSION + 1)
+    conn = sqlite3.connect(tmp_path / "data.db")
+    with pytest.raises(RuntimeError):
+        migrate(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+    assert "half_done" not in {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    conn.close()
+
+def test_newer_database_is_rejected(tmp_path):
+    conn = sqlite3.connect(tmp_path / "data.db")
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+    with pytest.raises(RuntimeError):
+        migrate(conn)
+    conn.close()
+
+def test_writer_flush_commits_queued_rows(tmp_path):
+    db_path = tmp_path / "data.db"
+    init_db(db_path)
+    writer = StorageWriter(db_path, batch_size=1000, flush_interval=60)
+    rows = [("financial", "营业收入", 100.0, "亿元", "2023年", 0, None, "2023", "营业收入", 1e10, "元")]
+    writer.write(STRUCTURED_INSERT_SQL, rows * 3)
+    writer.flush()
+    assert writer.rows_written == 3
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM structured_data").fetchone()[0] == 3
+    conn.close()
+    writer.close()
+    # 关闭后flush直接返回，不会一直等待已退出的写入线程
+    writer.flush()
+
+def test_writer_propagates_commit_errors(tmp_path):
+    db_path = tmp_path / "data.db"
+    init_db(db_path)
+    writer = StorageWriter(db_path, flush_interval=60)
+    writer.write("INSERT INTO missing_table VALUES (?)", [(1,)])
+    with pytest.raises(sqlite3.OperationalError):
+        writer.flush()
+    # 错误只抛出一次，之后的写入照常进行
+    writer.write(STRUCTURED_INSERT_SQL, [("t", "n", 1.0, "", "", 0, None, "", "n", 1.0, "")])
+    writer.flush()
+
+    writer.write("INSERT INTO missing_table VALUES (?)", [(1,)])
+    with pytest.raises(sqlite3.OperationalError):
+        writer.close()
+
+def test_save_to_db_replaces_rows_of_same_report(tmp_path):
+    storage = DataStorage(tmp_path / "data.db")
+    report_id = storage.register_report("测试银行", 2023)
+    assert storage.register_report("测试银行", 2023) == report_id
+    data = {"营业收入": [{"indicator_name": "营业收入", "value": "1,200", "unit": "百万元", "time": "2023年"}],
+            "员工人数": 35000, "说明": "文字"}
+    storage.save_to_db(data, 2023, report_id)
+    storage.save_to_db(data, 2023, report_id)
+    conn = sqlite3.connect(tmp_path / "data.db")
+    rows = conn.execute("SELECT indicator_name, canonical_value, period FROM financial_data ORDER BY id").fetchall()
+    conn.close()
+    assert rows == [("营业收入", 1.2e9, "2023"), ("员工人数", 35000.0, "2023")]
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
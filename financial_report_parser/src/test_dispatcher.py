@@ -0,0 +1,69 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.dispatcher import ConcurrentDispatcher, RateLimiter
+
+def test_results_keep_submission_order():
+    dispatcher = ConcurrentDispatcher(max_workers=4)
+    # 先提交的任务最慢，结果仍按提交顺序产出
+    outcomes = list(dispatcher.map(lambda n: time.sleep(0.01 * (5 - n)) or n * n, range(5)))
+    assert [(item, result) for item, result, _ in outcomes] == [(n, n * n) for n in range(5)]
+
+def test_errors_are_returned_per_item():
+    def work(n):
+        if n == 1:
+            raise ValueError("bad")
+        return n
+
+    outcomes = list(ConcurrentDispatcher(max_workers=2).map(work, range(3)))
+    assert [result for _, result, _ in outcomes] == [0, None, 2]
+    assert isinstance(outcomes[1][2], ValueError)
+
+def test_in_flight_is_bounded():
+    lock = threading.Lock()
+    running = peak = 0
+
+    def work(n):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.01)
+        with lock:
+            running -= 1
+        return n
+
+    dispatcher = ConcurrentDispatcher(max_workers=8, max_in_flight=3)
+    assert dispatcher.max_in_flight == 8  # 在途上限不小于线程数
+    dispatcher = ConcurrentDispatcher(max_workers=2, max_in_flight=3)
+    submitted = []
+    outcomes = dispatcher.map(work, (submitted.append(n) or n for n in range(10)))
+    first = next(outcomes)
+    # 取走第一个结果前最多提交max_in_flight个任务，之后每取一个补一个
+    assert first[0] == 0 and len(submitted) == 3
+    assert [item for item, _, _ in outcomes] == list(range(1, 10))
+    assert peak <= 2
+
+def test_rate_limiter_rpm_and_tpm_windows():
+    limiter = RateLimiter(rpm=2, window=0.1)
+    assert limiter.acquire() == 0.0
+    assert limiter.acquire() == 0.0
+    # 第三个请求要等最早的请求移出窗口
+    assert limiter.acquire() > 0
+
+    limiter = RateLimiter(tpm=100, window=0.1)
+    assert limiter.acquire(80) == 0.0
+    assert limiter.acquire(30) > 0
+    assert limiter.acquire(20) == 0.0
+
+def test_rate_limiter_unlimited_never_waits():
+    limiter = RateLimiter()
+    assert all(limiter.acquire(10 ** 6) == 0.0 for _ in range(100))
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
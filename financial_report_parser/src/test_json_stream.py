@@ -0,0 +1,49 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.json_stream import IncrementalJSONParser, repair_json
+
+def _structured(text: str):
+    return json.loads(repair_json(text))["analysis"]["structured_data"]
+
+def test_unclosed_record_is_dropped():
+    """截断在记录的字段之间：丢弃整条记录，只保留已闭合的"""
+    text = ('{"analysis":{"structured_data":[{"name":"营业收入","value":100},'
+            '{"name":"净利润","value":5,"period":"2023"')
+    assert _structured(text) == [{"name": "营业收入", "value": 100}]
+
+def test_unclosed_nested_value_is_dropped():
+    """截断在记录的嵌套对象中：不会补齐为 "period":{}"""
+    text = ('{"analysis":{"structured_data":[{"name":"营业收入","value":100},'
+            '{"name":"净利润","value":5,"period":{"year":2023')
+    assert _structured(text) == [{"name": "营业收入", "value": 100}]
+
+def test_first_record_unclosed():
+    """第一条记录就被截断：数组为空"""
+    text = '{"analysis":{"structured_data":[{"name":"营业收入","value":1'
+    assert _structured(text) == []
+
+def test_unwatched_values_still_repaired():
+    """监视数组之外的值仍按最后一个完整值截断"""
+    assert json.loads(repair_json('{"summary":"收入增长","meta":{"model":"k","tokens":1')) == \
+        {"summary": "收入增长", "meta": {"model": "k"}}
+
+def test_streamed_repair_matches_closed_records():
+    """逐字输入时，修复结果只包含已经闭合并返回过的记录"""
+    text = ('{"analysis":{"structured_data":[{"name":"营业收入","value":100},'
+            '{"name":"净利润","value":5,"period":"2023"')
+    parser = IncrementalJSONParser()
+    emitted = []
+    for ch in text:
+        emitted.extend(item for _, item in parser.feed(ch))
+    assert emitted == [{"name": "营业收入", "value": 100}]
+    assert json.loads(parser.repair())["analysis"]["structured_data"] == emitted
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"{name}: 通过")
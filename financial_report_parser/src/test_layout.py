@@ -0,0 +1,76 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.layout import HeadingDetector, SectionTreeBuilder, page_lines, is_bold
+
+def line(text, page, size=10.0, bold=False, top=100.0):
+    return {"text": text, "size": size, "bold": bold, "top": top, "bottom": top + size,
+            "x0": 72.0, "x1": 72.0 + 10 * len(text), "page": page}
+
+CHAPTERS = ["重要提示", "公司简介", "经营情况", "财务报告"]
+
+def document():
+    lines = []
+    for page, chapter in enumerate(CHAPTERS, 1):
+        lines.append(line("某某银行股份有限公司 2023年年度报告", page, size=9.0, top=20))
+        lines.append(line(f"第{'一二三四'[page - 1]}节 {chapter}", page, size=16.0, bold=True, top=60))
+        lines.append(line(f"（一）{chapter}概述", page, size=12.0, bold=True, top=90))
+        for i in range(6):
+            lines.append(line(f"本行{chapter}第{i + 1}段，持续推进各项业务稳健发展，资产质量保持稳定。", page, top=120 + 15 * i))
+        lines.append(line(f"- {page} -", page, size=9.0, top=780))
+    return lines
+
+def test_is_bold():
+    assert is_bold("ABCDEF+SimHei")
+    assert is_bold("Helvetica-Bold")
+    assert not is_bold("ABCDEF+SimSun")
+    assert not is_bold("Helvetica-Height")
+
+def test_page_lines_groups_words_and_skips_tables():
+    record = {"page": 3, "words": [
+        ["营业", 72, 100, 96, 110, 10.0, "SimSun"], ["收入", 98, 101, 122, 111, 10.0, "SimSun"],
+        ["第三节", 72, 130, 120, 146, 16.0, "SimHei"],
+        ["100", 300, 200, 320, 210, 10.0, "SimSun"],
+    ], "tables": [{"bbox": [280, 190, 400, 220]}]}
+    lines = page_lines(record)
+    assert [(item["text"], item["size"], item["bold"], item["page"]) for item in lines] == [
+        ("营业 收入", 10.0, False, 3), ("第三节", 16.0, True, 3)
+    ]
+    assert (lines[0]["x0"], lines[0]["x1"], lines[0]["top"], lines[0]["bottom"]) == (72, 122, 100, 111)
+
+def test_learns_heading_levels_and_running_lines():
+    detector = HeadingDetector()
+    lines = document()
+    detector.learn(lines)
+    assert detector.learned and detector.body_size == 10.0
+    assert [detector.level(item) for item in lines[:4]] == [0, 1, 2, 0]
+    # 页眉和页码（数字不同）都识别为页眉页脚
+    assert detector.is_running(lines[0]) and detector.is_running(lines[-1])
+    # 标题样式的长句不是标题
+    assert detector.level(line("第五节 这是一个以句号结尾的、字号较大的句子。", 5, size=16.0, bold=True)) == 0
+
+def test_plain_text_learns_nothing():
+    detector = HeadingDetector()
+    detector.learn([line("正文内容", page) for page in range(1, 3)])
+    assert not detector.learned
+
+def test_section_tree_ranges():
+    builder = SectionTreeBuilder()
+    first = builder.add("第一节", 1, 1, 0)
+    builder.add("一、", 2, 1, 0)
+    builder.extend_title(first, "重要提示")
+    builder.add("二、", 2, 2, 3)
+    builder.add("第二节", 1, 3, 5)
+    roots = builder.finish(8)
+    assert [(node["title"], node["start_block"], node["end_block"]) for node in roots] == [
+        ("第一节 重要提示", 0, 5), ("第二节", 5, 8)
+    ]
+    assert [(node["title"], node["start_block"], node["end_block"]) for node in roots[0]["children"]] == [
+        ("一、", 0, 3), ("二、", 3, 5)
+    ]
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,79 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.read import TextAnalyzer
+
+def block(text, block_type="financial"):
+    return {"text": text, "h1_title": "第三节 管理层讨论与分析", "h2_title": "一、经营情况", "type": block_type, "page": 1}
+
+@pytest.fixture
+def analyzer(monkeypatch, tmp_path):
+    # 日志文件写在当前目录，分析结果数据库不需要
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(TextAnalyzer, "_init_db", lambda self, db_path: None)
+    analyzer = TextAnalyzer("key", "http://localhost", use_cache=False)
+    yield analyzer
+    analyzer.llm.close()
+
+def progress(analyzer, blocks):
+    """按当前模板生成已完成的块记录和结果"""
+    entries, results = [], {}
+    for i, item in enumerate(blocks):
+        fingerprint = analyzer._fingerprint(item)
+        entries.append({"block_id": i, "type": item["type"], "fingerprint": fingerprint,
+                        "template": analyzer._extraction_template(item["type"])["id"]})
+        results[i] = {"block_id": i, "page": item["page"], "text": item["text"], "fingerprint": fingerprint,
+                      "analysis": {"n": i}}
+    return {"blocks": entries, "templates": {}}, results
+
+def test_results_follow_blocks_after_renumbering(analyzer):
+    old = [block("营业收入100亿元。"), block("净利润10亿元。")]
+    prompts, results = progress(analyzer, old)
+    # 前面插入了一个新块，另一个块的正文有变化
+    new = [block("新增的段落。"), block("营业收入100亿元。"), block("净利润12亿元。")]
+    assert analyzer._reconcile_progress(new, prompts, results)
+    assert [entry["block_id"] for entry in prompts["blocks"]] == [1]
+    assert results == {1: dict(results[1], block_id=1)} and results[1]["analysis"] == {"n": 0}
+
+def test_unchanged_blocks_are_not_rewritten(analyzer):
+    blocks = [block("营业收入100亿元。")]
+    prompts, results = progress(analyzer, blocks)
+    assert not analyzer._reconcile_progress(blocks, prompts, results)
+
+def test_template_change_invalidates_results(analyzer):
+    blocks = [block("营业收入100亿元。"), block("本行推进绿色金融。", "business")]
+    prompts, results = progress(analyzer, blocks)
+    template = analyzer._extraction_template("financial")
+    analyzer._templates["financial"] = dict(template, id="extract.financial@changed")
+    analyzer._reconcile_progress(blocks, prompts, results)
+    assert [entry["block_id"] for entry in prompts["blocks"]] == [1]
+
+def test_stored_template_ids_are_kept(analyzer):
+    entry = {"block_id": 0, "type": "financial", "template": "extract.financial@old"}
+    assert analyzer._normalize_entry(dict(entry)) == entry
+    legacy = {"block_id": 0, "type": "financial", "prompts": {"extract": {"messages": []}}}
+    assert analyzer._normalize_entry(legacy)["template"] == analyzer._extraction_template("financial")["id"]
+
+def test_legacy_entries_match_by_prompt_text(analyzer):
+    blocks = [block("营业收入100亿元。"), block("净利润10亿元。")]
+    # 引入指纹之前的记录：没有fingerprint，结果中没有正文，正文只在当时的提示词里
+    prompts = {"blocks": [
+        {"block_id": i, "type": item["type"],
+         "prompts": {"extract": {"messages": [{"role": "user", "content": f"请分析：{item['text']}"}]}}}
+        for i, item in enumerate(blocks)
+    ]}
+    results = {i: {"block_id": i, "h1_title": item["h1_title"], "h2_title": item["h2_title"], "type": item["type"]}
+               for i, item in enumerate(blocks)}
+    changed = [blocks[0], block("净利润12亿元。")]
+    analyzer._reconcile_progress(changed, prompts, results)
+    assert [entry["block_id"] for entry in prompts["blocks"]] == [0]
+    assert "prompts" not in prompts["blocks"][0]
+    assert prompts["blocks"][0]["fingerprint"] == analyzer._fingerprint(blocks[0])
+    assert list(results) == [0]
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,91 @@
+import sys
+import time
+from email.utils import formatdate
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.resilience import (RetryPolicy, CircuitBreaker, CircuitOpenError, PauseGate,
+                            parse_retry_after, error_from_response)
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = "detail"
+
+def test_parse_retry_after_seconds_and_date():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    # HTTP日期换算为距现在的秒数
+    assert 25 <= parse_retry_after(formatdate(time.time() + 30, usegmt=True)) <= 30
+
+def test_error_from_response_classification():
+    limited = error_from_response(FakeResponse(429, {"Retry-After": "2"}))
+    assert limited.retryable and limited.rate_limited and limited.retry_after == 2.0
+    assert error_from_response(FakeResponse(401)).fatal
+    assert error_from_response(FakeResponse(503)).retryable
+    rejected = error_from_response(FakeResponse(400))
+    assert not rejected.retryable and not rejected.fatal
+
+def test_retry_policy_backoff_bounds_and_retry_after():
+    policy = RetryPolicy(max_attempts=0, base_delay=1.0, max_delay=4.0)
+    assert policy.max_attempts == 1
+    for attempt in range(6):
+        assert 0 <= policy.delay(attempt) <= min(4.0, 2 ** attempt)
+    # Retry-After是等待时间的下限
+    assert policy.delay(0, retry_after=10.0) == 10.0
+
+def test_circuit_breaker_opens_probes_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05, max_wait=1.0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # 冷却结束后放行一个探测请求
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+def test_circuit_breaker_failed_probe_doubles_timeout():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05, max_reset_timeout=0.08, max_wait=1.0)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.reset_timeout == 0.08
+
+def test_circuit_breaker_gives_up_after_max_wait():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, max_wait=0.1)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError) as info:
+        breaker.before_call()
+    assert info.value.fatal
+
+def test_circuit_breaker_release_frees_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0, max_wait=0.2)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.release()
+    # 探测名额释放后下一个请求可以立即发送
+    start = time.monotonic()
+    breaker.before_call()
+    assert time.monotonic() - start < 0.1
+
+def test_pause_gate_blocks_until_pause_ends():
+    gate = PauseGate()
+    assert gate.wait() == 0.0
+    gate.pause_for(0.05)
+    gate.pause_for(0.01)  # 较短的暂停不会缩短已有的暂停
+    start = time.monotonic()
+    assert gate.wait() > 0
+    assert time.monotonic() - start >= 0.04
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
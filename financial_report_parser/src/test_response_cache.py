@@ -0,0 +1,64 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.response_cache import ResponseCache
+
+MESSAGES = [{"role": "system", "content": "你是分析师"}, {"role": "user", "content": "营业收入  100亿元\n"}]
+
+def test_make_key_normalizes_whitespace():
+    key = ResponseCache.make_key(MESSAGES, "moonshot-v1-8k", 0.1)
+    spaced = [{"role": "system", "content": " 你是分析师 "}, {"role": "user", "content": "营业收入 100亿元"}]
+    assert ResponseCache.make_key(spaced, "moonshot-v1-8k", 0.1) == key
+    assert ResponseCache.make_key(MESSAGES, "moonshot-v1-8k", 0.10000001) == key
+
+def test_make_key_distinguishes_model_temperature_and_content():
+    key = ResponseCache.make_key(MESSAGES, "moonshot-v1-8k", 0.1)
+    assert ResponseCache.make_key(MESSAGES, "moonshot-v1-32k", 0.1) != key
+    assert ResponseCache.make_key(MESSAGES, "moonshot-v1-8k", 0.2) != key
+    changed = MESSAGES[:1] + [{"role": "user", "content": "营业收入 101亿元"}]
+    assert ResponseCache.make_key(changed, "moonshot-v1-8k", 0.1) != key
+
+def test_get_put_and_stats(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.db")
+    try:
+        assert cache.get("a") is None
+        cache.put("a", "响应")
+        assert cache.get("a") == "响应"
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+        assert stats["size_bytes"] == len("响应".encode("utf-8"))
+    finally:
+        cache.close()
+
+def test_expired_entries_miss_and_are_evicted(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.db", max_age_days=1)
+    try:
+        cache.put("old", "x")
+        cache._conn.execute("UPDATE responses SET created_at = ?", (time.time() - 2 * 86400,))
+        cache.put("new", "y")
+        assert cache.get("old") is None
+        assert cache.evict() == 1
+        assert cache.get("new") == "y"
+    finally:
+        cache.close()
+
+def test_size_eviction_removes_least_recently_accessed(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.db", max_bytes=25, max_age_days=0)
+    try:
+        for i, key in enumerate(["a", "b", "c"]):
+            cache.put(key, "0123456789")
+            cache._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (i, key))
+        cache._conn.execute("UPDATE responses SET accessed_at = 10 WHERE key = 'a'")
+        # 30字节超出上限5字节，只需删除最久未访问的b
+        assert cache.evict() == 1
+        assert cache.get("b") is None
+        assert cache.get("a") == cache.get("c") == "0123456789"
+    finally:
+        cache.close()
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
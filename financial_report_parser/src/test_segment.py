@@ -0,0 +1,73 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.segment import ParagraphSegmenter, split_sentences, split_text, _join
+
+def positioned(text, page, top, x0=72.0, x1=520.0, size=10.0):
+    return {"text": text, "page": page, "top": top, "bottom": top + size, "x0": x0, "x1": x1, "size": size}
+
+def test_split_sentences_keeps_closing_quotes():
+    assert split_sentences("本行荣获“最佳银行。”奖项！继续努力") == ["本行荣获“最佳银行。”", "奖项！", "继续努力"]
+
+def test_join_spaces_only_between_western_words():
+    assert _join("营业", "收入") == "营业收入"
+    assert _join("net", "profit") == "net profit"
+    assert _join("增长8.5", "%") == "增长8.5 %"
+    assert _join("", "收入") == "收入"
+
+def test_split_text_balances_pieces():
+    text = "资产质量稳定。" * 10  # 70个字符
+    pieces = split_text(text, 40)
+    assert "".join(pieces) == text
+    assert [len(piece) for piece in pieces] == [35, 35]
+    # 没有标点时按字数切开
+    assert split_text("资" * 50, 20) == ["资" * 20, "资" * 20, "资" * 10]
+
+def test_wrapped_lines_merge_without_layout():
+    segmenter = ParagraphSegmenter(min_chars=5, max_chars=100)
+    blocks = []
+    for page, text in [(1, "本行持续推进"), (1, "数字化转型。"), (2, "风险管理体系不断完善。")]:
+        blocks += segmenter.feed({"text": text, "page": page})
+    blocks += segmenter.flush()
+    assert blocks == [("本行持续推进数字化转型。", 1), ("风险管理体系不断完善。", 2)]
+    assert segmenter.paragraphs == 2
+
+def test_layout_breaks_on_indent_and_gap():
+    segmenter = ParagraphSegmenter(min_chars=1, max_chars=100)
+    segmenter.begin_page(1, [positioned("x", 1, 0)] * 3)
+    lines = [
+        positioned("第一段第一行", 1, 100, x0=92),
+        positioned("第一段第二行没有句号", 1, 112),
+        positioned("第二段首行缩进", 1, 124, x0=92),
+        positioned("第二段结尾。", 1, 136, x1=200),
+        positioned("间距较大的第三段", 1, 170),
+    ]
+    blocks = []
+    for line in lines:
+        blocks += segmenter.feed(line)
+    blocks += segmenter.flush()
+    assert [text for text, _ in blocks] == ["第一段第一行第一段第二行没有句号", "第二段首行缩进第二段结尾。", "间距较大的第三段"]
+
+def test_sentence_continues_across_pages():
+    segmenter = ParagraphSegmenter(min_chars=1, max_chars=100)
+    segmenter.begin_page(1, [positioned("x", 1, 0)])
+    segmenter.begin_page(2, [positioned("x", 2, 0)])
+    blocks = segmenter.feed(positioned("报告期内本行净利润", 1, 700))
+    blocks += segmenter.feed(positioned("稳步增长。", 2, 80))
+    blocks += segmenter.flush()
+    assert blocks == [("报告期内本行净利润稳步增长。", 1)]
+
+def test_short_paragraphs_merge_and_long_ones_split():
+    segmenter = ParagraphSegmenter(min_chars=10, max_chars=30)
+    blocks = []
+    for text in ["短段落。", "另一个短段落。", "这是一个比较长的段落，包含两句话。第二句也比较长，所以需要切开。"]:
+        blocks += segmenter.feed({"text": text, "page": 1})
+    blocks += segmenter.flush()
+    # 两个短段落合并；与长段落合并会超出max_chars，长段落单独按句子切开
+    assert [text for text, _ in blocks] == ["短段落。另一个短段落。", "这是一个比较长的段落，包含两句话。", "第二句也比较长，所以需要切开。"]
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,76 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import src.toc as toc
+from src.toc import TocIndex, select_pages
+
+# 封面和目录两页不编页码：印刷页码1对应PDF第3页
+TOC_TEXT = """目 录
+第一节 重要提示 ........ 1
+第二节 公司简介和主要财务指标 ........ 2
+第三节 管理层讨论与分析 ........ 4
+一、经营情况 ........ 4
+二、风险管理 ........ 6
+第四节 财务报告 ........ 8"""
+BODY = {1: "第一节 重要提示", 2: "第二节 公司简介和主要财务指标", 4: "第三节 管理层讨论与分析\n一、经营情况",
+        6: "二、风险管理", 8: "第四节 财务报告"}
+
+def fake_pages(monkeypatch, pages):
+    monkeypatch.setattr(toc, "count_pages", lambda pdf_path, cache=None: len(pages))
+
+    def iter_pages(pdf_path, workers, cache=None, pages=None):
+        for page in pages:
+            yield {"page": page, "text": PAGES[page - 1]}
+
+    PAGES = pages
+    monkeypatch.setattr(toc, "iter_pages", iter_pages)
+
+def report_pages(offset=2, total=12):
+    pages = ["某某银行2023年年度报告", TOC_TEXT] + [""] * (total - 2)
+    for printed, text in BODY.items():
+        pages[printed + offset - 1] = text + "\n正文"
+    return pages
+
+def test_entries_levels_and_offset(monkeypatch):
+    fake_pages(monkeypatch, report_pages())
+    index = TocIndex.build(Path("report.pdf"))
+    assert index.offset == 2 and index.toc_pages == [2]
+    assert [(entry["title"], entry["level"], entry["start"], entry["end"]) for entry in index.entries] == [
+        ("第一节 重要提示", 1, 3, 4),
+        ("第二节 公司简介和主要财务指标", 1, 4, 6),
+        ("第三节 管理层讨论与分析", 1, 6, 10),
+        ("一、经营情况", 2, 6, 8),
+        ("二、风险管理", 2, 8, 10),
+        ("第四节 财务报告", 1, 10, 12),
+    ]
+
+def test_offset_zero_when_titles_not_found(monkeypatch):
+    pages = ["封面", TOC_TEXT] + ["正文"] * 10
+    fake_pages(monkeypatch, pages)
+    index = TocIndex.build(Path("report.pdf"))
+    assert index.offset == 0
+    assert index.entries[0]["start"] == 1
+
+def test_match_aliases_and_keywords(monkeypatch):
+    fake_pages(monkeypatch, report_pages())
+    index = TocIndex.build(Path("report.pdf"))
+    assert [entry["title"] for entry in index.match(["financial"])] == ["第四节 财务报告"]
+    assert [entry["title"] for entry in index.match(["风险 管理"])] == ["二、风险管理"]
+    assert index.pages(["financial", "summary"]) == {4, 5, 6, 10, 11, 12}
+
+def test_select_pages_falls_back_to_all_pages(monkeypatch, tmp_path):
+    fake_pages(monkeypatch, report_pages())
+    assert select_pages(Path("report.pdf"), []) is None
+    assert select_pages(Path("report.pdf"), ["不存在的章节"]) is None
+    index_path = tmp_path / "toc.json"
+    assert select_pages(Path("report.pdf"), ["events", "financial"], index_path=index_path) == {10, 11, 12}
+    assert index_path.exists()
+
+    fake_pages(monkeypatch, ["封面"] + ["正文"] * 5)
+    assert select_pages(Path("report.pdf"), ["financial"]) is None
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,52 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.triage import Triage, SKIP, RULES, LLM, extract_by_rules, normalize_text, summarize, evaluate, load_reference
+
+def labels(texts):
+    return [item["label"] for item in Triage().classify([{"text": text} for text in texts])]
+
+def test_skip_labels():
+    assert labels(["", "12", "- 3 -", "2023年", "单位：人民币百万元", "目录", "某某银行2023年年度报告", "谢谢"]) == [SKIP] * 8
+
+def test_repeated_short_text_is_running_header():
+    texts = ["某某银行股份有限公司"] * 3 + ["本行持续推进数字化转型战略，服务实体经济"]
+    assert labels(texts) == [SKIP, SKIP, SKIP, LLM]
+
+def test_rules_and_llm_labels():
+    assert labels([
+        "2023年末，不良贷款率1.2%",
+        "营业收入同比增长8.5%，主要由于利息净收入增加和手续费收入增长带动，本行持续优化资产负债结构",
+        "本行持续完善全面风险管理体系",
+        "截至2023年末，客户数量增长较快，达到12345户，较上年有较大提升，但存款50",
+    ]) == [RULES, LLM, LLM, LLM]
+
+def test_extract_by_rules():
+    items = extract_by_rules("2023年末，全行存款余额3，063。53亿元，不良贷款率1。2%")
+    assert [(item["name"], item["value"], item["unit"], item["time"]) for item in items] == [
+        ("存款余额", 3063.53, "亿元", "2023年"), ("不良贷款率", 1.2, "%", "2023年")
+    ]
+    # 不像指标的名称不提取
+    assert extract_by_rules("会议时长30人") == []
+
+def test_normalize_text_restores_decimals():
+    assert normalize_text("  1，234。5 亿元\n") == "1,234.5 亿元"
+
+def test_summary_and_recall(tmp_path):
+    result = Triage().classify([{"text": "目录"}, {"text": "不良贷款率1.2%"}, {"text": "本行推进绿色金融发展战略"}])
+    summary = summarize(result)
+    assert (summary["total"], summary[SKIP], summary[RULES], summary[LLM]) == (3, 1, 1, 1)
+
+    path = tmp_path / "labels.json"
+    path.write_text(json.dumps([{"block_id": 0, "extractable": True}, {"block_id": 1, "extractable": True},
+                                {"block_id": 2, "extractable": False}]), encoding="utf-8")
+    evaluation = evaluate(result, load_reference(path))
+    assert evaluation["recall"] == 0.5
+    assert evaluation["missed_block_ids"] == [0]
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
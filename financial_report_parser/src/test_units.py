@@ -0,0 +1,80 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.units import parse_number, normalize_unit, normalize_indicator, normalize_period, canonicalize
+from src.table_extractor import parse_statement_table, find_unit
+
+def test_parse_number_formats():
+    assert parse_number("3,063.53") == 3063.53
+    assert parse_number("(12.5)") == -12.5
+    assert parse_number("（1，200）") == -1200.0
+    assert parse_number("12.5%") == 12.5
+    assert parse_number(7) == 7.0
+    assert parse_number(True) is None
+    assert parse_number("不适用") is None
+
+def test_normalize_period():
+    assert normalize_period("2023年") == "2023"
+    assert normalize_period("2023年末") == "2023"
+    assert normalize_period("2023年上半年") == "2023H1"
+    assert normalize_period("2023年半年度") == "2023H1"
+    assert normalize_period("2023年下半年") == "2023H2"
+    assert normalize_period("２０２３年第三季度") == "2023Q3"
+    assert normalize_period("2023 Q4") == "2023Q4"
+    # 没有年份时按报告年份推算
+    assert normalize_period("上年同期", default_year=2023) == "2022"
+    assert normalize_period("本期", default_year=2023) == "2023"
+    assert normalize_period("本期") == ""
+
+def test_units_and_indicator_names():
+    assert normalize_unit("人民币百万元") == "百万元"
+    assert normalize_unit("单位：％") == "%"
+    assert normalize_unit("bps") == "基点"
+    assert normalize_indicator("净利润（亿元）") == "净利润"
+    assert normalize_indicator("不良 贷款率(%)") == "不良贷款率"
+    assert canonicalize("1.5", "亿元") == (1.5e8, "元")
+    assert canonicalize("1,200", "人民币千元") == (1.2e6, "元")
+    assert canonicalize("1.52", "％") == (1.52, "%")
+
+def test_find_unit():
+    assert find_unit("单位：人民币百万元") == "百万元"
+    assert find_unit("（除另有注明外）单位: 千元") == "千元"
+    assert find_unit("营业收入") == ""
+
+def test_parse_statement_table_periods_and_units():
+    rows = [
+        ["项目", "2023年", "2022年", "增减(%)"],
+        ["营业收入", "1,200.5", "1,100.0", "9.14"],
+        ["净利润(亿元)", "15", "12", "25.0"],
+        ["不良贷款率", "1.2", "1.3", "-0.1"],
+        ["吸收存款", None, None, None],
+        ["", "900", "800", "12.5"],
+    ]
+    items = parse_statement_table(rows, unit="百万元", year=2023, page=5)
+    values = {(item["name"], item["period"]): (item["value"], item["unit"]) for item in items}
+    assert values == {
+        ("营业收入", "2023"): (1200.5, "百万元"), ("营业收入", "2022"): (1100.0, "百万元"),
+        ("净利润", "2023"): (15.0, "亿元"), ("净利润", "2022"): (12.0, "亿元"),
+        ("不良贷款率", "2023"): (1.2, "%"), ("不良贷款率", "2022"): (1.3, "%"),
+        # 折行的名称与下一行的数值合并
+        ("吸收存款", "2023"): (900.0, "百万元"), ("吸收存款", "2022"): (800.0, "百万元"),
+    }
+    assert all(item["page"] == 5 and item["type"] == "table" for item in items)
+
+def test_parse_statement_table_relative_periods():
+    rows = [["项目", "本期", "上年同期"], ["营业收入", "10", "9"], ["营业成本", "6", "5"]]
+    items = parse_statement_table(rows, year=2023)
+    assert {(item["name"], item["period"]) for item in items} == {
+        ("营业收入", "2023"), ("营业收入", "2022"), ("营业成本", "2023"), ("营业成本", "2022")
+    }
+
+def test_layout_tables_are_not_statements():
+    # 没有期间列，或只有一个指标
+    assert parse_statement_table([["姓名", "职务"], ["张三", "董事长"]]) == []
+    assert parse_statement_table([["项目", "2023年"], ["营业收入", "10"]]) == []
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
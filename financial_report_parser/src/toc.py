@@ -0,0 +1,176 @@
+import re
+import json
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Set
+
+from .pdf_pool import count_pages, iter_pages
+
+logger = logging.getLogger(__name__)
+
+TOC_SCAN_PAGES = 12     # 在前多少页中寻找目录
+MAX_PAGE_OFFSET = 10    # 目录页码与PDF物理页码之间的最大偏移（封面、目录等不编页码的页面）
+
+# 常用章节的别名，过滤条件可以直接写别名，也可以写标题中的关键字
+SECTION_ALIASES = {
+    "financial": ["财务报告", "财务报表", "审计报告", "财务会计报告"],
+    "mdna": ["管理层讨论与分析", "经营情况讨论与分析", "董事会报告", "经营情况"],
+    "summary": ["公司简介", "主要财务指标", "会计数据和财务指标", "主要会计数据"],
+    "governance": ["公司治理", "董事、监事", "高级管理人员", "股份变动", "股东情况"],
+    "risk": ["风险管理"],
+    "events": ["重要事项"],
+    "esg": ["环境和社会责任", "社会责任", "环境与社会"]
+}
+
+_TOC_TITLE_RE = re.compile(r'^目\s*录$|^CONTENTS?$', re.IGNORECASE)
+# 目录项：标题、可选的引导符（……、---等），以及页码；一行中可能有左右两栏
+_ENTRY_RE = re.compile(
+    r'(?P<title>(?:第[一二三四五六七八九十百]+[节章部分]|[一二三四五六七八九十]+、)?\s*'
+    r'[一-龥A-Za-z][一-龥A-Za-z0-9（）()、，,“”和与及\s]{1,40}?)'
+    r'\s*[.．·…\-—_]*\s*(?P<page>\d{1,4})(?!\d)'
+)
+_CHAPTER_RE = re.compile(r'^第[一二三四五六七八九十百]+[节章部分]')
+_NUMBERED_RE = re.compile(r'^[一二三四五六七八九十]+、')
+
+def _normalize(text: str) -> str:
+    return ''.join(text.split())
+
+class TocIndex:
+    """目录索引：章节标题到PDF页码范围（闭区间）的映射
+
+    entries中每项为 {"title", "level", "printed_page", "start", "end"}，
+    start/end是PDF的物理页码（从1开始），与iter_pages使用的页码一致。
+    """
+    def __init__(self, entries: List[Dict[str, Any]], offset: int = 0, toc_pages: List[int] = None):
+        self.entries = entries
+        self.offset = offset
+        self.toc_pages = toc_pages or []
+
+    def __bool__(self) -> bool:
+        return bool(self.entries)
+
+    @classmethod
+    def build(cls, pdf_path: Path, cache=None, scan_pages: int = TOC_SCAN_PAGES) -> "TocIndex":
+        """在前几页中找到目录并解析，推算页码偏移后生成索引；找不到目录时返回空索引"""
+        total_pages = count_pages(pdf_path, cache)
+        entries, toc_pages = [], []
+        for record in iter_pages(pdf_path, 1, cache=cache, pages=range(1, min(scan_pages, total_pages) + 1)):
+            lines = [line.strip() for line in record["text"].split('\n') if line.strip()]
+            is_toc = any(_TOC_TITLE_RE.match(_normalize(line)) for line in lines)
+            page_entries = _parse_entries(lines)
+            # 目录可能跨页：紧接着目录页、同样由目录项组成的页面也算目录
+            if is_toc or (toc_pages and toc_pages[-1] == record["page"] - 1 and len(page_entries) >= 3):
+                toc_pages.append(record["page"])
+                entries.extend(page_entries)
+            elif toc_pages:
+                break
+        entries = _increasing(entries, total_pages)
+        if not entries:
+            return cls([])
+        _assign_levels(entries)
+
+        offset = _detect_offset(pdf_path, cache, entries, toc_pages, total_pages)
+        for entry in entries:
+            entry["start"] = min(total_pages, max(1, entry["printed_page"] + offset))
+        # 章节结束于下一个同级或更高级章节开始的那一页（两章可能共用一页）
+        for i, entry in enumerate(entries):
+            following = next((other for other in entries[i + 1:] if other["level"] <= entry["level"]), None)
+            entry["end"] = max(entry["start"], following["start"]) if following else total_pages
+        return cls(entries, offset, toc_pages)
+
+    def match(self, filters: Iterable[str]) -> List[Dict[str, Any]]:
+        """按过滤条件选出章节：别名（见SECTION_ALIASES）或标题中的关键字"""
+        keywords = []
+        for name in filters:
+            name = name.strip()
+            if name:
+                keywords.extend(SECTION_ALIASES.get(name.lower(), [name]))
+        keywords = [_normalize(keyword) for keyword in keywords]
+        return [entry for entry in self.entries if any(keyword in _normalize(entry["title"]) for keyword in keywords)]
+
+    def pages(self, filters: Iterable[str]) -> Set[int]:
+        """选中章节覆盖的页码"""
+        pages = set()
+        for entry in self.match(filters):
+            pages.update(range(entry["start"], entry["end"] + 1))
+        return pages
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"offset": self.offset, "toc_pages": self.toc_pages, "entries": self.entries}
+
+    def save(self, path: Path) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+def _parse_entries(lines: List[str]) -> List[Dict[str, Any]]:
+    entries = []
+    for line in lines:
+        for match in _ENTRY_RE.finditer(line):
+            title = ' '.join(match.group("title").split())
+            if _TOC_TITLE_RE.match(_normalize(title)):
+                continue
+            entries.append({"title": title, "printed_page": int(match.group("page"))})
+    return entries
+
+def _assign_levels(entries: List[Dict[str, Any]]) -> None:
+    """第X节/章为一级；目录中有第X节时"一、"是节下的小节，否则"一、"为一级"""
+    has_chapters = any(_CHAPTER_RE.match(entry["title"]) for entry in entries)
+    for entry in entries:
+        title = entry["title"]
+        top_level = _CHAPTER_RE.match(title) or (not has_chapters and _NUMBERED_RE.match(title))
+        entry["level"] = 1 if top_level else 2
+
+def _increasing(entries: List[Dict[str, Any]], total_pages: int) -> List[Dict[str, Any]]:
+    """去掉页码倒退或超出文档的项（多半是误识别的年份、编号等）"""
+    result = []
+    for entry in entries:
+        if entry["printed_page"] > total_pages:
+            continue
+        if result and entry["printed_page"] < result[-1]["printed_page"]:
+            continue
+        result.append(entry)
+    return result
+
+def _detect_offset(pdf_path: Path, cache, entries: List[Dict[str, Any]], toc_pages: List[int],
+                   total_pages: int) -> int:
+    """在目录之后的页面中查找前几个章节标题，用出现位置推算页码偏移；找不到时为0"""
+    after_toc = max(toc_pages) if toc_pages else 0
+    candidates = [entry for entry in entries if entry["level"] == 1][:3] or entries[:3]
+    offsets = Counter()
+    for entry in candidates:
+        printed = entry["printed_page"]
+        pages = [page for page in range(printed, printed + MAX_PAGE_OFFSET + 1)
+                 if after_toc < page <= total_pages]
+        title = _normalize(entry["title"])
+        for record in iter_pages(pdf_path, 1, cache=cache, pages=pages):
+            if title in _normalize(record["text"])[:len(title) + 200]:
+                offsets[record["page"] - printed] += 1
+                break
+    return offsets.most_common(1)[0][0] if offsets else 0
+
+def select_pages(pdf_path: Path, sections: Iterable[str], cache=None, index_path: Path = None) -> Optional[Set[int]]:
+    """按章节过滤条件选出要处理的页码
+
+    没有过滤条件时返回None（处理全部页面）；找不到目录或没有章节匹配时同样返回None并给出警告，
+    宁可多处理也不漏掉内容。指定index_path时保存目录索引。
+    """
+    sections = [section for section in sections or [] if section.strip()]
+    if not sections:
+        return None
+    index = TocIndex.build(pdf_path, cache)
+    if index_path is not None:
+        index.save(index_path)
+    if not index:
+        logger.warning(f"没有找到目录，处理全部页面: {pdf_path}")
+        return None
+    matched = index.match(sections)
+    if not matched:
+        titles = "，".join(entry["title"] for entry in index.entries if entry["level"] == 1)
+        logger.warning(f"没有章节匹配 {', '.join(sections)}，处理全部页面。目录中的章节: {titles}")
+        return None
+    pages = index.pages(sections)
+    total_pages = count_pages(pdf_path, cache)
+    logger.info(f"按目录选中 {len(matched)} 个章节（{'，'.join(entry['title'] for entry in matched)}），"
+                f"共 {len(pages)}/{total_pages} 页，页码偏移 {index.offset}")
+    return pages
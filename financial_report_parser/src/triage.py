@@ -0,0 +1,193 @@
+import argparse
+import json
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Any, List
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.units import parse_number
+
+SKIP = "skip"    # 没有可提取的内容，不调用LLM
+RULES = "rules"  # 用正则直接提取数值，不调用LLM
+LLM = "llm"      # 交给LLM分析
+
+# 出现这些词的正文才值得交给LLM
+KEYWORDS = (
+    "资产", "负债", "贷款", "存款", "收入", "利润", "利息", "息差", "不良", "拨备", "资本", "充足",
+    "余额", "规模", "增长", "增加", "下降", "减少", "同比", "较上年", "占比",
+    "客户", "业务", "产品", "服务", "市场", "渠道", "网点", "普惠", "小微", "绿色", "科技",
+    "风险", "合规", "监管", "内控", "审计", "信用", "评级", "排名", "荣获",
+    "战略", "规划", "目标", "转型", "发展", "改革", "创新",
+    "治理", "董事", "监事", "股东", "股份", "高级管理", "薪酬", "关联交易"
+)
+# 报告中反复出现的固定内容
+BOILERPLATE = {"年度报告", "目录", "释义", "重要提示", "适用", "不适用", "√适用□不适用", "□适用√不适用",
+               "单位", "项目", "合计", "备注", "续表", "董事长致辞", "行长致辞"}
+
+# 切分时小数点和千分位被替换成了中文标点，这里换回来
+_DECIMAL_RE = re.compile(r'(?<=\d)[。．](?=\d)')
+_THOUSANDS_RE = re.compile(r'(?<=\d)，(?=\d{3})')
+# 日期中的数字不算数值
+_DATE_RE = re.compile(r'(?:19|20)\d{2}\s*年|\d{1,2}\s*月|\d{1,2}\s*日')
+_PAGE_NUMBER_RE = re.compile(r'^(?:第?\d{1,4}页?|[-—]\s*\d{1,4}\s*[-—]|\d{1,4}\s*/\s*\d{1,4}|(?:19|20)\d{2}年?(?:度)?)$')
+_CAPTION_RE = re.compile(r'^(?:单位|币种|注)[：:]')
+_REPORT_TITLE_RE = re.compile(r'^.{0,12}(?:19|20)\d{2}年?(?:年度|半年度)?报告(?:全文|摘要)?$')
+_NUMBER_UNIT_RE = re.compile(r'-?\d[\d,]*(?:\.\d+)?\s*(?:亿元|万元|千元|元|%|个百分点|万户|户|万人|人|家|个|笔|倍)')
+_RULE_RE = re.compile(
+    r'(?P<name>[一-龥A-Za-z]{2,16}?)'
+    r'(?:为|达到|达|至|突破|实现|增长|增加|减少|下降|合计|共计|累计)?(?:约|近|超过|逾)?'
+    r'(?P<value>-?\d[\d,]*(?:\.\d+)?)\s*'
+    r'(?P<unit>亿元|万元|千元|元|%|个百分点|万户|户|万人|人|家|个|笔|倍)'
+)
+_NAME_PREFIX_RE = re.compile(r'^(?:截至|截止|全行|全年|本行|本年|其中|累计|年末|年内|末|共|有|比年初|较年初|比上年|较上年)+')
+_NAME_SUFFIX_RE = re.compile(r'(?:全年|当年|年末|累计|共)+$')
+# 规则提取的指标名必须像一个指标，否则交给LLM
+_METRIC_WORDS = KEYWORDS + ("率", "比例", "总额", "户数", "人数", "员工", "职工", "机构", "网点")
+_NUMBER_RE = re.compile(r'\d[\d,]*(?:\.\d+)?')
+_YEAR_RE = re.compile(r'((?:19|20)\d{2})年')
+
+def normalize_text(text: str) -> str:
+    """合并空白并还原小数点和千分位，用于统计特征"""
+    text = ' '.join((text or '').split())
+    return _THOUSANDS_RE.sub(',', _DECIMAL_RE.sub('.', text))
+
+def extract_by_rules(text: str) -> List[Dict[str, Any]]:
+    """用正则提取"指标名+数值+单位"形式的数据，格式与LLM提取的结构化数据相同"""
+    text = normalize_text(text)
+    year = _YEAR_RE.search(text)
+    items = []
+    for match in _RULE_RE.finditer(text):
+        name = _NAME_SUFFIX_RE.sub('', _NAME_PREFIX_RE.sub('', match.group("name")))
+        if len(name) < 2 or not any(word in name for word in _METRIC_WORDS):
+            continue
+        items.append({
+            "type": "financial",
+            "name": name,
+            "value": parse_number(match.group("value")),
+            "unit": match.group("unit"),
+            "time": f"{year.group(1)}年" if year else ""
+        })
+    return items
+
+class Triage:
+    """按规则和统计特征给文本块分流：skip / rules / llm"""
+    def __init__(self, min_length: int = 4, min_prose_length: int = 10, rules_max_length: int = 40,
+                 duplicate_threshold: int = 3, duplicate_max_length: int = 30):
+        self.min_length = min_length                      # 更短且没有数字的块直接跳过
+        self.min_prose_length = min_prose_length          # 没有数值的正文至少要这么长才交给LLM
+        self.rules_max_length = rules_max_length          # 不超过这个长度、数值都能被规则提取的块不调用LLM
+        self.duplicate_threshold = duplicate_threshold    # 同样的短文本出现这么多次视为页眉页脚
+        self.duplicate_max_length = duplicate_max_length
+
+    def classify(self, blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """返回每个块的 {"block_id", "label", "reason", "data"}，data为规则提取的结果"""
+        texts = [normalize_text(block["text"]) for block in blocks]
+        counts = Counter(texts)
+        return [dict(block_id=i, **self._classify_one(text, counts[text])) for i, text in enumerate(texts)]
+
+    def _classify_one(self, text: str, occurrences: int) -> Dict[str, Any]:
+        if not text:
+            return {"label": SKIP, "reason": "空文本", "data": []}
+        if _PAGE_NUMBER_RE.match(text):
+            return {"label": SKIP, "reason": "页码或孤立的年份", "data": []}
+        if _CAPTION_RE.match(text) and len(text) <= 20:
+            return {"label": SKIP, "reason": "单位说明", "data": []}
+        if text in BOILERPLATE or _REPORT_TITLE_RE.match(text):
+            return {"label": SKIP, "reason": "固定内容", "data": []}
+        if occurrences >= self.duplicate_threshold and len(text) <= self.duplicate_max_length:
+            return {"label": SKIP, "reason": "重复的页眉页脚", "data": []}
+
+        numbers = _NUMBER_RE.findall(_DATE_RE.sub('', text))
+        if numbers:
+            # 每个数值都能被规则提取时才不调用LLM
+            if len(text) <= self.rules_max_length and len(_NUMBER_UNIT_RE.findall(text)) == len(numbers):
+                items = extract_by_rules(text)
+                if len(items) == len(numbers):
+                    return {"label": RULES, "reason": "数值可由规则提取", "data": items}
+            return {"label": LLM, "reason": "包含数值", "data": []}
+
+        if len(text) < self.min_length:
+            return {"label": SKIP, "reason": "过短", "data": []}
+        if len(text) >= self.min_prose_length and any(k in text for k in KEYWORDS):
+            return {"label": LLM, "reason": "包含关键词的正文", "data": []}
+        return {"label": SKIP, "reason": "没有数值和关键词", "data": []}
+
+def summarize(labels: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """统计各类别的数量和原因"""
+    counts = Counter(item["label"] for item in labels)
+    return {
+        "total": len(labels),
+        SKIP: counts[SKIP],
+        RULES: counts[RULES],
+        LLM: counts[LLM],
+        "reasons": dict(Counter(f"{item['label']}:{item['reason']}" for item in labels).most_common())
+    }
+
+def load_reference(path: Path) -> Dict[int, bool]:
+    """读取标注样本：{block_id: 是否包含可提取的数据}
+
+    支持两种格式：人工标注的列表 [{"block_id", "extractable"}]，
+    或read.json（以LLM是否提取出structured_data作为标注）。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict) and "blocks" in data:
+        reference = {}
+        for item in data["blocks"]:
+            analysis = item.get("analysis", {})
+            analysis = analysis.get("analysis", analysis)
+            reference[item["block_id"]] = bool(analysis.get("structured_data"))
+        return reference
+    return {item["block_id"]: bool(item["extractable"]) for item in data}
+
+def evaluate(labels: List[Dict[str, Any]], reference: Dict[int, bool]) -> Dict[str, Any]:
+    """对照标注样本计算召回率：有数据的块中有多少没有被跳过"""
+    by_id = {item["block_id"]: item for item in labels}
+    sample = [block_id for block_id in reference if block_id in by_id]
+    positives = [block_id for block_id in sample if reference[block_id]]
+    kept = [block_id for block_id in positives if by_id[block_id]["label"] != SKIP]
+    skipped = [block_id for block_id in sample if by_id[block_id]["label"] == SKIP]
+    return {
+        "sample": len(sample),
+        "positives": len(positives),
+        "recall": len(kept) / len(positives) if positives else 1.0,
+        "skipped": len(skipped),
+        "skipped_positive": len(positives) - len(kept),
+        "missed_block_ids": [block_id for block_id in positives if by_id[block_id]["label"] == SKIP]
+    }
+
+def main():
+    base_dir = Path(__file__).parent.parent
+    parser = argparse.ArgumentParser(description="文本块分流：跳过没有内容的块，简单数值用规则提取")
+    parser.add_argument("--input", type=Path, default=base_dir / "data" / "cut.json", help="切分结果")
+    parser.add_argument("--output", type=Path, default=base_dir / "data" / "triage.json", help="分流报告")
+    parser.add_argument("--labels", type=Path, help="标注样本（人工标注列表或read.json），用于计算召回率")
+    args = parser.parse_args()
+
+    with open(args.input, 'r', encoding='utf-8') as f:
+        blocks = json.load(f)["blocks"]
+    labels = Triage().classify(blocks)
+    report = {"summary": summarize(labels), "blocks": labels}
+    if args.labels:
+        report["evaluation"] = evaluate(labels, load_reference(args.labels))
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    summary = report["summary"]
+    print(f"共 {summary['total']} 个文本块：跳过 {summary[SKIP]}，规则提取 {summary[RULES]}，LLM {summary[LLM]}")
+    print(f"节省LLM调用 {summary[SKIP] + summary[RULES]} 次（{(summary[SKIP] + summary[RULES]) / max(summary['total'], 1):.1%}）")
+    for reason, count in summary["reasons"].items():
+        print(f"  {reason}: {count}")
+    if args.labels:
+        evaluation = report["evaluation"]
+        print(f"标注样本 {evaluation['sample']} 个，其中有数据 {evaluation['positives']} 个，"
+              f"召回率 {evaluation['recall']:.1%}（误跳过 {evaluation['skipped_positive']} 个）")
+
+if __name__ == "__main__":
+    main()
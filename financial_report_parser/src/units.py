@@ -0,0 +1,95 @@
+import re
+import unicodedata
+from typing import Any, Optional, Tuple
+
+# 金额单位换算为"元"的倍数
+CURRENCY_MULTIPLIERS = {
+    "元": 1,
+    "千元": 1e3,
+    "万元": 1e4,
+    "十万元": 1e5,
+    "百万元": 1e6,
+    "千万元": 1e7,
+    "亿元": 1e8,
+    "万亿元": 1e12
+}
+
+# 其他单位的规范写法
+UNIT_ALIASES = {
+    "％": "%",
+    "百分比": "%",
+    "个百分点": "百分点",
+    "bp": "基点",
+    "bps": "基点",
+    "BP": "基点"
+}
+
+_NUMBER_RE = re.compile(r'[-+]?\d+(?:\.\d+)?')
+# 指标名末尾的单位说明，例如"净利润（亿元）"
+_NAME_UNIT_RE = re.compile(r'[(（][^()（）]*[)）]$')
+_YEAR_RE = re.compile(r'((?:19|20)\d{2})\s*年?')
+_QUARTERS = {"一": 1, "1": 1, "二": 2, "2": 2, "三": 3, "3": 3, "四": 4, "4": 4}
+_QUARTER_RE = re.compile(r'(?:第)?([一二三四1-4])\s*季度|Q([1-4])', re.IGNORECASE)
+
+def parse_number(value: Any) -> Optional[float]:
+    """把"3,063.53"、"(12.5)"、"12.5%"之类的值解析为数字，无法解析时返回None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().replace(',', '').replace('，', '')
+    negative = text.startswith(('(', '（')) and text.endswith((')', '）'))
+    match = _NUMBER_RE.search(text)
+    if not match:
+        return None
+    number = float(match.group())
+    return -abs(number) if negative else number
+
+def normalize_unit(unit: Optional[str]) -> str:
+    """去掉"人民币"等修饰，返回规范的单位写法"""
+    if not unit:
+        return ""
+    unit = unit.strip().replace("人民币", "").replace("单位：", "").replace("单位:", "").strip()
+    return UNIT_ALIASES.get(unit, unit)
+
+def normalize_indicator(name: Optional[str]) -> str:
+    """指标名的规范形式：全角转半角、去掉空白和末尾的单位说明，用于精确匹配和索引"""
+    if not name:
+        return ""
+    name = unicodedata.normalize("NFKC", name)
+    name = re.sub(r'\s+', '', name)
+    return _NAME_UNIT_RE.sub('', name) or name
+
+def normalize_period(text: Optional[str], default_year: Optional[int] = None) -> str:
+    """把"2023年"、"2023年末"、"2023年上半年"、"2023年第一季度"等时间描述规范为
+    "2023"、"2023H1"、"2023Q1"，按字符串排序即按时间排序；无法识别时返回默认年份或空串
+    """
+    text = unicodedata.normalize("NFKC", str(text or "")).strip()
+    match = _YEAR_RE.search(text)
+    if match:
+        year = int(match.group(1))
+    elif default_year is None:
+        return ""
+    else:
+        year = default_year
+        if any(word in text for word in ("上年", "去年", "上一年", "上期", "年初", "期初")):
+            year -= 1
+
+    if "上半年" in text or "半年度" in text or "中期" in text:
+        return f"{year}H1"
+    if "下半年" in text:
+        return f"{year}H2"
+    quarter = _QUARTER_RE.search(text)
+    if quarter:
+        return f"{year}Q{_QUARTERS[quarter.group(1) or quarter.group(2)]}"
+    return str(year)
+
+def canonicalize(value: Any, unit: Optional[str]) -> Tuple[Optional[float], str]:
+    """把数值换算为规范单位：金额统一为元，其他单位只规范写法"""
+    number = parse_number(value)
+    unit = normalize_unit(unit)
+    if unit in CURRENCY_MULTIPLIERS:
+        if number is not None:
+            number *= CURRENCY_MULTIPLIERS[unit]
+        unit = "元"
+    return number, unit
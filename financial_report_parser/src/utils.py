@@ -5,7 +5,10 @@ from colorama import Fore, Style
 import sys
 import time
 import json
-from typing import Dict, Any, Generator
+import atexit
+import threading
+from typing import Dict, Any, Generator, List
+from .checkpoint import CheckpointLog, atomic_write_json
 
 # 初始化colorama
 colorama.init()
@@ -36,6 +39,7 @@ class ProgressBar:
         self.length = length
         self.fill = fill
         self.iteration = 0
+        self._last_step = -1
 
     def print(self, iteration: int = None):
         if iteration is not None:
@@ -46,51 +50,190 @@ class ProgressBar:
         percent = ("{0:." + str(self.decimals) + "f}").format(100 * (self.iteration / float(self.total)))
         filled_length = int(self.length * self.iteration // self.total)
         bar = self.fill * filled_length + '-' * (self.length - filled_length)
+        if _console.batch:
+            # 批处理模式下只在每10%和结束时输出一行
+            step = 10 * self.iteration // self.total
+            if step != self._last_step or self.iteration == self.total:
+                self._last_step = step
+                stream_output(f'{self.prefix} |{bar}| {percent}% {self.suffix}', level=VERBOSITY_QUIET)
+            return
         print(f'\r{self.prefix} |{bar}| {percent}% {self.suffix}', end='\r')
         if self.iteration == self.total:
             print()
 
 class ProcessTracker:
-    """处理进度跟踪器"""
-    def __init__(self, save_path: Path):
+    """处理进度跟踪器
+
+    每个文本块的结果追加到检查点日志中，每compact_every个文本块
+    才把完整状态原子地写回save_path并清空日志。
+    """
+    def __init__(self, save_path: Path, compact_every: int = 50):
         self.save_path = save_path
+        self.compact_every = compact_every
+        self.log = CheckpointLog(save_path.with_name(save_path.stem + ".jsonl"))
         self.state = self._load_state()
+        self._processed = set(self.state['processed_chunks'])
+        self._pending_commits = 0
 
     def _load_state(self) -> Dict[str, Any]:
-        """加载处理状态"""
+        """加载处理状态：读取快照后重放检查点日志"""
         if self.save_path.exists():
             with open(self.save_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {
-            'current_chunk': 0,
-            'processed_chunks': [],
-            'results': {}
-        }
+                state = json.load(f)
+        else:
+            state = {
+                'current_chunk': 0,
+                'processed_chunks': [],
+                'results': {}
+            }
+        for record in self.log:
+            self._apply(state, record['chunk'], record['result'])
+        return state
+
+    @staticmethod
+    def _apply(state: Dict[str, Any], chunk_index: int, result: Dict[str, Any]):
+        state['current_chunk'] = chunk_index
+        if chunk_index not in state['processed_chunks']:
+            state['processed_chunks'].append(chunk_index)
+        state['results'].update(result)
 
     def save_state(self):
-        """保存处理状态"""
-        with open(self.save_path, 'w', encoding='utf-8') as f:
-            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        """保存完整处理状态并清空检查点日志"""
+        atomic_write_json(self.save_path, self.state)
+        self.log.clear()
+        self._pending_commits = 0
 
     def is_chunk_processed(self, chunk_index: int) -> bool:
         """检查文本块是否已处理"""
-        return chunk_index in self.state['processed_chunks']
+        return chunk_index in self._processed
 
     def save_chunk_result(self, chunk_index: int, result: Dict[str, Any]):
         """保存文本块处理结果"""
-        self.state['current_chunk'] = chunk_index
-        self.state['processed_chunks'].append(chunk_index)
-        self.state['results'].update(result)
-        self.save_state()
-
-def stream_output(text: str, delay: float = 0.01, end: str = '\n'):
-    """流式输出文本"""
-    for char in text:
-        sys.stdout.write(char)
-        sys.stdout.flush()
-        time.sleep(delay)
-    sys.stdout.write(end)
-    sys.stdout.flush()
+        self.log.append({'chunk': chunk_index, 'result': result})
+        self._apply(self.state, chunk_index, result)
+        self._processed.add(chunk_index)
+        self._pending_commits += 1
+        if self._pending_commits >= self.compact_every:
+            self.save_state()
+
+# 输出详细级别
+VERBOSITY_QUIET = 0    # 只输出关键信息
+VERBOSITY_NORMAL = 1   # 常规进度信息
+VERBOSITY_VERBOSE = 2  # 提示词、完整响应等大段内容
+
+class ConsoleOutput:
+    """控制台输出管理器
+
+    interactive 模式下立即写出（可选逐字延迟的打字机效果），
+    batch 模式下缓冲输出并批量写出，不做任何延迟，适合无人值守运行。
+    """
+    MODES = ("interactive", "batch")
+
+    def __init__(self, mode: str = "interactive", verbosity: int = VERBOSITY_NORMAL,
+                 delay: float = 0.0, buffer_size: int = 64 * 1024, stream=None):
+        if mode not in self.MODES:
+            raise ValueError(f"未知的输出模式: {mode}")
+        self.mode = mode
+        self.verbosity = verbosity
+        self.delay = delay
+        self.buffer_size = buffer_size
+        self.stream = stream
+        self._buffer = []
+        self._buffered = 0
+        self._lock = threading.Lock()
+
+    @property
+    def batch(self) -> bool:
+        return self.mode == "batch"
+
+    def enabled(self, level: int = VERBOSITY_NORMAL) -> bool:
+        """判断某个级别的输出是否需要显示"""
+        return level <= self.verbosity
+
+    def write(self, text: str, end: str = '\n', level: int = VERBOSITY_NORMAL, delay: float = None):
+        """输出文本"""
+        if not self.enabled(level):
+            return
+        stream = self.stream or sys.stdout
+        delay = self.delay if delay is None else delay
+        with self._lock:
+            if self.batch:
+                self._buffer.append(text)
+                self._buffer.append(end)
+                self._buffered += len(text) + len(end)
+                if self._buffered >= self.buffer_size:
+                    self._flush(stream)
+            elif delay > 0:
+                for char in text:
+                    stream.write(char)
+                    stream.flush()
+                    time.sleep(delay)
+                stream.write(end)
+                stream.flush()
+            else:
+                stream.write(text + end)
+                stream.flush()
+
+    def flush(self):
+        """写出缓冲区中的内容"""
+        with self._lock:
+            self._flush(self.stream or sys.stdout)
+
+    def _flush(self, stream):
+        if self._buffer:
+            stream.write(''.join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+        stream.flush()
+
+_console = ConsoleOutput()
+atexit.register(_console.flush)
+
+def configure_output(mode: str = None, verbosity: int = None, delay: float = None) -> ConsoleOutput:
+    """配置全局控制台输出"""
+    _console.flush()
+    if mode is not None:
+        if mode not in ConsoleOutput.MODES:
+            raise ValueError(f"未知的输出模式: {mode}")
+        _console.mode = mode
+    if verbosity is not None:
+        _console.verbosity = verbosity
+    if delay is not None:
+        _console.delay = delay
+    return _console
+
+def get_console() -> ConsoleOutput:
+    """获取全局控制台输出管理器"""
+    return _console
+
+def stream_output(text: str, delay: float = None, end: str = '\n', level: int = VERBOSITY_NORMAL):
+    """流式输出文本（批处理模式下缓冲输出，低于当前详细级别的内容不输出）"""
+    _console.write(text, end=end, level=level, delay=delay)
+
+def flush_output():
+    """刷新控制台输出缓冲"""
+    _console.flush()
+
+def is_cjk(char: str) -> bool:
+    """是否为按每字1个token估算的字符：中文、中文标点和全角字符"""
+    return '\u4e00' <= char <= '\u9fff' or '\u3000' <= char <= '\u303f' or '\uff00' <= char <= '\uffef'
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数（中文按每字1个token，其余按每4个字符1个token）"""
+    if not text:
+        return 0
+    cjk = sum(1 for char in text if is_cjk(char))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def percentile(values: List[float], q: float) -> float:
+    """计算百分位数（线性插值），q取值0-100"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (pos - lower)
 
 def setup_logging(log_file: Path = None):
     """设置日志"""